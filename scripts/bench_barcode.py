@@ -0,0 +1,303 @@
+"""
+Synthetic benchmark + accuracy check for blt.barcode - the hottest CPU path
+in the pipeline, and until now the one with no way to tell whether a change
+made it faster, slower, or quietly worse at reading barcodes.
+
+Renders real EAN-13 ISBN barcodes (python-barcode, a dev dependency) into
+phone-sized photos, each with one kind of realistic distortion - barcode
+scale within the frame, rotation, blur, JPEG quality, perspective, low
+contrast, glare, an HEIC round-trip - plus a clean baseline and a mildly-everything "mixed" kind.
+All photos are generated up front (fixed seed, so runs are comparable),
+then each one is decoded with the cache bypassed and timed on its own.
+
+Reports per-image latency percentiles and decode-success rate, overall and
+per distortion kind. A decode that returns a *different* ISBN than the one
+rendered is counted separately as a misread - far worse than no read, since
+nothing downstream would catch it.
+
+    uv run python scripts/bench_barcode.py
+    uv run python scripts/bench_barcode.py --count 200 --min-success 0.95 --max-p50-ms 150
+
+Exits 1 when a gate (--min-success, --max-p50-ms, or any misread at all)
+fails, so it doubles as a regression gate in CI.
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import NamedTuple
+
+import barcode as barcode_lib
+from barcode.writer import ImageWriter
+from PIL import Image, ImageFilter
+
+from blt.barcode import PYRAMID_LEVELS, read_isbn_barcode
+from blt.images import _HAVE_HEIF
+
+PHOTO_SIZE = (4000, 3000)  # 12 MP, the smallest a current phone takes
+DEFAULT_BARCODE_FRACTION = 0.6  # barcode width / photo width in a typical close-up
+DEFAULT_JPEG_QUALITY = 90
+
+KINDS = ("clean", "scale", "rotation", "blur", "jpeg", "perspective", "contrast", "glare", "heic", "mixed")
+
+
+class Case(NamedTuple):
+    kind: str
+    isbn: str
+    path: Path
+    detail: str
+
+
+class Result(NamedTuple):
+    case: Case
+    ms: float
+    isbn: str | None
+    level: int | None
+    stage: str | None
+    timings: list[tuple[str, float]]
+
+
+def _render_barcode(isbn12: str) -> tuple[Image.Image, str]:
+    ean = barcode_lib.get("ean13", isbn12, writer=ImageWriter())
+    buf = BytesIO()
+    ean.write(buf, options={"write_text": False})
+    buf.seek(0)
+    return Image.open(buf).convert("RGB"), ean.get_fullcode()
+
+
+def _perspective(img: Image.Image, strength: float, rng: random.Random) -> Image.Image:
+    """Warps the image as if photographed off-axis: each corner pulled in by
+    up to `strength` of the image size."""
+    # Pad first so the warp tilts the barcode within the frame instead of
+    # clipping its quiet zones/outer bars off.
+    margin = int(max(img.size) * strength)
+    padded = Image.new("RGB", (img.width + 2 * margin, img.height + 2 * margin), "white")
+    padded.paste(img, (margin, margin))
+    img = padded
+    w, h = img.size
+    dx, dy = w * strength, h * strength
+    # Where each output corner samples from in the source (PIL's PERSPECTIVE
+    # transform maps output -> input), so pulled-in corners stretch outward.
+    src = [
+        (rng.uniform(0, dx), rng.uniform(0, dy)),
+        (w - rng.uniform(0, dx), rng.uniform(0, dy)),
+        (w - rng.uniform(0, dx), h - rng.uniform(0, dy)),
+        (rng.uniform(0, dx), h - rng.uniform(0, dy)),
+    ]
+    dst = [(0, 0), (w, 0), (w, h), (0, h)]
+    coeffs = _perspective_coeffs(dst, src)
+    return img.transform(img.size, Image.Transform.PERSPECTIVE, coeffs, Image.Resampling.BICUBIC, fillcolor="white")
+
+
+def _glare(photo: Image.Image, center: tuple[float, float], radius: float, strength: float) -> Image.Image:
+    """Washes a bright, soft-edged hotspot over the photo, like a light
+    reflected off a glossy cover - fully blown out at its centre when
+    strength nears 1."""
+    cx, cy = center
+    mask = Image.radial_gradient("L").resize((int(radius), int(radius)))  # 0 at centre, 255 at edge
+    mask = mask.point(lambda v: int(255 * min(1.0, strength * 1.5 * max(0.0, 1 - v / 180))))
+    full = Image.new("L", photo.size, 0)
+    full.paste(mask, (int(cx - radius / 2), int(cy - radius / 2)))
+    return Image.composite(Image.new("RGB", photo.size, "white"), photo, full)
+
+
+def _perspective_coeffs(dst: list[tuple[float, float]], src: list[tuple[float, float]]) -> list[float]:
+    # Solves the 8 homography coefficients mapping dst -> src by Gaussian
+    # elimination - small enough not to need numpy for it.
+    rows = []
+    for (x, y), (u, v) in zip(dst, src, strict=True):
+        rows.append([x, y, 1, 0, 0, 0, -u * x, -u * y, u])
+        rows.append([0, 0, 0, x, y, 1, -v * x, -v * y, v])
+    n = 8
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(n):
+            if r != col:
+                factor = rows[r][col] / rows[col][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col], strict=True)]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+
+def _make_case(kind: str, index: int, out_dir: Path, rng: random.Random) -> Case:
+    isbn12 = rng.choice(("978", "979")) + "".join(rng.choice("0123456789") for _ in range(9))
+    code, isbn = _render_barcode(isbn12)
+
+    fraction = DEFAULT_BARCODE_FRACTION
+    angle = 0.0
+    blur = 0.0
+    quality = DEFAULT_JPEG_QUALITY
+    warp = 0.0
+    fade = 0.0
+    glare = 0.0
+    heic = False
+
+    if kind == "scale":
+        fraction = rng.uniform(0.08, 0.9)
+    elif kind == "rotation":
+        angle = rng.uniform(-35, 35)
+    elif kind == "blur":
+        blur = rng.uniform(1, 10)
+    elif kind == "jpeg":
+        quality = rng.randint(5, 70)
+    elif kind == "perspective":
+        warp = rng.uniform(0.1, 0.45)
+    elif kind == "contrast":
+        fade = rng.uniform(0.6, 0.92)
+    elif kind == "glare":
+        glare = rng.uniform(0.6, 0.97)
+    elif kind == "heic":
+        heic = True
+        quality = rng.randint(50, 90)
+    elif kind == "mixed":
+        fraction = rng.uniform(0.35, 0.8)
+        angle = rng.uniform(-8, 8)
+        blur = rng.uniform(0, 2.5)
+        quality = rng.randint(60, 92)
+        warp = rng.uniform(0, 0.1)
+
+    if fade:
+        # Washed-out print: bars and background both pulled toward mid-grey.
+        code = Image.blend(code, Image.new("RGB", code.size, (150, 150, 150)), fade)
+    if warp:
+        code = _perspective(code, warp, rng)
+    if angle:
+        code = code.rotate(angle, Image.Resampling.BICUBIC, expand=True, fillcolor="white")
+
+    photo = Image.new("RGB", PHOTO_SIZE, (236, 232, 224))  # off-white paper, not pure white
+    width = int(PHOTO_SIZE[0] * fraction)
+    height = min(width * code.height // code.width, PHOTO_SIZE[1])
+    code = code.resize((width, height), Image.Resampling.BICUBIC)
+    x = rng.randint(0, PHOTO_SIZE[0] - width)
+    y = rng.randint(0, PHOTO_SIZE[1] - height)
+    photo.paste(code, (x, y))
+    if glare:
+        photo = _glare(photo, (x + rng.uniform(0.2, 0.8) * width, y + rng.uniform(0.2, 0.8) * height), width, glare)
+    if blur:
+        photo = photo.filter(ImageFilter.GaussianBlur(blur))
+
+    path = out_dir / f"{index:04d}_{kind}.{'heic' if heic else 'jpg'}"
+    photo.save(path, quality=quality)
+    detail = (
+        f"scale={fraction:.2f} angle={angle:+.1f} blur={blur:.1f} q={quality} warp={warp:.2f}"
+        f" fade={fade:.2f} glare={glare:.2f}"
+    )
+    return Case(kind, isbn, path, detail)
+
+
+def generate_cases(count: int, seed: int, out_dir: Path, kinds: tuple[str, ...]) -> list[Case]:
+    rng = random.Random(seed)
+    return [_make_case(kinds[i % len(kinds)], i, out_dir, rng) for i in range(count)]
+
+
+def run_case(case: Case, preprocess: bool = True) -> Result:
+    # read_isbn_barcode is exactly decode_isbn_barcode with the cache
+    # bypassed, plus which pyramid level/preprocessing stage read it.
+    timings: list[tuple[str, float]] = []
+    start = time.perf_counter()
+    read = read_isbn_barcode(case.path, preprocess=preprocess, timings=timings)
+    ms = (time.perf_counter() - start) * 1000
+    return Result(case, ms, read.isbn, read.level, read.stage, timings)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _summary_row(label: str, results: list[Result]) -> str:
+    ms = [r.ms for r in results]
+    ok = sum(r.isbn == r.case.isbn for r in results)
+    misread = sum(r.isbn is not None and r.isbn != r.case.isbn for r in results)
+    return (
+        f"{label:<12} {len(results):>4} {ok / len(results):>8.1%} {misread:>8}"
+        f" {percentile(ms, 50):>8.1f} {percentile(ms, 90):>8.1f} {percentile(ms, 99):>8.1f} {max(ms):>8.1f}"
+    )
+
+
+def report(results: list[Result], verbose: bool = False) -> None:
+    columns = ("n", "success", "misread", "p50 ms", "p90 ms", "p99 ms", "max ms")
+    print(f"{'kind':<12} {columns[0]:>4} " + " ".join(f"{c:>8}" for c in columns[1:]))
+    for kind in KINDS:
+        subset = [r for r in results if r.case.kind == kind]
+        if subset:
+            print(_summary_row(kind, subset))
+    print(_summary_row("all", results))
+
+    levels = [r.level for r in results if r.level is not None]
+    if levels:
+        counts = ", ".join(
+            f"{'full' if side is None else f'{side}px'}: {levels.count(i)}" for i, side in enumerate(PYRAMID_LEVELS)
+        )
+        print(f"\nread at pyramid level - {counts}")
+    stages = [r.stage for r in results if r.isbn is not None and r.stage is not None]
+    if stages:
+        print("read by preprocessing - " + ", ".join(f"{st}: {stages.count(st)}" for st in dict.fromkeys(stages)))
+    attempts: dict[str, list[float]] = {}
+    for r in results:
+        for name, ms in r.timings:
+            attempts.setdefault(name, []).append(ms)
+    print("per attempt (ms, p50/max) - " + ", ".join(
+        f"{name}: {percentile(times, 50):.1f}/{max(times):.1f}" for name, times in attempts.items()
+    ))
+    print(f"mean decode time: {statistics.fmean(r.ms for r in results):.1f} ms")
+
+    failures = [r for r in results if r.isbn != r.case.isbn]
+    if failures and verbose:
+        print("\nfailures:")
+        for r in failures:
+            print(f"  {r.case.path.name}: expected {r.case.isbn}, got {r.isbn} ({r.case.detail})")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark + accuracy check for blt.barcode's ISBN decode.")
+    parser.add_argument("--count", type=int, default=80, help="number of synthetic photos (default: 80)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed - same seed, same photos (default: 0)")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS), help="distortion kinds to include")
+    parser.add_argument("--min-success", type=float, help="fail (exit 1) if the overall success rate is below this")
+    parser.add_argument("--max-p50-ms", type=float, help="fail (exit 1) if the median decode time exceeds this")
+    parser.add_argument("--no-preprocess", action="store_true", help="plain decode passes only, for comparison")
+    parser.add_argument("--keep", type=Path, help="write the generated photos here instead of a temp dir")
+    parser.add_argument("-v", "--verbose", action="store_true", help="list every failed case")
+    args = parser.parse_args(argv)
+
+    kinds = tuple(args.kinds)
+    if "heic" in kinds and not _HAVE_HEIF:
+        print("pillow-heif unavailable - skipping the heic kind")
+        kinds = tuple(k for k in kinds if k != "heic")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = args.keep or Path(tmp)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        print(f"generating {args.count} photos ({PHOTO_SIZE[0]}x{PHOTO_SIZE[1]}) ...")
+        cases = generate_cases(args.count, args.seed, out_dir, kinds)
+        run_case(cases[0])  # warm-up: first call pays for loading libzbar/codecs
+        results = [run_case(case, preprocess=not args.no_preprocess) for case in cases]
+
+    report(results, verbose=args.verbose)
+
+    failed = []
+    success = sum(r.isbn == r.case.isbn for r in results) / len(results)
+    if any(r.isbn is not None and r.isbn != r.case.isbn for r in results):
+        failed.append("misread at least one barcode")
+    if args.min_success is not None and success < args.min_success:
+        failed.append(f"success rate {success:.1%} below {args.min_success:.1%}")
+    p50 = percentile([r.ms for r in results], 50)
+    if args.max_p50_ms is not None and p50 > args.max_p50_ms:
+        failed.append(f"median {p50:.1f} ms above {args.max_p50_ms:.1f} ms")
+    for reason in failed:
+        print(f"FAIL: {reason}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Micro-benchmark for blt.html_extract - the streaming reads of the Almedina
+and isbnsearch.org lookup pages - against the BeautifulSoup parse they
+replaced (still each lookup module's _parse_with_soup fallback).
+
+The pages are synthetic: the trimmed product-page markup the lookup tests
+use, padded out to a real store page's size with a head full of inline
+scripts and styles ahead of it and navigation, product grids and a footer
+after it. Every page is parsed both ways, the two results are checked to
+be identical, and each way is timed over --repeat runs.
+
+    uv run python scripts/bench_html_extract.py
+    uv run python scripts/bench_html_extract.py --size-kb 400 --max-ms 5
+
+Exits 1 when the two parses disagree on any page, or when --max-ms is given
+and the streaming median of any page exceeds it.
+"""
+import argparse
+import statistics
+import sys
+import time
+from collections.abc import Callable
+from typing import NamedTuple
+
+from blt import almedina_lookup, html_extract, isbnsearch_lookup
+
+_HEAD = (
+    "<script>window.dataLayer = window.dataLayer || []; /* %d */ function gtag(){dataLayer.push(arguments);}</script>\n"
+    "<style>.nav-%d a { color: #333; padding: 0 1em; } .nav-%d a:hover { text-decoration: underline; }</style>\n"
+)
+_BODY = (
+    '<li class="product-item"><a href="/livros/%d"><img src="/media/%d.jpg" alt="Livro %d">'
+    '<span class="price">%d,90 &euro;</span></a><p>Sinopse do livro %d &amp; mais.</p></li>\n'
+)
+
+_ALMEDINA = """<h1 itemprop="name">Sempre Tu</h1>
+<span class="block-with-text-2">
+  <a href='https://www.almedina.net/autor/colleen-hoover-1564061541'>Colleen Hoover</a>
+</span>"""
+
+_ISBNSEARCH = """<div class="bookinfo">
+  <h1>A villa</h1>
+  <p><strong>ISBN-13:</strong> <a href="/isbn/9789898032577">9789898032577</a></p>
+  <p><strong>ISBN-10:</strong> <a href="/isbn/989803257X">989803257X</a></p>
+  <p><strong>Author:</strong> Nora Roberts</p>
+  <p><strong>Binding:</strong> Paperback</p>
+</div>"""
+
+
+class Page(NamedTuple):
+    name: str
+    html: str
+    fast: Callable[[str], dict | None]
+    soup: Callable[[str], dict | None]
+
+
+def _pad(pattern: str, size: int) -> str:
+    parts, total, i = [], 0, 0
+    while total < size:
+        part = pattern.replace("%d", str(i))
+        parts.append(part)
+        total += len(part)
+        i += 1
+    return "".join(parts)
+
+
+def make_page(content: str, size_kb: int, head_share: float) -> str:
+    """`content` with about `size_kb` KB around it, `head_share` of it ahead."""
+    size = size_kb * 1024
+    head = _pad(_HEAD, int(size * head_share))
+    body = _pad(_BODY, size - len(head))
+    cut = body.index("\n", len(body) // 3) + 1  # between two items, not mid-tag
+    return f"<html><head>{head}</head><body><ul>{body[:cut]}</ul>{content}<ul>{body[cut:]}</ul></body></html>"
+
+
+def make_pages(size_kb: int) -> list[Page]:
+    return [
+        Page("almedina", make_page(_ALMEDINA, size_kb, 0.3), html_extract.almedina_fields,
+             almedina_lookup._parse_with_soup),
+        Page("isbnsearch", make_page(_ISBNSEARCH, size_kb, 0.1), html_extract.isbnsearch_fields,
+             isbnsearch_lookup._parse_with_soup),
+        Page("almedina-miss", make_page("", size_kb, 0.3), html_extract.almedina_fields,
+             almedina_lookup._parse_with_soup),
+    ]
+
+
+def time_ms(parse: Callable[[str], dict | None], html: str, repeat: int) -> list[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(html)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark blt.html_extract against the BeautifulSoup parse.")
+    parser.add_argument("--size-kb", type=int, default=250, help="size of each synthetic page (default: 250)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed parses per page and way (default: 20)")
+    parser.add_argument("--max-ms", type=float, help="fail (exit 1) if any page's streaming median exceeds this")
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'page':<14} {'soup ms':>9} {'stream ms':>10} {'speedup':>8}")
+    for page in make_pages(args.size_kb):
+        if page.fast(page.html) != page.soup(page.html):
+            failures.append(f"{page.name}: streaming and BeautifulSoup results differ")
+        soup_ms = statistics.median(time_ms(page.soup, page.html, args.repeat))
+        fast_ms = statistics.median(time_ms(page.fast, page.html, args.repeat))
+        print(f"{page.name:<14} {soup_ms:>9.2f} {fast_ms:>10.2f} {soup_ms / fast_ms:>7.1f}x")
+        if args.max_ms is not None and fast_ms > args.max_ms:
+            failures.append(f"{page.name}: streaming median {fast_ms:.2f} ms > {args.max_ms} ms")
+
+    for reason in failures:
+        print(f"FAIL: {reason}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
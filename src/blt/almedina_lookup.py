@@ -17,17 +17,17 @@ time like a rate-limit block was actually the custom User-Agent string
 itself being filtered - there is no evidence this endpoint rate-limits at
 the volume this tool ever produces.
 
-A small random delay is still applied before every request, here rather
-than in any particular caller, so this module protects itself regardless of
-who's calling it (the batch extractor, a one-off debug script, anything
-else) - simple good manners even without a confirmed rate limit.
+Every request still waits its turn in blt.rate_limit's bucket for this
+host, here rather than in any particular caller, so this module protects
+itself regardless of who's calling it (the batch extractor, a one-off debug
+script, anything else) - simple good manners even without a confirmed rate
+limit.
 """
-import random
-import time
-
 import requests
 from bs4 import BeautifulSoup
 
+from . import html_extract, http_session, rate_limit
+
 SEARCH_URL = "https://www.almedina.net/catalogsearch/result/"
 HEADERS = {
     "User-Agent": (
@@ -45,14 +45,23 @@ class AlmedinaLookupError(RuntimeError):
 
 def lookup_by_isbn(isbn: str) -> dict | None:
     """Returns {"title", "author"} or None if not found on Almedina."""
-    time.sleep(random.uniform(0.5, 1.5))
+    rate_limit.wait(SEARCH_URL)
     try:
-        r = requests.get(SEARCH_URL, params={"q": isbn}, headers=HEADERS, timeout=15)
+        r = http_session.session().get(SEARCH_URL, params={"q": isbn}, headers=HEADERS, timeout=15)
         r.raise_for_status()
     except requests.RequestException as e:
         raise AlmedinaLookupError(f"Não foi possível consultar a Almedina ({e}).") from e
 
-    soup = BeautifulSoup(r.text, "html.parser")
+    try:
+        return html_extract.almedina_fields(r.text)
+    except ValueError:
+        return _parse_with_soup(r.text)
+
+
+def _parse_with_soup(html: str) -> dict | None:
+    """The full-tree read html_extract falls back to on markup it can't
+    stream."""
+    soup = BeautifulSoup(html, "html.parser")
 
     # An exact ISBN match redirects straight to the product page, which has
     # this structured markup; a search-results listing (no exact match)
@@ -0,0 +1,92 @@
+"""
+Persistent barcode-decode results, keyed by the photo's content hash - so
+re-extracting a book whose isbn.jpg hasn't changed since the last decode
+(a single "Procurar", "Procurar todos novamente", a DEV_MODE rerun) costs
+only the network lookups, not another zbar pass over the image. "No
+barcode found" is cached too: an unreadable photo stays unreadable until
+it's rotated or replaced, both of which change its bytes anyway.
+
+Keyed by content rather than path since the same photo moves around
+(photos_raw/ -> photos_grouped/book_NNN/, or gets copied in DEV_MODE), and
+hashing a few MB is a small fraction of decoding them. Lives in its own
+small SQLite file next to blt.db rather than in it: it's a disposable cache,
+safe to delete at any time, not inventory data - and it's written from
+decode worker processes that have no business holding a SQLAlchemy session.
+
+Every row records which decode pipeline produced it (_DECODER_VERSION); a
+row from an older pipeline is treated as a miss, so improving the decoder
+re-tries photos it previously gave up on instead of trusting a stale "no".
+"""
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+
+_CACHE_PATH = Path("barcode_cache.db")
+
+# Bump whenever barcode.read_isbn_barcode can read something it couldn't
+# before, so cached "no barcode found" results get re-tried.
+_DECODER_VERSION = 2
+
+_HASH_CHUNK = 1 << 20
+
+
+def file_key(path: Path) -> str:
+    """Content hash of a photo - the cache key."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def content_key(data: bytes) -> str:
+    """file_key of a photo whose bytes are already in memory (e.g. about to
+    be written out)."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(_CACHE_PATH, timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS barcode_reads ("
+        " content_hash TEXT PRIMARY KEY,"
+        " isbn TEXT,"
+        " level INTEGER,"
+        " decoder_version INTEGER NOT NULL,"
+        " decoded_at REAL NOT NULL)"
+    )
+    return conn
+
+
+def get(key: str) -> tuple[str | None, int | None] | None:
+    """(isbn, level) for a cached decode - isbn None meaning "no barcode
+    found" - or None on a miss."""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT isbn, level FROM barcode_reads WHERE content_hash = ? AND decoder_version = ?",
+            (key, _DECODER_VERSION),
+        ).fetchone()
+    conn.close()
+    return (row[0], row[1]) if row else None
+
+
+def put(key: str, isbn: str | None, level: int | None) -> None:
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO barcode_reads (content_hash, isbn, level, decoder_version, decoded_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, isbn, level, _DECODER_VERSION, time.time()),
+        )
+    conn.close()
+
+
+def invalidate(path: Path) -> None:
+    """Drops whatever is cached for this photo's current bytes - called
+    right before the file is rewritten (e.g. rotated) in place."""
+    path = Path(path)
+    if not path.exists():
+        return
+    with _connect() as conn:
+        conn.execute("DELETE FROM barcode_reads WHERE content_hash = ?", (file_key(path),))
+    conn.close()
@@ -23,22 +23,36 @@ def group_all_cmd(max_groups: int = typer.Option(None, help="Limite de grupos a
     """Agrupa TUDO o que houver em photos_raw/ e regista cada livro na DB como pending."""
     from .config import settings
     from .db import reset_dev_pending_books, sync_pending_books
+    from .extract import grouped_isbn
     from .group_photos import group_all as _group_all
+    from .group_photos import reset_book_index
     if settings.DEV_MODE:
         removed = reset_dev_pending_books()
+        reset_book_index()  # numbering restarts right after whatever book folders are left
         if removed:
             print(f"[yellow]DEV_MODE: {removed} livro(s) pending/failed reiniciados.[/yellow]")
     _group_all(max_groups=max_groups)
-    added = sync_pending_books(settings.GROUPED_DIR)
+    added = sync_pending_books(settings.GROUPED_DIR, isbn_for=grouped_isbn)
     if added:
         print(f"[green]{added} livro(s) registados na DB como pending.[/green]")
 
 @app.command()
-def extract(limit: int = typer.Option(None, help="Limite de livros a processar (por omissão, todos)")):
+def extract(
+    limit: int = typer.Option(None, help="Limite de livros a processar (por omissão, todos)"),
+    refresh: bool = typer.Option(
+        False, "--refresh", help="Pesquisar de novo em todas as fontes (sem usar respostas guardadas)"
+    ),
+):
     """Corre a extração (barcode + Almedina) sobre os livros pending sem título ainda."""
     from .extract import extract_pending_books
-    result = extract_pending_books(limit=limit)
+    from .vinted_lookup import session_starts
+    result = extract_pending_books(limit=limit, refresh=refresh)
     print(f"[green]{result['resolved']} resolvido(s), {result['failed']} marcado(s) como failed.[/green]")
+    if any(session_starts.values()):
+        print(
+            f"[dim]Sessão Vinted: {session_starts['cold']} a frio, {session_starts['warm']} reaproveitada(s) do disco, "
+            f"{session_starts['rewarm']} renovada(s) em segundo plano.[/dim]"
+        )
 
 @app.command("fetch-discord-photos")
 def fetch_discord_photos():
@@ -56,6 +70,16 @@ def fetch_discord_photos():
             "vão ser tentadas de novo na próxima vez.[/yellow]"
         )
 
+@app.command()
+def watch(
+    settle: float = typer.Option(5.0, help="Segundos sem alterações em photos_raw/ antes de agrupar"),
+    poll: bool = typer.Option(False, help="Verificar a pasta periodicamente em vez de usar inotify"),
+    extract: bool = typer.Option(True, help="Correr a extração logo a seguir a agrupar"),
+):
+    """Vigia photos_raw/: agrupa cada par que chega, regista-o na DB e corre a extração."""
+    from .watch import watch as _watch
+    _watch(settle=settle, poll=poll, extract=extract)
+
 @app.command()
 def review(host: str = "127.0.0.1", port: int = 8000):
     """Abre a página local de revisão (copy-paste para o Vinted)."""
@@ -66,11 +90,43 @@ def review(host: str = "127.0.0.1", port: int = 8000):
     uvicorn.run(review_app, host=host, port=port)
 
 @app.command("convert-heic")
-def convert_heic(path: str, recursive: bool = True, delete_src: bool = not settings.DEV_MODE):
+def convert_heic(
+    path: str,
+    recursive: bool = True,
+    delete_src: bool = not settings.DEV_MODE,
+    workers: int = typer.Option(0, help="Processos em paralelo (0 = um por núcleo do CPU; 1 = sequencial)"),
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="Mostra o tempo de cada ficheiro"),
+):
     """Convert all .heic/.heif under PATH to .jpg (deletes originals unless DEV_MODE is on)."""
-    from .heic_convert import convert_folder
-    created = convert_folder(Path(path), recursive=recursive, delete_src=delete_src)
+    import time
+    from collections import Counter
+
+    from .heic_convert import Conversion, convert_folder
+    report: list[Conversion] = []
+    started = time.perf_counter()
+    created = convert_folder(Path(path), recursive=recursive, delete_src=delete_src, workers=workers or None,
+                             report=report)
+    elapsed = time.perf_counter() - started
+    if verbose:
+        for r in report:
+            print(f"  {r.src.name}: {r.how}, {r.seconds * 1000:.0f} ms")
     print(f"[green]{len(created)} ficheiro(s) convertidos para JPEG.[/green]")
+    if not report:
+        return
+    counts = Counter(r.how for r in report)
+    print(", ".join(f"{how}: {n}" for how, n in sorted(counts.items())) + f" - {elapsed:.1f} s no total")
+    worked = sorted((r for r in report if r.how in ("pillow", "ffmpeg")), key=lambda r: r.seconds)
+    if worked:
+        slowest = worked[-1]
+        print(
+            f"Por ficheiro: mediana {worked[len(worked) // 2].seconds * 1000:.0f} ms, "
+            f"máximo {slowest.seconds * 1000:.0f} ms ({slowest.src.name})"
+        )
+    failed = [r for r in report if r.how == "failed"]
+    if failed:
+        print(f"[red]{len(failed)} ficheiro(s) não convertidos:[/red]")
+        for r in failed:
+            print(f"  {r.src.name}: {r.error}")
 
 if __name__ == "__main__":
     app()
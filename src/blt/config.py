@@ -21,6 +21,64 @@ class Settings(BaseSettings):
     # voltar a bater na Almedina. Nunca mexe em livros available/sold_out.
     DEV_MODE: bool = False
 
+    # Processos usados para ler os códigos de barras de um lote inteiro de
+    # uma vez antes das pesquisas (blt extract, "Detetar livros"). 0 = um
+    # por núcleo do CPU; 1 = sequencial, sem processos extra.
+    BARCODE_WORKERS: int = 0
+
+    # Threads usados pelo group-all / "Confirmar todos" para converter e
+    # mover/copiar as fotos de vários pares ao mesmo tempo. 0 = um por
+    # núcleo do CPU; 1 = um par de cada vez. A numeração dos livros e os
+    # pares são sempre os mesmos, seja qual for o valor.
+    GROUP_WORKERS: int = 0
+
+    # Agrupamento "fundido": o código de barras do close-up do ISBN é lido
+    # logo ao agrupar, a partir da mesma descodificação que a conversão para
+    # JPEG já faz (HEIC), e o ISBN fica guardado no livro novo logo no
+    # sync - a deteção depois já não volta a descodificar a foto.
+    FUSED_GROUPING: bool = False
+
+    # Tamanho máximo (MB) da cache de miniaturas/conversões HEIC->JPEG para
+    # mostrar as fotos no browser (.renditions/). Acima disto, as menos
+    # usadas recentemente são apagadas - são sempre regeneráveis.
+    RENDITION_CACHE_MB: int = 1024
+
+    # Para onde o group-all / "Confirmar todos" move as fotos raw que são
+    # duplicados (cópias exatas, ou quase idênticas tiradas segundos depois)
+    # de outra - nunca são apagadas. Em DEV_MODE ficam onde estão.
+    DUPLICATES_DIR: str = "photos_duplicates"
+
+    # Segundos entre o pedido a uma fonte sair e pedir o ISBN à seguinte
+    # (Vinted -> Almedina -> isbnsearch.org) sem esperar pela resposta da
+    # anterior. Conta a partir de quando o pedido sai de facto, não de
+    # quando fica à espera da vez (RATE_LIMIT_*). A ordem de prioridade dos
+    # campos mantém-se; 0 = logo que o pedido da anterior sai.
+    LOOKUP_STAGGER_SECONDS: float = 0.5
+
+    # Ritmo dos pedidos a cada fonte de pesquisa de ISBN, por site: no
+    # máximo N pedidos por minuto em média, até RATE_LIMIT_BURST seguidos
+    # depois de uma pausa, mais 0-RATE_LIMIT_JITTER_SECONDS de espera
+    # aleatória em cada um. Só conta pedidos reais - um livro já conhecido
+    # (isbn_metadata) não espera nada.
+    VINTED_REQUESTS_PER_MINUTE: float = 12
+    ALMEDINA_REQUESTS_PER_MINUTE: float = 12
+    ISBNSEARCH_REQUESTS_PER_MINUTE: float = 12
+    RATE_LIMIT_BURST: int = 2
+    RATE_LIMIT_JITTER_SECONDS: float = 1.0
+
+    # Durante quantos dias a resposta de cada fonte (Vinted, Almedina,
+    # isbnsearch.org) a um ISBN é reaproveitada em vez de voltar a perguntar:
+    # quando conhecia o livro, e quando não o conhecia. `blt extract
+    # --refresh` e o botão "Procurar" perguntam sempre de novo.
+    ISBN_CACHE_DAYS: int = 90
+    ISBN_CACHE_MISS_DAYS: int = 7
+
+    # Os cookies da sessão do Vinted ficam guardados em disco
+    # (.vinted_cookies.json) e são reaproveitados por cada novo processo
+    # enquanto não expiram. Faltando menos do que isto para expirarem, uma
+    # sessão nova é preparada em segundo plano.
+    VINTED_COOKIE_REWARM_MINUTES: float = 10
+
     # Webhook de um canal Discord para os botões "Enviar para Discord" em
     # /review e /stock. Vazio desativa-os (não é obrigatório).
     DISCORD_WEBHOOK_URL: str = ""
@@ -1,5 +1,6 @@
 import re
 import shutil
+from collections.abc import Callable
 from pathlib import Path
 
 from sqlalchemy import Engine, create_engine, select, text
@@ -61,11 +62,13 @@ def init_db():
     _ensure_columns(engine, "sales", _SALE_COLUMNS_TO_ADD)
     _migrate_book_platforms_from_booleans(engine)
 
-def sync_pending_books(grouped_dir: str | Path) -> int:
+def sync_pending_books(grouped_dir: str | Path, isbn_for: Callable[[Path], str | None] | None = None) -> int:
     """
     Ensure every book_NNN folder in grouped_dir has a matching Book row,
     inserting one with status="pending" for any that don't yet have one.
     Safe to call repeatedly - already-registered folders are skipped.
+    isbn_for(folder), if given, fills in the new row's isbn
+    (extract.grouped_isbn: the read FUSED_GROUPING already did).
     """
     grouped_dir = Path(grouped_dir)
     if not grouped_dir.exists():
@@ -79,7 +82,8 @@ def sync_pending_books(grouped_dir: str | Path) -> int:
                 continue
             if str(folder) in existing:
                 continue
-            s.add(Book(folder_path=str(folder), status="pending"))
+            isbn = isbn_for(folder) if isbn_for is not None else None
+            s.add(Book(folder_path=str(folder), status="pending", isbn=isbn))
             added += 1
         s.commit()
         return added
@@ -91,6 +95,7 @@ def reset_dev_pending_books() -> int:
     from the same clean slate instead of piling up more books every run.
     Never touches available/sold_out rows - those are real listing/sale
     history, not dev fixtures, and must survive regardless of DEV_MODE.
+    The caller resets group_photos' book numbering afterwards.
     """
     with SessionLocal() as s:
         rows = s.execute(select(Book).where(Book.status.in_(("pending", "failed")))).scalars().all()
@@ -102,4 +107,4 @@ def reset_dev_pending_books() -> int:
             s.delete(book)
             removed += 1
         s.commit()
-        return removed
+    return removed
@@ -0,0 +1,186 @@
+"""
+Duplicate detection for photos_raw/. A photo that's in there twice - a
+Discord re-upload, a USB copy made twice, a double-tapped shutter - shifts
+every chronological (cover, isbn) pair after it by one, which means a whole
+batch mis-paired and a lookup cycle wasted on nonsense books.
+
+Two kinds are caught, both judged against the earliest photo they match:
+exact duplicates (same bytes - only files of the same size are ever hashed)
+and near-identical ones, by a 64-bit difference hash (dHash) within a few
+bits - but only between photos taken within NEAR_SECONDS of each other, so
+two copies of the same book photographed minutes apart are never mistaken
+for one. Hashes live in a small index, .raw_hashes.json (disposable - safe
+to delete), keyed by name + size + mtime, so each photo is read at most once.
+
+mark_not_duplicate records a photo the user says isn't one; it's never
+flagged again.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+from PIL import Image
+
+from .images import load_image_any
+
+_HASH_INDEX_PATH = Path(".raw_hashes.json")
+
+# Near-identical: dHashes at most this many bits apart (of 64), between
+# photos whose capture times are at most this many seconds apart.
+NEAR_BITS = 5
+NEAR_SECONDS = 5.0
+
+_HASH_CHUNK = 1 << 20
+
+_lock = threading.Lock()
+
+
+def _load_index() -> dict:
+    try:
+        index = json.loads(_HASH_INDEX_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"photos": {}, "kept": []}
+    index.setdefault("photos", {})
+    index.setdefault("kept", [])
+    return index
+
+
+def _save_index(index: dict) -> None:
+    tmp = _HASH_INDEX_PATH.with_name(_HASH_INDEX_PATH.name + ".tmp")
+    tmp.write_text(json.dumps(index), encoding="utf-8")
+    os.replace(tmp, _HASH_INDEX_PATH)
+
+
+def _content_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _dhash(path: Path) -> int:
+    """Difference hash: 8x8 brightness gradients of a 9x8 grayscale thumbnail."""
+    img = load_image_any(path)
+    img.draft("L", (64, 64))  # JPEG: decode straight at a tiny size
+    small = img.convert("L").resize((9, 8), Image.Resampling.BOX)
+    px = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] < px[row * 9 + col + 1])
+    return bits
+
+
+def _telling(dhash: int | None) -> bool:
+    """Whether a dHash says anything about the photo. A flat or evenly
+    shaded frame (a lens cap, a blank wall) hashes to almost all zeros or
+    all ones, whatever it shows - near-identical to every other one."""
+    return dhash is not None and NEAR_BITS < dhash.bit_count() < 64 - NEAR_BITS
+
+
+class _Hashes:
+    """Lazily computed, index-backed hashes for one call over one listing."""
+
+    def __init__(self, index: dict, stats: dict[Path, os.stat_result]):
+        self._photos = index["photos"]
+        self._stats = stats
+        self.changed = False
+
+    def _entry(self, path: Path) -> list:
+        st = self._stats[path]
+        entry = self._photos.get(path.name)
+        if not entry or entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+            entry = self._photos[path.name] = [st.st_size, st.st_mtime_ns, None, None]
+            self.changed = True
+        return entry
+
+    def content(self, path: Path) -> str:
+        entry = self._entry(path)
+        if entry[2] is None:
+            entry[2] = _content_hash(path)
+            self.changed = True
+        return entry[2]
+
+    def perceptual(self, path: Path) -> int | None:
+        entry = self._entry(path)
+        if entry[3] is None:
+            try:
+                entry[3] = _dhash(path)
+            except Exception:  # unreadable: can't be judged near-identical to anything
+                return None
+            self.changed = True
+        return entry[3]
+
+    def prune(self, names: set[str]) -> None:
+        stale = self._photos.keys() - names
+        for name in stale:
+            del self._photos[name]
+        self.changed = self.changed or bool(stale)
+
+
+def find_duplicates(listing: list[tuple[Path, float]]) -> dict[Path, Path]:
+    """
+    duplicate -> the earlier photo it duplicates, for a chronological
+    [(photo, capture time)] listing (group_photos.raw_photos' order). The
+    earliest of each set of duplicates is the one kept.
+    """
+    stats = {}
+    for photo, _ in listing:
+        try:
+            stats[photo] = photo.stat()
+        except FileNotFoundError:
+            pass
+    listing = [(photo, taken) for photo, taken in listing if photo in stats]
+
+    with _lock:
+        index = _load_index()
+        kept = set(index["kept"])
+        hashes = _Hashes(index, stats)
+        duplicates: dict[Path, Path] = {}
+
+        by_size: dict[int, list[Path]] = defaultdict(list)
+        for photo, _ in listing:
+            by_size[stats[photo].st_size].append(photo)
+        first_with: dict[str, Path] = {}
+        for same_size in by_size.values():
+            if len(same_size) < 2:
+                continue
+            for photo in same_size:  # chronological, as listing is
+                key = hashes.content(photo)
+                if key in first_with and key not in kept:
+                    duplicates[photo] = first_with[key]
+                else:
+                    first_with.setdefault(key, photo)
+
+        remaining = [(photo, taken) for photo, taken in listing if photo not in duplicates]
+        for j, (photo, taken) in enumerate(remaining):
+            for earlier, earlier_taken in reversed(remaining[:j]):
+                if taken - earlier_taken > NEAR_SECONDS:
+                    break
+                if earlier in duplicates:
+                    continue
+                a, b = hashes.perceptual(earlier), hashes.perceptual(photo)
+                if a is None or b is None or not _telling(a) or not _telling(b) or (a ^ b).bit_count() > NEAR_BITS:
+                    continue
+                if hashes.content(photo) not in kept:
+                    duplicates[photo] = earlier
+                break
+
+        hashes.prune({photo.name for photo, _ in listing})
+        if hashes.changed:
+            _save_index(index)
+    return duplicates
+
+
+def mark_not_duplicate(path: Path) -> None:
+    """Never flag this photo (these exact bytes) as a duplicate again."""
+    key = _content_hash(Path(path))
+    with _lock:
+        index = _load_index()
+        if key not in index["kept"]:
+            index["kept"].append(key)
+            _save_index(index)
@@ -0,0 +1,264 @@
+"""
+A photo's EXIF capture date read straight out of its container bytes -
+no image library involved. group_photos sorts every raw photo by capture
+time, and opening a HEIC through pillow-heif just for that means libheif
+parsing the whole container (and more) per photo: a few hundred HEICs took
+seconds. Here only the few KB of headers that hold the EXIF block are read,
+with a hard cap on how much of the file is ever touched.
+
+Understands JPEG (the APP1 "Exif" segment) and HEIF/HEIC (the "Exif" item
+located through the meta box's iinf/iloc). Anything else, or anything
+malformed, raises ValueError so the caller can fall back to a full open.
+
+Also locates a JPEG's Orientation tag, byte-exact, so rotating a photo can
+rewrite those two bytes instead of re-encoding its pixels - or tells it
+there is EXIF but no such tag (NoOrientationTag), so it can rebuild just
+that segment.
+"""
+import struct
+from pathlib import Path
+
+# Never read more than this much of a file looking for EXIF.
+_MAX_READ = 256 * 1024
+
+_JPEG_EXTS = {".jpg", ".jpeg"}
+_HEIF_EXTS = {".heic", ".heif"}
+
+_TAG_ORIENTATION = 0x0112
+_TAG_DATETIME = 0x0132
+_TAG_EXIF_IFD = 0x8769
+_TAG_DATETIME_ORIGINAL = 0x9003
+_TYPE_ASCII = 2
+_TYPE_SHORT = 3
+
+
+class NoOrientationTag(ValueError):
+    """The JPEG has EXIF, but no Orientation tag in it."""
+
+
+def read_exif_datetime(path: Path) -> str | None:
+    """
+    EXIF DateTimeOriginal, else DateTime ("YYYY:MM:DD HH:MM:SS"), or None if
+    the photo has EXIF but no date in it - or no EXIF at all. Raises
+    ValueError when the file isn't a JPEG/HEIF this can parse.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    try:
+        with open(path, "rb") as f:
+            if suffix in _JPEG_EXTS:
+                tiff = _jpeg_exif(f.read(_MAX_READ))
+            elif suffix in _HEIF_EXTS:
+                tiff = _heif_exif(f)
+            else:
+                raise ValueError(f"not a JPEG/HEIF: {path.name}")
+        return _tiff_datetime(tiff) if tiff is not None else None
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"malformed EXIF header in {path.name}") from e
+
+
+def jpeg_orientation(data: bytes) -> tuple[int, int, str] | None:
+    """
+    A JPEG's EXIF Orientation as (value, offset of its two bytes in `data`,
+    TIFF byte order), or None if it has no EXIF at all. Raises ValueError
+    when the header can't be parsed, or its EXIF has no Orientation tag that
+    could be rewritten in place - NoOrientationTag when it has none at all.
+    """
+    try:
+        span = jpeg_exif_span(data)
+        if span is None:
+            return None
+        start, end = span
+        tiff = data[start:end]
+        order = _byte_order(tiff)
+        (ifd0,) = struct.unpack(order + "I", tiff[4:8])
+        entry = _ifd_entries(tiff, order, ifd0).get(_TAG_ORIENTATION)
+        if entry is None:
+            raise NoOrientationTag("EXIF has no Orientation tag")
+        if entry[0] != _TYPE_SHORT or entry[2] != 1:
+            raise ValueError("EXIF has no Orientation tag")
+        (value,) = struct.unpack(order + "H", tiff[entry[3]:entry[3] + 2])
+        return value, start + entry[3], order
+    except (struct.error, IndexError) as e:
+        raise ValueError("malformed JPEG EXIF header") from e
+
+
+def _jpeg_exif(data: bytes) -> bytes | None:
+    """The TIFF block of a JPEG's APP1 Exif segment, None if it has none."""
+    span = jpeg_exif_span(data)
+    return data[span[0]:span[1]] if span is not None else None
+
+
+def jpeg_exif_span(data: bytes) -> tuple[int, int] | None:
+    """(start, end) of the TIFF block of a JPEG's APP1 Exif segment, None
+    if it has none. The segment itself starts 10 bytes earlier (marker,
+    length, "Exif\\0\\0")."""
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("no JPEG SOI marker")
+    pos = 2
+    while True:
+        if data[pos] != 0xFF:
+            raise ValueError("lost JPEG marker sync")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0xDA, 0xD9):  # start of scan / end of image: no EXIF before the pixels
+            return None
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        if pos + 2 + length > len(data):
+            raise ValueError("JPEG header larger than the read cap")
+        if marker == 0xE1 and data[pos + 4:pos + 10] == b"Exif\x00\x00":
+            return pos + 10, pos + 2 + length
+        pos += 2 + length
+
+
+def _boxes(data: bytes, start: int = 0, end: int | None = None):
+    """(type, payload start, payload end) of each ISOBMFF box in data[start:end]."""
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", data[pos + 8:pos + 16])
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            raise ValueError("bad ISOBMFF box size")
+        yield box_type, pos + header, min(pos + size, end)
+        pos += size
+
+
+def _uint(data: bytes, pos: int, size: int) -> int:
+    return int.from_bytes(data[pos:pos + size], "big") if size else 0
+
+
+def _heif_exif(f) -> bytes | None:
+    """The TIFF block of a HEIF's Exif item, None if it has none."""
+    head = f.read(_MAX_READ)
+    meta = next(((s, e) for t, s, e in _boxes(head) if t == b"meta"), None)
+    if meta is None:
+        raise ValueError("no HEIF meta box within the read cap")
+    meta_start, meta_end = meta[0] + 4, meta[1]  # meta is a FullBox: skip version/flags
+
+    exif_id = None
+    iloc = idat = None
+    for box_type, start, end in _boxes(head, meta_start, meta_end):
+        if box_type == b"iinf":
+            exif_id = _iinf_exif_id(head, start, end)
+        elif box_type == b"iloc":
+            iloc = (start, end)
+        elif box_type == b"idat":
+            idat = start
+    if exif_id is None:
+        return None
+    if iloc is None:
+        raise ValueError("HEIF has an Exif item but no iloc box")
+
+    method, extents = _iloc_extents(head, iloc[0], exif_id)
+    payload = b""
+    for offset, length in extents:
+        if method == 1:  # offset into this meta box's idat
+            if idat is None:
+                raise ValueError("HEIF Exif item in a missing idat box")
+            payload += head[idat + offset:idat + offset + length]
+        else:
+            if length > _MAX_READ:
+                raise ValueError("HEIF Exif item larger than the read cap")
+            f.seek(offset)
+            payload += f.read(length)
+    # An Exif item starts with a 4-byte offset to the TIFF header.
+    (skip,) = struct.unpack(">I", payload[:4])
+    return payload[4 + skip:]
+
+
+def _iinf_exif_id(data: bytes, start: int, end: int) -> int | None:
+    version = data[start]
+    pos = start + 4 + (2 if version == 0 else 4)  # skip entry_count
+    for box_type, s, _ in _boxes(data, pos, end):
+        if box_type != b"infe":
+            continue
+        infe_version = data[s]
+        if infe_version < 2:
+            continue
+        id_size = 2 if infe_version == 2 else 4
+        item_id = _uint(data, s + 4, id_size)
+        item_type = data[s + 4 + id_size + 2:s + 4 + id_size + 6]
+        if item_type == b"Exif":
+            return item_id
+    return None
+
+
+def _iloc_extents(data: bytes, start: int, item_id: int) -> tuple[int, list[tuple[int, int]]]:
+    """(construction method, [(offset, length)]) for one item in an iloc box."""
+    version = data[start]
+    pos = start + 4
+    offset_size, length_size = data[pos] >> 4, data[pos] & 0x0F
+    base_offset_size, index_size = data[pos + 1] >> 4, data[pos + 1] & 0x0F
+    pos += 2
+    id_size = 2 if version < 2 else 4
+    item_count = _uint(data, pos, id_size)
+    pos += id_size
+    for _ in range(item_count):
+        this_id = _uint(data, pos, id_size)
+        pos += id_size
+        method = 0
+        if version in (1, 2):
+            method = _uint(data, pos, 2) & 0x0F
+            pos += 2
+        pos += 2  # data_reference_index
+        base_offset = _uint(data, pos, base_offset_size)
+        pos += base_offset_size
+        extent_count = _uint(data, pos, 2)
+        pos += 2
+        extents = []
+        for _ in range(extent_count):
+            if version in (1, 2):
+                pos += index_size
+            offset = _uint(data, pos, offset_size)
+            length = _uint(data, pos + offset_size, length_size)
+            pos += offset_size + length_size
+            extents.append((base_offset + offset, length))
+        if this_id == item_id:
+            return method, extents
+    raise ValueError("HEIF Exif item missing from iloc")
+
+
+def _byte_order(tiff: bytes) -> str:
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None:
+        raise ValueError("bad TIFF byte order")
+    return order
+
+
+def _tiff_datetime(tiff: bytes) -> str | None:
+    order = _byte_order(tiff)
+    (ifd0,) = struct.unpack(order + "I", tiff[4:8])
+    root = _ifd_entries(tiff, order, ifd0)
+    original = None
+    if _TAG_EXIF_IFD in root:
+        exif_ifd = _ifd_entries(tiff, order, root[_TAG_EXIF_IFD][1])
+        original = _ascii(tiff, order, exif_ifd.get(_TAG_DATETIME_ORIGINAL))
+    return original or _ascii(tiff, order, root.get(_TAG_DATETIME))
+
+
+def _ifd_entries(tiff: bytes, order: str, offset: int) -> dict[int, tuple[int, int, int, int]]:
+    """tag -> (type, value/offset, count, entry position) for one IFD."""
+    (count,) = struct.unpack(order + "H", tiff[offset:offset + 2])
+    entries = {}
+    for i in range(count):
+        pos = offset + 2 + 12 * i
+        tag, typ, n, value = struct.unpack(order + "HHII", tiff[pos:pos + 12])
+        entries[tag] = (typ, value, n, pos + 8)
+    return entries
+
+
+def _ascii(tiff: bytes, order: str, entry: tuple[int, int, int, int] | None) -> str | None:
+    if entry is None or entry[0] != _TYPE_ASCII:
+        return None
+    _, value, n, inline = entry
+    start = inline if n <= 4 else value
+    text = tiff[start:start + n].split(b"\x00", 1)[0].decode("ascii", "replace").strip()
+    return text or None
@@ -17,17 +17,37 @@ Lookup Priority:
 A source is never allowed to overwrite a field another source already filled;
 sources are only asked to fill in whatever is still missing. Lookups stop as
 soon as both title and author are filled, or once all sources are exhausted.
+
+The sources are asked as a staggered hedge rather than strictly one after
+another: each lower-priority source starts LOOKUP_STAGGER_SECONDS after the
+one above it actually sent its request (or straight away, once everything
+above it has answered without filling both fields), so a slow or missing
+answer from Vinted no longer adds its full round trip before Almedina is
+even asked. The stagger only counts from when a request goes out, not from
+when it joined its host's queue (see rate_limit): a source merely waiting
+its turn there holds back the ones below it, so a paced bulk run doesn't
+end up asking every source about every book. Answers are still merged in
+priority order - a lower source that answers first never wins a field a
+higher one fills - and sources not started by the time the result is
+settled are never asked at all; one started but still queued at the rate
+limiter then never sends its request.
+
+Each source's answer is recorded in the isbn_metadata table (see
+blt.isbn_metadata) and reused while it's fresh, so a repeated ISBN usually
+costs no network at all; refresh=True (`blt extract --refresh`, the single
+"Procurar" button) asks every source again regardless.
 """
-import random
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 from sqlalchemy import select
 
-from . import db
+from . import barcode_cache, db, isbn_metadata, rate_limit
 from .almedina_lookup import AlmedinaLookupError
 from .almedina_lookup import lookup_by_isbn as almedina_lookup_by_isbn
-from .barcode import decode_isbn_barcode
+from .barcode import decode_isbn_barcode, decode_isbn_barcodes
 from .config import settings
 from .isbnsearch_lookup import IsbnSearchLookupError
 from .isbnsearch_lookup import lookup_by_isbn as isbnsearch_lookup_by_isbn
@@ -37,47 +57,136 @@ from .vinted_lookup import VintedLookupError
 from .vinted_lookup import lookup_by_isbn as vinted_lookup_by_isbn
 
 
-def extract_book_fields(folder: Path) -> dict:
+def extract_book_fields(folder: Path, refresh: bool = False) -> dict:
     """
     Returns {"title", "author", "isbn"}. `title` is None when the book could
     not be resolved (no barcode, or neither Vinted, Almedina, nor isbnsearch.org
     has a title for it) - the caller marks that book status="failed" for manual
     entry. The barcode-decoded ISBN is kept even when unresolved, since it's
-    still valid on its own.
+    still valid on its own. refresh=True ignores (and overwrites) every
+    cached source answer.
     """
     folder = Path(folder)
     isbn = decode_isbn_barcode(folder / "isbn.jpg")
     if not isbn:
         return {"title": None, "author": None, "isbn": None}
 
-    title: str | None = None
-    author: str | None = None
-
     sources = (
-        (vinted_lookup_by_isbn, VintedLookupError),
-        (almedina_lookup_by_isbn, AlmedinaLookupError),
-        (isbnsearch_lookup_by_isbn, IsbnSearchLookupError),
+        ("vinted", vinted_lookup_by_isbn, VintedLookupError),
+        ("almedina", almedina_lookup_by_isbn, AlmedinaLookupError),
+        ("isbnsearch", isbnsearch_lookup_by_isbn, IsbnSearchLookupError),
     )
+    title, author = _lookup_hedged(isbn, sources, settings.LOOKUP_STAGGER_SECONDS, refresh)
+    return {"title": title, "author": author, "isbn": isbn}
+
+
+# One lock per lookup function: a source still answering for the previous
+# book (its result no longer needed) is never asked a second time in
+# parallel - each keeps its own single HTTP session.
+_source_locks: dict = {}
+_source_locks_lock = threading.Lock()
+
+
+class _Abandoned(Exception):
+    """The book's answer was settled while this lookup waited its turn."""
 
-    for lookup, error_cls in sources:
-        if title and author:
-            break
 
+def _ask(source: str, lookup, error_cls, isbn: str, refresh: bool, on_sent, abandoned: threading.Event) -> dict:
+    """One source's answer ({} when it doesn't know the book or failed),
+    from isbn_metadata while it's fresh, else asked live and recorded.
+    on_sent() is called as its request goes out (see rate_limit.on_pass);
+    once `abandoned` is set, a request not sent yet never is."""
+    if not refresh:
+        cached = isbn_metadata.get(isbn, source)
+        if cached is not None:
+            return cached
+
+    def passed():
+        if abandoned.is_set():
+            raise _Abandoned
+        on_sent()
+
+    with _source_locks_lock:
+        lock = _source_locks.setdefault(lookup, threading.Lock())
+    with lock:
+        if abandoned.is_set():
+            return {}
         try:
-            looked_up = lookup(isbn)
-        except error_cls:
-            looked_up = None
+            with rate_limit.on_pass(passed):
+                looked_up = lookup(isbn) or {}
+        except (_Abandoned, error_cls):
+            # (a source may wrap _Abandoned in its own error on the way out)
+            return {}
+    isbn_metadata.put(isbn, source, looked_up)
+    return looked_up
 
-        if not looked_up:
-            continue
 
-        title = title or looked_up.get("title")
-        author = author or looked_up.get("author")
+def _lookup_hedged(isbn: str, sources, stagger: float, refresh: bool = False) -> tuple[str | None, str | None]:
+    """
+    (title, author) from `sources` ((name, lookup, error class), highest
+    priority first), merged in priority order. Source k starts `stagger`
+    seconds after source k-1's request went out (or it answered), or as soon
+    as every source before it has answered. Returns once the answers from
+    an unbroken run of sources from the top fill both fields - nothing
+    further down could change them - without waiting on the rest (a request
+    already sent is left to finish in the background; one not sent yet
+    never is, and a source not started yet is never asked).
+    """
+    futures: list[Future] = []
+    sent_at: list[float | None] = []
+    changed = threading.Event()
+    abandoned = threading.Event()
+    lock = threading.Lock()
+    pool = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="isbn-lookup")
+
+    def start():
+        k = len(futures)
+        name, lookup, error_cls = sources[k]
+        sent_at.append(None)
 
-    return {"title": title, "author": author, "isbn": isbn}
+        def on_sent():
+            with lock:
+                if sent_at[k] is None:
+                    sent_at[k] = time.monotonic()
+            changed.set()
+
+        future = pool.submit(_ask, name, lookup, error_cls, isbn, refresh, on_sent, abandoned)
+        future.add_done_callback(lambda f: on_sent())
+        futures.append(future)
 
+    try:
+        while True:
+            changed.clear()
+            title = author = None
+            for future in futures:
+                if not future.done():
+                    break
+                looked_up = future.result()
+                title = title or looked_up.get("title")
+                author = author or looked_up.get("author")
+                if title and author:
+                    return title, author
+            else:  # every source started so far has answered
+                if len(futures) == len(sources):
+                    return title, author
+                start()
+                continue
 
-def _extract_with_dev_cache(s, folder: Path) -> dict:
+            timeout = None
+            with lock:
+                last_sent = sent_at[-1]
+            if len(futures) < len(sources) and last_sent is not None:
+                timeout = last_sent + stagger - time.monotonic()
+                if timeout <= 0:
+                    start()
+                    continue
+            changed.wait(timeout)
+    finally:
+        abandoned.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_with_dev_cache(s, folder: Path, refresh: bool = False) -> dict:
     """
     DEV_MODE only: if we already have a resolved title for this exact ISBN
     from an earlier real lookup (any book, any status), reuse it instead of
@@ -97,19 +206,69 @@ def _extract_with_dev_cache(s, folder: Path) -> dict:
     if cached:
         return {"title": cached.title, "author": cached.author, "isbn": isbn}
 
-    return extract_book_fields(folder)
+    return extract_book_fields(folder, refresh=refresh)
+
+
+def grouped_isbn(folder: Path) -> str | None:
+    """The ISBN FUSED_GROUPING already read off this folder's isbn.jpg while
+    grouping it - a barcode cache lookup only, never a decode - for
+    db.sync_pending_books to store on the new row. None without
+    FUSED_GROUPING."""
+    photo = Path(folder) / "isbn.jpg"
+    if not settings.FUSED_GROUPING or not photo.exists():
+        return None
+    cached = barcode_cache.get(barcode_cache.file_key(photo))
+    return cached[0] if cached else None
+
+
+def prefetch_barcodes(folders: list[Path], on_progress=None) -> dict[Path, str | None]:
+    """Decodes every folder's isbn.jpg in parallel (see
+    barcode.decode_isbn_barcodes), warming the barcode cache that
+    extract_book_fields reads through. Returns {isbn photo: isbn or None}."""
+    workers = settings.BARCODE_WORKERS or None
+    return decode_isbn_barcodes([Path(f) / "isbn.jpg" for f in folders], workers=workers, on_progress=on_progress)
+
+
+def group_by_isbn(folders: list[Path], read: dict[Path, str | None] | None) -> list[list[int]]:
+    """
+    Positions in `folders` grouped by the ISBN read off each one's isbn.jpg
+    (prefetch_barcodes' result), in first-seen order: several copies of the
+    same book need only one lookup between them. A folder whose barcode
+    wasn't read is a group of its own.
+    """
+    read = read or {}
+    by_isbn: dict[str, list[int]] = {}
+    groups: list[list[int]] = []
+    for i, folder in enumerate(folders):
+        isbn = read.get(Path(folder) / "isbn.jpg")
+        if isbn is None:
+            groups.append([i])
+            continue
+        if isbn not in by_isbn:
+            by_isbn[isbn] = []
+            groups.append(by_isbn[isbn])
+        by_isbn[isbn].append(i)
+    return groups
 
 
-def extract_pending_books(limit: int | None = None) -> dict:
+def extract_pending_books(limit: int | None = None, refresh: bool = False) -> dict:
     """
     Runs extract_book_fields() over every Book row still status="pending"
     with no title yet: fills in title/author/isbn/description/price when
     resolved, or marks status="failed" (keeping the ISBN, if any) for manual
-    entry when not. Commits after each book, so interrupting mid-run only
-    loses the book in progress, and re-running only touches what's still
-    status="pending" - already-failed rows are left alone. A small random
-    delay between books keeps a multi-book run well under either lookup's
-    observed rate limit.
+    entry when not. Commits after each book (or copies of one book), so
+    interrupting mid-run only loses the book in progress, and re-running only touches what's still
+    status="pending" - already-failed rows are left alone. Pacing is per
+    lookup host (see rate_limit), so books resolved from recorded answers
+    don't wait at all.
+
+    Runs in two phases. Every book's barcode is read up front, across
+    BARCODE_WORKERS processes, before the first lookup starts; then each
+    distinct ISBN is looked up once, for the first book carrying it, and
+    the result is applied to every copy (group_by_isbn). The paced network
+    part never waits on image work, and a batch holding several copies of
+    one book pays for one lookup. refresh=True asks every lookup source
+    again instead of reusing its recorded answers (see isbn_metadata).
     """
     with db.SessionLocal() as s:
         query = select(Book).where(Book.status == "pending", Book.title.is_(None))
@@ -117,30 +276,34 @@ def extract_pending_books(limit: int | None = None) -> dict:
             query = query.limit(limit)
         books = s.execute(query).scalars().all()
 
-        resolved = failed = 0
-        for i, book in enumerate(books):
-            if i > 0:
-                time.sleep(random.uniform(2, 5))
+        read = prefetch_barcodes([Path(book.folder_path) for book in books])
+        if read:
+            print(f"{len(read)} código(s) de barras lido(s) antes das pesquisas")
 
+        resolved = failed = 0
+        for group in group_by_isbn([Path(book.folder_path) for book in books], read):
+            first = books[group[0]]
             if settings.DEV_MODE:
-                fields = _extract_with_dev_cache(s, Path(book.folder_path))
+                fields = _extract_with_dev_cache(s, Path(first.folder_path), refresh=refresh)
             else:
-                fields = extract_book_fields(Path(book.folder_path))
-
-            if fields["title"]:
-                listing = compose_listing(fields)
-                book.title = listing["title"]
-                book.author = listing["author"]
-                book.isbn = listing["isbn"]
-                book.description = listing["description"]
-                book.price = listing["price"]
-                resolved += 1
-                print(f"[{book.folder_path}] resolvido: {book.title}")
-            else:
-                book.isbn = fields["isbn"]
-                book.status = "failed"
-                failed += 1
-                print(f"[{book.folder_path}] nao foi possivel resolver - marcado como failed")
+                fields = extract_book_fields(Path(first.folder_path), refresh=refresh)
+            listing = compose_listing(fields) if fields["title"] else None
+
+            for i in group:
+                book = books[i]
+                if listing:
+                    book.title = listing["title"]
+                    book.author = listing["author"]
+                    book.isbn = listing["isbn"]
+                    book.description = listing["description"]
+                    book.price = listing["price"]
+                    resolved += 1
+                    print(f"[{book.folder_path}] resolvido: {book.title}")
+                else:
+                    book.isbn = fields["isbn"]
+                    book.status = "failed"
+                    failed += 1
+                    print(f"[{book.folder_path}] nao foi possivel resolver - marcado como failed")
             s.commit()
 
         return {"resolved": resolved, "failed": failed}
@@ -1,28 +1,52 @@
+import json
+import os
 import re
 import shutil
+import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 
 from PIL.ExifTags import IFD
 from rich import print as rprint
 
+from . import barcode_cache
+from .barcode import read_isbn_barcode
 from .config import settings
+from .dedup import find_duplicates
+from .exif_header import read_exif_datetime
 from .images import IMG_EXTS, load_image_any
 
 _DATETIME_ORIGINAL = 36867  # Exif sub-IFD tag
 _DATETIME = 306  # root IFD tag ("DateTime")
 
 
+def _exif_datetime_via_image(p: Path) -> str | None:
+    """The slow path: a full image open (for HEIC, all of libheif's parsing)
+    just to read EXIF - only for what exif_header can't parse itself."""
+    exif = load_image_any(p).getexif()
+    dt_str = None
+    try:
+        dt_str = exif.get_ifd(IFD.Exif).get(_DATETIME_ORIGINAL)
+    except Exception:
+        pass
+    return dt_str or exif.get(_DATETIME)
+
+
 def _capture_time(p: Path) -> float:
-    """Prefer EXIF DateTimeOriginal, then EXIF DateTime, then fall back to file mtime."""
+    """Prefer EXIF DateTimeOriginal, then EXIF DateTime, then fall back to file mtime.
+    EXIF comes straight from the file's header bytes (exif_header) whenever
+    it's a JPEG/HEIF that parses, falling back to opening the image."""
     try:
-        exif = load_image_any(p).getexif()
-        dt_str = None
         try:
-            dt_str = exif.get_ifd(IFD.Exif).get(_DATETIME_ORIGINAL)
-        except Exception:
-            pass
-        dt_str = dt_str or exif.get(_DATETIME)
+            dt_str = read_exif_datetime(p)
+        except ValueError:
+            dt_str = _exif_datetime_via_image(p)
         if dt_str:
             return datetime.strptime(dt_str, "%Y:%m:%d %H:%M:%S").timestamp()
     except Exception:
@@ -30,7 +54,129 @@ def _capture_time(p: Path) -> float:
     return p.stat().st_mtime
 
 
+# Capture times of every raw photo seen so far, keyed by name + size +
+# mtime, so listing RAW_DIR (every page render, via the sidebar's progress
+# bar) only opens photos it hasn't seen before. Disposable - deleting it
+# just means the next listing opens everything once more.
+_RAW_INDEX_PATH = Path(".raw_index.json")
+
+# A directory whose mtime is this recent may still be mid-copy (a file
+# created but its own mtime not set yet, as discord_fetch and `cp -p` both
+# do), so a listing taken then isn't reused without re-checking.
+_SETTLE_SECONDS = 2.0
+
+_raw_index_lock = threading.Lock()
+# raw dir -> (its mtime_ns when listed, settled then?, [(photo, capture time)])
+_raw_listings: dict[str, tuple[int, bool, list[tuple[Path, float]]]] = {}
+
+
+def _load_raw_index(raw: Path) -> dict[str, list]:
+    try:
+        data = json.loads(_RAW_INDEX_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if data.get("raw_dir") != str(raw.resolve()):
+        return {}
+    return data.get("photos", {})
+
+
+def _save_raw_index(raw: Path, photos: dict[str, list]) -> None:
+    tmp = _RAW_INDEX_PATH.with_name(_RAW_INDEX_PATH.name + ".tmp")
+    tmp.write_text(json.dumps({"raw_dir": str(raw.resolve()), "photos": photos}), encoding="utf-8")
+    os.replace(tmp, _RAW_INDEX_PATH)
+
+
+def raw_photos(raw_dir: Path | None = None, on_new: Callable[[list[Path]], object] | None = None) -> list[Path]:
+    """
+    Every image in raw_dir, chronologically (see _capture_time). Backed by
+    the raw index: a photo is only opened the first time it's seen (or
+    after it changes), and while the directory itself hasn't changed since
+    the last call nothing is even listed again - so this costs the same
+    with 5 raw photos as with 2,000. on_new, if given, is called with those
+    first-seen photos (how the web app warms thumbnails for new arrivals).
+    """
+    return [photo for photo, _ in _raw_listing(raw_dir, on_new)]
+
+
+def _raw_listing(
+    raw_dir: Path | None = None, on_new: Callable[[list[Path]], object] | None = None,
+) -> list[tuple[Path, float]]:
+    """raw_photos, with each photo's capture time."""
+    raw = Path(raw_dir) if raw_dir is not None else Path(settings.RAW_DIR)
+    try:
+        dir_mtime = raw.stat().st_mtime_ns
+    except FileNotFoundError:
+        return []
+
+    with _raw_index_lock:
+        cached = _raw_listings.get(str(raw))
+        if cached and cached[0] == dir_mtime and cached[1]:
+            return list(cached[2])
+
+        index = _load_raw_index(raw)
+        photos: dict[str, list] = {}
+        listing: list[tuple[Path, float]] = []
+        new: list[Path] = []
+        for entry in os.scandir(raw):
+            path = Path(entry.path)
+            if path.suffix.lower() not in IMG_EXTS or not entry.is_file():
+                continue
+            st = entry.stat()
+            known = index.get(entry.name)
+            if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+                captured = known[2]
+            else:
+                captured = _capture_time(path)
+                new.append(path)
+            photos[entry.name] = [st.st_size, st.st_mtime_ns, captured]
+            listing.append((path, captured))
+        listing.sort(key=lambda item: (item[1], item[0].name))
+
+        if photos != index:
+            _save_raw_index(raw, photos)
+        settled = time.time() - dir_mtime / 1e9 >= _SETTLE_SECONDS
+        _raw_listings[str(raw)] = (dir_mtime, settled, listing)
+    if new and on_new is not None:
+        on_new(sorted(new))
+    return list(listing)
+
+
+def raw_duplicates(raw_dir: Path | None = None) -> dict[Path, Path]:
+    """Raw photos that duplicate an earlier one (see dedup) -> that earlier
+    photo. propose_pairs leaves them out."""
+    return find_duplicates(_raw_listing(raw_dir))
+
+
+def quarantine_duplicates(raw_dir: Path | None = None, duplicates: dict[Path, Path] | None = None) -> list[Path]:
+    """
+    Moves every raw duplicate (`duplicates`, when the caller already has
+    raw_duplicates' answer) into DUPLICATES_DIR, out of the way of grouping
+    (and of the next listing), returning where each one went - nothing is
+    deleted. In DEV_MODE, where photos_raw/ is never modified, duplicates
+    are only left out of the pairs, not moved.
+    """
+    if duplicates is None:
+        duplicates = raw_duplicates(raw_dir)
+    if not duplicates or settings.DEV_MODE:
+        return []
+    quarantine = Path(settings.DUPLICATES_DIR)
+    quarantine.mkdir(parents=True, exist_ok=True)
+    moved = []
+    for photo, original in duplicates.items():
+        dest = quarantine / photo.name
+        n = 1
+        while dest.exists():
+            dest = quarantine / f"{photo.stem}_{n}{photo.suffix}"
+            n += 1
+        photo.replace(dest)
+        moved.append(dest)
+        rprint(f"[yellow]{photo.name} é um duplicado de {original.name} - movido para {quarantine}/[/yellow]")
+    return moved
+
+
 def _next_book_index(base: Path) -> int:
+    """One past the highest book_NNN in base - a full listing, so only used
+    to (re)seed the book index counter, never per pair."""
     base.mkdir(parents=True, exist_ok=True)
     existing = [p for p in base.iterdir() if p.is_dir() and re.match(r"book_\d{3,}$", p.name)]
     if not existing:
@@ -39,6 +185,86 @@ def _next_book_index(base: Path) -> int:
     return max(nums) + 1
 
 
+# Next free book_NNN index, kept in GROUPED_DIR so reserving indices doesn't
+# mean listing thousands of book folders every time. Guarded by an OS file
+# lock (flock, or msvcrt.locking on Windows) on a lock file that's never
+# deleted, so the web app and a CLI group-all running at once never hand
+# out the same number - and a process that dies holding it has it released
+# by the OS, leaving nothing stale to break.
+_BOOK_INDEX_FILE = ".next_book_index"
+_BOOK_INDEX_LOCK = ".next_book_index.lock"
+
+if sys.platform == "win32":
+    import msvcrt
+
+    def _lock_file(f) -> None:
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after ~10 s of retries
+                return
+            except OSError:
+                continue
+
+    def _unlock_file(f) -> None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(f) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f) -> None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def _book_index_lock(base: Path):
+    with open(base / _BOOK_INDEX_LOCK, "a+b") as f:
+        _lock_file(f)
+        try:
+            yield
+        finally:
+            _unlock_file(f)
+
+
+def _reserve_book_indices(base: Path, count: int) -> range:
+    """
+    Reserves `count` consecutive book indices in base - a counter read and
+    bumped under the lock, so a whole group_all batch costs one small file
+    read/write instead of a directory listing per pair. The counter is
+    (re)seeded from the folders actually there when it's missing, or when
+    it points at a folder that already exists (one not numbered through
+    here). Indices reserved but never used (a crash mid-batch) are simply
+    skipped, never handed out twice.
+    """
+    base.mkdir(parents=True, exist_ok=True)
+    counter = base / _BOOK_INDEX_FILE
+    with _book_index_lock(base):
+        try:
+            start = int(counter.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            start = _next_book_index(base)
+        if any((base / f"book_{i:03d}").exists() for i in range(start, start + count)):
+            start = max(start, _next_book_index(base))
+        tmp = counter.with_name(counter.name + ".tmp")
+        tmp.write_text(str(start + count), encoding="utf-8")
+        os.replace(tmp, counter)
+    return range(start, start + count)
+
+
+def reset_book_index(grouped_dir: Path | None = None) -> None:
+    """Forgets the book index counter, so numbering restarts right after the
+    highest book_NNN still there - for after book folders are deleted
+    (DEV_MODE's reset)."""
+    grouped = Path(grouped_dir) if grouped_dir is not None else Path(settings.GROUPED_DIR)
+    if not grouped.exists():
+        return
+    with _book_index_lock(grouped):
+        (grouped / _BOOK_INDEX_FILE).unlink(missing_ok=True)
+
+
 def _make_dest(base: Path, index: int) -> Path:
     dest = base / f"book_{index:03d}"
     dest.mkdir(parents=True, exist_ok=True)
@@ -63,16 +289,54 @@ def _move_as_jpeg(src: Path, dest: Path, copy: bool = False):
         src.unlink()
 
 
-def propose_pairs(raw_dir: Path | None = None) -> tuple[list[tuple[Path, Path]], list[Path]]:
+def _move_isbn_photo(src: Path, dest: Path, copy: bool = False) -> str | None:
+    """
+    FUSED_GROUPING's version of _move_as_jpeg for the ISBN close-up: places
+    it the same way, but reads its barcode off the very same decode the
+    JPEG conversion needs (or, for a JPEG kept as-is, straight from its
+    draft-scaled pixels) and stores the result in the barcode cache under
+    the placed isbn.jpg's content hash - so extraction later finds it there
+    instead of decoding the photo a second time.
+    """
+    if src.suffix.lower() in {".jpg", ".jpeg"}:
+        read = read_isbn_barcode(src)
+        data = src.read_bytes()
+        if copy:
+            shutil.copy2(src, dest)
+        else:
+            src.replace(dest)
+    else:
+        img = load_image_any(src).convert("RGB")
+        read = read_isbn_barcode(img)
+        buf = BytesIO()
+        img.save(buf, "JPEG", quality=95, optimize=True)
+        data = buf.getvalue()
+        dest.write_bytes(data)
+        if not copy:
+            src.unlink()
+    barcode_cache.put(barcode_cache.content_key(data), read.isbn, read.level)
+    return read.isbn
+
+
+def propose_pairs(
+    raw_dir: Path | None = None, duplicates: dict[Path, Path] | None = None
+) -> tuple[list[tuple[Path, Path]], list[Path]]:
     """
     Pure preview, no filesystem/DB side effects: chronologically sorts every
     image in raw_dir and proposes (cover, isbn) pairs the same way group_all
     would. Returns (pairs, leftover) - leftover is any trailing unpaired
-    photo (odd count), never guessed into a pair.
+    photo (odd count), never guessed into a pair. Duplicates (see
+    raw_duplicates - pass its answer in when already at hand, it hashes
+    every photo) are left out, so one can't shift every pair after it.
     """
-    raw = Path(raw_dir) if raw_dir is not None else Path(settings.RAW_DIR)
-    imgs = [p for p in raw.glob("*") if p.suffix.lower() in IMG_EXTS]
-    imgs.sort(key=_capture_time)
+    listing = _raw_listing(raw_dir)
+    if duplicates is None:
+        duplicates = find_duplicates(listing)
+    return pair_photos([photo for photo, _ in listing if photo not in duplicates])
+
+
+def pair_photos(imgs: list[Path]) -> tuple[list[tuple[Path, Path]], list[Path]]:
+    """propose_pairs' pairing rule over an already chronological list."""
     need = 2
     pairs_count = len(imgs) // need
     pairs = [(imgs[g * need], imgs[g * need + 1]) for g in range(pairs_count)]
@@ -80,30 +344,38 @@ def propose_pairs(raw_dir: Path | None = None) -> tuple[list[tuple[Path, Path]],
     return pairs, leftover
 
 
-def commit_pair(cover_src: Path, isbn_src: Path, grouped_dir: Path | None = None) -> Path:
+def commit_pair(
+    cover_src: Path, isbn_src: Path, grouped_dir: Path | None = None, index: int | None = None
+) -> Path:
     """
     Commits one (cover, isbn) pair into a new book_NNN folder - the actual
-    filesystem side effect behind a proposal from propose_pairs(). Recomputes
-    the next book index fresh each call, so pairs confirmed one at a time
-    from separate requests (the manual per-pair review flow) still number
-    correctly. Copy vs move follows DEV_MODE, same as group_all.
+    filesystem side effect behind a proposal from propose_pairs(). Without
+    an index (already reserved by the caller, like group_all does for its
+    whole batch) it reserves the next one itself, so pairs confirmed one at
+    a time from separate requests (the manual per-pair review flow) still
+    number correctly. Copy vs move follows DEV_MODE, same as group_all.
+    With FUSED_GROUPING the ISBN photo's barcode is read while it's placed
+    (see _move_isbn_photo), for sync_pending_books to pick up.
     """
     grouped = Path(grouped_dir) if grouped_dir is not None else Path(settings.GROUPED_DIR)
-    dest = _make_dest(grouped, _next_book_index(grouped))
+    if index is None:
+        index = _reserve_book_indices(grouped, 1)[0]
+    dest = _make_dest(grouped, index)
     _move_as_jpeg(Path(cover_src), dest / "cover.jpg", copy=settings.DEV_MODE)
-    _move_as_jpeg(Path(isbn_src), dest / "isbn.jpg", copy=settings.DEV_MODE)
+    if settings.FUSED_GROUPING:
+        _move_isbn_photo(Path(isbn_src), dest / "isbn.jpg", copy=settings.DEV_MODE)
+    else:
+        _move_as_jpeg(Path(isbn_src), dest / "isbn.jpg", copy=settings.DEV_MODE)
     return dest
 
 
 def group_last_set():
     """Creates a single group with the *latest* N images from RAW_DIR."""
-    raw = Path(settings.RAW_DIR)
-    imgs = [p for p in raw.glob("*") if p.suffix.lower() in IMG_EXTS]
+    imgs = raw_photos()
     if not imgs:
         rprint("[yellow]Sem imagens em photos_raw/[/yellow]")
         return None
 
-    imgs.sort(key=_capture_time)
     need = settings.PHOTOS_PER_BOOK
     if len(imgs) < need:
         rprint(f"[yellow]Não há fotos suficientes (precisa {need}).[/yellow]")
@@ -115,7 +387,7 @@ def group_last_set():
     return dest
 
 
-def group_all(max_groups: int | None = None):
+def group_all(max_groups: int | None = None, workers: int | None = None):
     """
     Agrupa TUDO o que houver em RAW_DIR em pares (capa, close-up do ISBN) por
     ordem cronológica (EXIF DateTimeOriginal, senão mtime do ficheiro).
@@ -126,11 +398,18 @@ def group_all(max_groups: int | None = None):
     emparelhada a adivinhar.
 
     max_groups: limite de quantos livros criar (None = todos os possíveis).
+    workers: quantos pares tratar ao mesmo tempo (None = GROUP_WORKERS) -
+    as conversões JPEG e as cópias de vários pares sobrepõem-se numa pool de
+    threads (Pillow e a cópia de ficheiros largam o GIL). Os números dos
+    livros são reservados antes, por ordem cronológica, por isso o
+    resultado é o mesmo que um a um.
     """
     raw = Path(settings.RAW_DIR)
     grouped = Path(settings.GROUPED_DIR)
 
-    pairs, leftover = propose_pairs(raw)
+    duplicates = raw_duplicates(raw)
+    quarantine_duplicates(raw, duplicates)
+    pairs, leftover = propose_pairs(raw, duplicates)
     total_imgs = len(pairs) * 2 + len(leftover)
     if total_imgs == 0:
         rprint("[yellow]Sem imagens em photos_raw/[/yellow]")
@@ -144,10 +423,22 @@ def group_all(max_groups: int | None = None):
         pairs = pairs[:max_groups]
 
     created = []
-    for cover_src, isbn_src in pairs:
-        dest = commit_pair(cover_src, isbn_src, grouped)
-        created.append(dest)
-        rprint(f"[green]{dest.name}[/green]: capa={cover_src.name}, isbn={isbn_src.name}")
+    workers = workers or settings.GROUP_WORKERS or os.cpu_count() or 1
+    started = time.perf_counter()
+
+    def commit(job: tuple[int, tuple[Path, Path]]) -> Path:
+        index, (cover_src, isbn_src) = job
+        return commit_pair(cover_src, isbn_src, grouped, index=index)
+
+    if pairs:  # none left at max_groups=0
+        indices = _reserve_book_indices(grouped, len(pairs))
+        with ThreadPoolExecutor(max_workers=min(workers, len(pairs))) as pool:
+            # map yields in submission order, whatever order the pairs finish in.
+            dests = pool.map(commit, zip(indices, pairs, strict=True))
+            for dest, (cover_src, isbn_src) in zip(dests, pairs, strict=True):
+                created.append(dest)
+                rprint(f"[green]{dest.name}[/green]: capa={cover_src.name}, isbn={isbn_src.name}")
+    elapsed = time.perf_counter() - started
 
     if leftover:
         rprint(
@@ -156,5 +447,8 @@ def group_all(max_groups: int | None = None):
         )
 
     if created:
-        rprint(f"[bold green]{len(created)} livro(s) agrupado(s).[/bold green]")
+        rprint(
+            f"[bold green]{len(created)} livro(s) agrupado(s)[/bold green] em {elapsed:.1f} s "
+            f"({2 * len(created) / max(elapsed, 1e-9):.1f} fotos/s, {min(workers, len(pairs))} thread(s))."
+        )
     return created
@@ -1,7 +1,26 @@
+"""
+HEIC/HEIF -> JPEG conversion for phone dumps (`blt convert-heic`).
+
+convert_folder spreads files over a process pool and records every
+conversion in a small manifest, .heic_manifest.json next to blt.db
+(disposable - safe to delete): source path + size + mtime -> content hash,
+and content hash -> the JPEG it produced. A second run over the same folder
+skips everything whose JPEG is still there without even hashing it, and a
+re-copied dump (new mtimes, same bytes) is recognized by content.
+"""
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import shutil
 import subprocess
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import get_context
 from pathlib import Path
+from typing import NamedTuple
 
 from PIL import Image, UnidentifiedImageError
 
@@ -58,13 +77,71 @@ def _heic_to_jpeg_ffmpeg(src: Path, dst: Path, quality: int = 95) -> bool:
     Use portable ffmpeg via imageio-ffmpeg.
     -q:v: lower is better quality; map quality∈[1..31]. We'll aim ~visually lossless: 2.
     """
+    return _ffmpeg_one(src, dst) is None
+
+def _ffmpeg_one(src: Path, dst: Path) -> str | None:
+    """_heic_to_jpeg_ffmpeg, returning None on success or ffmpeg's error message."""
     try:
         ffmpeg = _get_ffmpeg_exe()
         cmd = [ffmpeg, "-y", "-i", str(src), "-frames:v", "1", "-q:v", "2", str(dst)]
         proc = subprocess.run(cmd, capture_output=True)
-        return proc.returncode == 0 and dst.exists()
+    except Exception as e:
+        return str(e) or type(e).__name__
+    if proc.returncode == 0 and dst.exists():
+        return None
+    dst.unlink(missing_ok=True)  # whatever a failed run left behind
+    return _last_line(proc.stderr) or f"ffmpeg exited with {proc.returncode}"
+
+def _last_line(stderr: bytes) -> str:
+    lines = stderr.decode("utf-8", "replace").strip().splitlines()
+    return lines[-1] if lines else ""
+
+# Batched ffmpeg fallback: HEICs per ffmpeg invocation - process startup
+# (~100 ms+) is most of what a one-file ffmpeg run costs.
+_FFMPEG_BATCH = 16
+
+def _ffmpeg_batch(pairs: list[tuple[Path, Path]]) -> dict[Path, str | None]:
+    """
+    Converts every (src, dst) in one ffmpeg process - one input and one
+    output per file. Returns src -> None on success or the error message.
+    Only a clean exit vouches for the outputs - ffmpeg gives up on the whole
+    run if any input can't be opened, and one that fails partway through
+    can leave JPEGs truncated - so after a failed run every file is retried
+    one ffmpeg each: a bad file costs its batch a retry, never a wrong or
+    shared error, nor a broken JPEG.
+    """
+    for _, dst in pairs:
+        dst.unlink(missing_ok=True)  # e.g. left half-written by the failed Pillow attempt
+    try:
+        cmd = [_get_ffmpeg_exe(), "-y"]
+        for src, _ in pairs:
+            cmd += ["-i", str(src)]
+        for i, (_, dst) in enumerate(pairs):
+            cmd += ["-map", f"{i}:v:0", "-frames:v", "1", "-q:v", "2", str(dst)]
+        ok = subprocess.run(cmd, capture_output=True).returncode == 0
     except Exception:
-        return False
+        ok = False
+    results: dict[Path, str | None] = {}
+    for src, dst in pairs:
+        if ok and dst.exists() and dst.stat().st_size > 0:
+            results[src] = None
+        else:
+            results[src] = _ffmpeg_one(src, dst)
+    return results
+
+def _convert(src: Path, dst: Path, quality: int) -> str | None:
+    """Converts src to dst; which path did it ("pillow"/"ffmpeg"), or None if neither could."""
+    if _heic_to_jpeg_pillow(src, dst, quality=quality):
+        return "pillow"
+    if _heic_to_jpeg_ffmpeg(src, dst, quality=quality):
+        return "ffmpeg"
+    return None
+
+def _delete(src: Path) -> None:
+    try:
+        src.unlink()
+    except Exception:
+        pass
 
 def convert_file(src: Path, delete_src: bool = True, quality: int = 95) -> Path | None:
     """
@@ -74,26 +151,211 @@ def convert_file(src: Path, delete_src: bool = True, quality: int = 95) -> Path
     if src.suffix.lower() not in IMG_EXTS_HEIC:
         return None
     dst = src.with_suffix(".jpg")
-    if _heic_to_jpeg_pillow(src, dst, quality=quality) or _heic_to_jpeg_ffmpeg(src, dst, quality=quality):
+    if _convert(src, dst, quality):
         if delete_src:
-            try:
-                src.unlink()
-            except Exception:
-                pass
+            _delete(src)
         return dst
     return None
 
-def convert_folder(folder: Path, recursive: bool = True, delete_src: bool = True, quality: int = 95) -> list[Path]:
+_MANIFEST_PATH = Path(".heic_manifest.json")
+_HASH_CHUNK = 1 << 20
+
+class Conversion(NamedTuple):
+    """One source's outcome in convert_folder. how is "pillow"/"ffmpeg"
+    (converted that way), "cached" (its JPEG from an earlier run is still
+    there), "copied" (same bytes converted before under another name) or
+    "failed" - with error saying why."""
+    src: Path
+    dst: Path | None
+    how: str
+    seconds: float
+    key: str | None = None
+    error: str | None = None
+
+def _file_key(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _load_manifest() -> dict:
+    try:
+        manifest = json.loads(_MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"sources": {}, "outputs": {}}
+    manifest.setdefault("sources", {})
+    manifest.setdefault("outputs", {})
+    return manifest
+
+def _save_manifest(manifest: dict) -> None:
+    tmp = _MANIFEST_PATH.with_name(_MANIFEST_PATH.name + ".tmp")
+    tmp.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp, _MANIFEST_PATH)
+
+# content hash -> JPEG path, from the manifest - set in each worker (and in
+# this process, for a sequential run) before any _convert_task runs.
+_known_outputs: dict[str, str] = {}
+
+def _init_convert_worker(outputs: dict[str, str]) -> None:
+    global _known_outputs
+    _known_outputs = outputs
+
+def _convert_task(src: Path, key: str | None, delete_src: bool, quality: int) -> Conversion:
+    """One source through Pillow only - convert_folder sends whatever fails
+    here through the batched ffmpeg fallback afterwards."""
+    started = time.perf_counter()
+    dst = src.with_suffix(".jpg")
+    how: str | None
+    error = "Pillow could not convert it"
+    try:
+        key = key or _file_key(src)
+        previous = _known_outputs.get(key)
+        if previous is not None and Path(previous) == dst.resolve() and dst.exists():
+            how = "cached"
+        elif previous is not None and Path(previous).exists():
+            shutil.copyfile(previous, dst)
+            how = "copied"
+        else:
+            how = "pillow" if _heic_to_jpeg_pillow(src, dst, quality=quality) else None
+    except OSError as e:
+        how, error = None, str(e)
+    if how is None:
+        return Conversion(src, None, "failed", time.perf_counter() - started, key, error)
+    if delete_src:
+        _delete(src)
+    return Conversion(src, dst, how, time.perf_counter() - started, key)
+
+def _ffmpeg_fallback(
+    failed: list[Conversion], workers: int, delete_src: bool, on_done: Callable[[], None] | None = None
+) -> list[Conversion]:
     """
-    Convert all HEIC/HEIF files under 'folder' to JPEG. Deletes originals if requested.
-    Returns the list of created JPEG paths.
+    Sends the sources Pillow couldn't convert through _ffmpeg_batch, at
+    most `workers` ffmpeg processes at a time. Each file is charged its
+    share of its batch's time on top of its Pillow attempt.
+    """
+    if not failed:
+        return []
+    size = max(1, min(_FFMPEG_BATCH, -(-len(failed) // workers)))
+    batches = [failed[i:i + size] for i in range(0, len(failed), size)]
+
+    def run(batch: list[Conversion]) -> list[Conversion]:
+        started = time.perf_counter()
+        errors = _ffmpeg_batch([(r.src, r.src.with_suffix(".jpg")) for r in batch])
+        share = (time.perf_counter() - started) / len(batch)
+        done = []
+        for r in batch:
+            r = r._replace(seconds=r.seconds + share, error=errors[r.src])
+            if r.error is None:
+                if delete_src:
+                    _delete(r.src)
+                r = r._replace(dst=r.src.with_suffix(".jpg"), how="ffmpeg")
+            done.append(r)
+        return done
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in pool.map(run, batches):
+            results.extend(batch)
+            if on_done:
+                for _ in batch:
+                    on_done()
+    return results
+
+def convert_folder(
+    folder: Path,
+    recursive: bool = True,
+    delete_src: bool = True,
+    quality: int = 95,
+    workers: int | None = None,
+    report: list[Conversion] | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> list[Path]:
+    """
+    Convert all HEIC/HEIF files under 'folder' to JPEG, spread across
+    `workers` processes (default: one per core; 1 = sequential). Deletes
+    originals if requested. Sources whose JPEG an earlier run already
+    produced (per the manifest) are skipped. Whatever Pillow can't open is
+    then retried through ffmpeg, many files per ffmpeg process and at most
+    `workers` of those at once.
+    Returns the JPEG path of every source that has one now - converted this
+    run or not. Each source's Conversion (with its timing) is appended to
+    `report` if given; on_progress is called with (done, total).
     """
     folder = Path(folder)
     pattern = "**/*" if recursive else "*"
-    created: list[Path] = []
-    for p in sorted(folder.glob(pattern)):
-        if p.is_file() and p.suffix.lower() in IMG_EXTS_HEIC:
-            out = convert_file(p, delete_src=delete_src, quality=quality)
-            if out:
-                created.append(out)
-    return created
+    sources = [p for p in sorted(folder.glob(pattern)) if p.is_file() and p.suffix.lower() in IMG_EXTS_HEIC]
+    manifest = _load_manifest()
+    outputs: dict[str, str] = manifest["outputs"]
+    results: list[Conversion] = []
+    pending: list[tuple[Path, str | None]] = []
+    for src in sources:
+        st = src.stat()
+        known = manifest["sources"].get(str(src.resolve()))
+        key = known[2] if known and known[:2] == [st.st_size, st.st_mtime_ns] else None
+        dst = src.with_suffix(".jpg")
+        # The common second-run case, settled here without hashing or a worker.
+        if key is not None and outputs.get(key) == str(dst.resolve()) and dst.exists():
+            if delete_src:
+                _delete(src)
+            results.append(Conversion(src, dst, "cached", 0.0, key))
+        else:
+            pending.append((src, key))
+
+    total = len(sources)
+    done = 0
+
+    def report_done(result: Conversion | None = None) -> None:
+        # Pillow failures aren't done until ffmpeg has had its go at them.
+        nonlocal done
+        if result is not None and result.how == "failed":
+            return
+        done += 1
+        if on_progress:
+            on_progress(done, total)
+
+    for _ in results:
+        report_done()
+    workers = workers or os.cpu_count() or 1
+    pool_size = min(workers, len(pending))
+    if pool_size <= 1:
+        _init_convert_worker(outputs)
+        for src, key in pending:
+            results.append(_convert_task(src, key, delete_src, quality))
+            report_done(results[-1])
+    else:
+        # spawn, not fork, for the same reason as barcode.decode_isbn_barcodes.
+        with ProcessPoolExecutor(
+            max_workers=pool_size,
+            mp_context=get_context("spawn"),
+            initializer=_init_convert_worker,
+            initargs=(outputs,),
+        ) as pool:
+            futures = [pool.submit(_convert_task, src, key, delete_src, quality) for src, key in pending]
+            for future in as_completed(futures):
+                results.append(future.result())
+                report_done(results[-1])
+
+    failed = [r for r in results if r.how == "failed"]
+    results = [r for r in results if r.how != "failed"]
+    results += _ffmpeg_fallback(failed, workers, delete_src, on_done=report_done)
+
+    # Forget whatever has since been deleted, so the manifest doesn't grow forever.
+    manifest["sources"] = {src: v for src, v in manifest["sources"].items() if Path(src).exists()}
+    manifest["outputs"] = outputs = {key: dst for key, dst in outputs.items() if Path(dst).exists()}
+    for result in results:
+        if result.key is None or result.dst is None:
+            continue
+        outputs[result.key] = str(result.dst.resolve())
+        key_src = str(result.src.resolve())
+        if result.src.exists():
+            st = result.src.stat()
+            manifest["sources"][key_src] = [st.st_size, st.st_mtime_ns, result.key]
+        else:
+            manifest["sources"].pop(key_src, None)
+    _save_manifest(manifest)
+
+    results.sort(key=lambda r: r.src)
+    if report is not None:
+        report.extend(results)
+    return [r.dst for r in results if r.dst is not None]
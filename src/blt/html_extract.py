@@ -0,0 +1,305 @@
+"""
+The few fields the lookup scrapers need, read straight out of a page's HTML
+as it streams through the standard library's incremental HTMLParser -
+instead of building a full BeautifulSoup tree of an entire store page (menus,
+footers, inline scripts and all) to look at two elements of it. The page is
+fed in chunks and parsing stops the moment every field has been seen, so
+the rest of the document is never even tokenized.
+
+Most of a store page never needs tokenizing at all, though. Before any
+parsing, plain substring searches find the first place each field could
+possibly start (looser than what the parser accepts, never stricter): a
+page with no such place is answered straight away - Almedina's usual
+reply, a search-results listing with no product on it - and otherwise
+parsing starts at the tag holding the earliest one, skipping everything
+ahead of it, as long as that tag isn't inside a script, style or comment
+(then the whole page is parsed, as before). That skip assumes the markup
+ahead of it closes its own tags and quotes: a page broken badly enough
+for an attribute value to run on across later tags could read
+differently than a full parse would.
+
+Each extractor matches exactly what the BeautifulSoup code in its lookup
+module finds (first matching element in document order, text as
+get_text(strip=True) would give it). Markup it can't be sure to read the
+same way raises ValueError, and the lookup falls back to BeautifulSoup.
+"""
+import re
+from html.parser import HTMLParser
+
+# Fed this many characters at a time, so a page can stop parsing partway.
+_CHUNK = 16 * 1024
+
+# Elements that never have an end tag - a capture starting on one is empty.
+_VOID = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr",
+})
+
+
+# Where raw text (never parsed as tags) starts, and where it ends.
+_RAW_TEXT = (("<script", "</script"), ("<style", "</style"), ("<textarea", "</textarea"), ("<title", "</title"),
+             ("<!--", "-->"))
+
+# Matched against the lowercased page, just past an "itemprop".
+_NAME_VALUE = re.compile(r"\s*=\s*[\"']?name")
+
+
+def _find_itemprop_name(lower: str) -> int:
+    """Where the first itemprop="name" (any quoting) could be, or -1."""
+    i = lower.find("itemprop")
+    while i != -1:
+        if _NAME_VALUE.match(lower, i + len("itemprop")):
+            return i
+        i = lower.find("itemprop", i + 1)
+    return -1
+
+
+def _start_of_tag_before(html: str, lower: str, pos: int) -> int:
+    """Where to start parsing so the tag holding lower[pos] is seen whole -
+    0 (the whole page) when that spot may be inside raw text, or when
+    lowercasing moved positions around (a few non-ASCII letters do)."""
+    if len(lower) != len(html):
+        return 0
+    start = lower.rfind("<", 0, pos)
+    if start == -1 or not lower[start + 1:start + 2].isalpha():
+        return 0
+    for opener, closer in _RAW_TEXT:
+        i = lower.rfind(opener, 0, start)
+        if i != -1 and lower.find(closer, i, start) == -1:
+            return 0
+    return start
+
+
+class _Stop(Exception):
+    """Every field has been found - nothing further down can change them."""
+
+
+class _Capture:
+    """The text of one element, collected until its end tag."""
+
+    def __init__(self, tag: str, on_done):
+        self.tag = tag
+        self.depth = 1
+        self.pieces: list[str] = []
+        self.on_done = on_done
+
+    def text(self) -> str:
+        return "".join(self.pieces)
+
+
+class _Extractor(HTMLParser):
+    """Tracks captures (see capture()) and hands each text node - the text
+    between two tags or comments, as BeautifulSoup would see it - to
+    on_text as is, and stripped to every capture still open."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._captures: list[_Capture] = []
+        self._pending: list[str] = []
+        self._in_script = False
+
+    def capture(self, tag: str, on_done) -> None:
+        if tag in _VOID:
+            on_done("")
+        else:
+            self._captures.append(_Capture(tag, on_done))
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        raw = "".join(self._pending)
+        self._pending.clear()
+        self.on_text(raw)
+        text = raw.strip()
+        if text:
+            for cap in self._captures:
+                cap.pieces.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        for cap in self._captures:
+            if cap.tag == tag:
+                cap.depth += 1
+        self._in_script = tag in ("script", "style")
+        self.on_start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        self.on_start(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self._flush()
+        self._in_script = False
+        for cap in list(self._captures):
+            if cap.tag == tag:
+                cap.depth -= 1
+                if cap.depth == 0:
+                    self._captures.remove(cap)
+                    cap.on_done(cap.text())
+        self.on_end(tag)
+
+    def handle_data(self, data):
+        if not self._in_script:  # get_text() leaves script/style contents out
+            self._pending.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+        self.on_comment()
+
+    def finish(self) -> None:
+        """End of document: whatever is still open ends here."""
+        self._flush()
+        for cap in self._captures:
+            cap.on_done(cap.text())
+        self._captures.clear()
+
+    def on_start(self, tag: str, attrs: dict) -> None:
+        pass
+
+    def on_end(self, tag: str) -> None:
+        pass
+
+    def on_text(self, raw: str) -> None:
+        pass
+
+    def on_comment(self) -> None:
+        pass
+
+
+def _run(parser: _Extractor, html: str, start: int = 0) -> None:
+    try:
+        for i in range(start, len(html), _CHUNK):
+            parser.feed(html[i:i + _CHUNK])
+        parser.close()
+        parser.finish()
+    except _Stop:
+        pass
+
+
+class _Almedina(_Extractor):
+    def __init__(self):
+        super().__init__()
+        self.title: str | None = None
+        self.author: str | None = None
+        self._title_started = self._author_started = False
+
+    def on_start(self, tag, attrs):
+        if not self._title_started and attrs.get("itemprop") == "name":
+            self._title_started = True
+            self.capture(tag, self._title_done)
+        if not self._author_started and tag == "a" and "/autor/" in (attrs.get("href") or ""):
+            self._author_started = True
+            self.capture(tag, self._author_done)
+
+    def _title_done(self, text):
+        self.title = text
+        self._check()
+
+    def _author_done(self, text):
+        self.author = text
+        self._check()
+
+    def _check(self):
+        if self.title is not None and self.author is not None:
+            raise _Stop
+
+
+def almedina_fields(html: str) -> dict | None:
+    """{"title", "author"} off an Almedina product page, None when there's
+    no itemprop="name" element (a search-results listing, not a match)."""
+    lower = html.lower()
+    title_at = _find_itemprop_name(lower)
+    if title_at == -1:
+        return None
+    # From the title or the first author link, whichever comes first.
+    author_at = lower.find("/autor/")
+    first = min(title_at, author_at) if author_at != -1 else title_at
+    parser = _Almedina()
+    _run(parser, html, _start_of_tag_before(html, lower, first))
+    if not parser._title_started:
+        return None
+    return {"title": parser.title, "author": parser.author}
+
+
+class _IsbnSearch(_Extractor):
+    def __init__(self):
+        super().__init__()
+        self.found = False
+        self.title: str | None = None
+        self.author: str | None = None
+        self._author_done = False
+        self._div_depth = 0  # > 0 while inside div.bookinfo
+        self._title_started = False
+        self._p_depth = 0
+        self._strong_seen = False
+        self._after_label = False  # right after this p's first strong, which read "Author:"
+
+    def on_start(self, tag, attrs):
+        if self._after_label:
+            raise ValueError("element right after the Author: label")
+        if self._div_depth == 0:
+            if not self.found and tag == "div" and "bookinfo" in (attrs.get("class") or "").split():
+                self.found = True
+                self._div_depth = 1
+            return
+        if tag == "div":
+            self._div_depth += 1
+        elif tag == "h1" and not self._title_started:
+            self._title_started = True
+            self.capture(tag, self._title_done)
+        elif tag == "p":
+            if self._p_depth:
+                raise ValueError("nested p in bookinfo")
+            self._p_depth = 1
+            self._strong_seen = False
+        elif tag == "strong" and self._p_depth and not self._strong_seen and not self._author_done:
+            self._strong_seen = True
+            self.capture(tag, self._label_done)
+
+    def on_end(self, tag):
+        if self._div_depth == 0:
+            return
+        if tag != "strong":  # the label's own end tag, just after _label_done
+            self._after_label = False  # the label has no next sibling at all
+        if tag == "div":
+            self._div_depth -= 1
+            if self._div_depth == 0:
+                raise _Stop
+        elif tag == "p":
+            self._p_depth = 0
+
+    def on_text(self, raw):
+        if self._after_label:
+            self._after_label = False
+            self.author = raw.strip() or None
+            self._author_done = True
+            self._check()
+
+    def on_comment(self):
+        if self._after_label:
+            raise ValueError("comment right after the Author: label")
+
+    def _title_done(self, text):
+        self.title = text
+        self._check()
+
+    def _label_done(self, text):
+        if text == "Author:":
+            self._after_label = True
+
+    def _check(self):
+        if self._author_done and self.title is not None:
+            raise _Stop
+
+
+def isbnsearch_fields(html: str) -> dict | None:
+    """{"title", "author"} off an isbnsearch.org book page, None when it has
+    no div.bookinfo or no title in it."""
+    lower = html.lower()
+    first = lower.find("bookinfo")
+    if first == -1:
+        return None
+    parser = _IsbnSearch()
+    _run(parser, html, _start_of_tag_before(html, lower, first))
+    if not parser.found or not parser.title:
+        return None
+    return {"title": parser.title, "author": parser.author}
@@ -0,0 +1,87 @@
+"""
+Pooled `requests` sessions for the plain-HTTP lookup sources (Almedina,
+isbnsearch.org). A module-level `requests.get` opens a fresh TCP + TLS
+connection every time - one or two round trips of handshake before the
+request itself, on every lookup of a bulk run. A session keeps the
+connection to each host alive between lookups instead.
+
+One session for the whole process, created on first use and shared by
+every thread: extraction runs each book's lookups on a short-lived thread
+pool (see extract), so a per-thread session would mean a fresh connection
+- and a session never closed - for every book. Sharing one is safe for
+these plain GETs: urllib3's connection pool is thread-safe, and holds at
+most _POOL_MAXSIZE connections per host (blocking rather than opening
+more). A GET that hit a connection reset or a 5xx is retried with
+exponential backoff before giving up - the caller only ever sees the last
+failure - and each retry takes its own token from the host's rate_limit
+bucket first, just like the first attempt did, so a struggling site is
+never asked faster than the pacing allows.
+
+Vinted keeps its own curl_cffi session (see vinted_lookup): it needs a
+browser TLS fingerprint, which plain `requests` can't provide.
+"""
+import threading
+from types import TracebackType
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import ConnectionPool
+from urllib3.response import BaseHTTPResponse
+from urllib3.util.retry import Retry
+
+from . import rate_limit
+
+# Hosts a session talks to, and connections kept open per host.
+_POOL_CONNECTIONS = 4
+_POOL_MAXSIZE = 2
+
+class _PacedRetry(Retry):
+    """Retry that waits for a rate_limit token before each retry."""
+
+    def increment(
+        self,
+        method: str | None = None,
+        url: str | None = None,
+        response: BaseHTTPResponse | None = None,
+        error: Exception | None = None,
+        _pool: ConnectionPool | None = None,
+        _stacktrace: TracebackType | None = None,
+    ) -> "_PacedRetry":
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)  # raises once exhausted
+        if _pool is not None:
+            rate_limit.wait(f"{_pool.scheme}://{_pool.host}:{_pool.port}{url or '/'}")
+        return retry
+
+
+_RETRY = _PacedRetry(
+    total=3,
+    connect=3,
+    read=2,
+    status=2,
+    backoff_factor=0.5,  # 0.5 s, 1 s, 2 s between attempts
+    status_forcelist=(500, 502, 503, 504),
+    allowed_methods=frozenset({"GET"}),
+    raise_on_status=False,  # hand the last 5xx back for raise_for_status
+)
+
+_session: requests.Session | None = None
+_lock = threading.Lock()
+
+
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=_POOL_CONNECTIONS, pool_maxsize=_POOL_MAXSIZE, pool_block=True, max_retries=_RETRY
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def session() -> requests.Session:
+    """The process-wide session, created on first use."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _new_session()
+        return _session
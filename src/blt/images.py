@@ -1,7 +1,11 @@
+import os
+import struct
 from pathlib import Path
 
 from PIL import Image, UnidentifiedImageError
 
+from .exif_header import NoOrientationTag, jpeg_exif_span, jpeg_orientation
+
 try:
     from pillow_heif import open_heif, register_heif_opener
     register_heif_opener()
@@ -33,3 +37,59 @@ def load_image_any(p: Path) -> Image.Image:
             except AttributeError:
                 return Image.frombytes(hf.mode, hf.size, hf.data, "raw", hf.mode, hf.stride)
         raise
+
+
+# EXIF Orientation after turning the displayed image another 90° clockwise.
+_ROTATED_CW = {1: 6, 2: 7, 3: 8, 4: 5, 5: 2, 6: 3, 7: 4, 8: 1}
+
+
+def rotate_jpeg_lossless(p: Path) -> bool:
+    """
+    Rotates a JPEG 90° clockwise as displayed, without decoding it: only its
+    EXIF Orientation tag is rewritten (or, for a JPEG with no EXIF at all,
+    an Orientation-only EXIF segment is added; for one whose EXIF lacks the
+    tag, that segment is rebuilt with it), so it's instant and can be
+    repeated forever with no loss. Browsers, Vinted's upload and
+    ImageOps.exif_transpose all honour the tag. Returns False, touching
+    nothing, for anything that isn't a JPEG this can do that for - the
+    caller re-encodes those instead.
+    """
+    data = p.read_bytes()
+    if data[:2] != b"\xff\xd8":
+        return False
+    try:
+        found = jpeg_orientation(data)
+        span = None
+    except NoOrientationTag:
+        found, span = None, jpeg_exif_span(data)
+    except ValueError:
+        return False
+    if found is not None:
+        value, offset, order = found
+        data = data[:offset] + struct.pack(order + "H", _ROTATED_CW.get(value, _ROTATED_CW[1])) + data[offset + 2:]
+    elif span is not None:
+        # EXIF without the tag: the segment is rebuilt with it, every IFD kept
+        # as Pillow re-serialises them.
+        start, end = span
+        exif = Image.Exif()
+        exif.load(b"Exif\x00\x00" + data[start:end])
+        exif[0x0112] = _ROTATED_CW[1]
+        payload = exif.tobytes()
+        if len(payload) + 2 > 0xFFFF:
+            return False
+        data = data[:start - 10] + b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload + data[end:]
+    else:
+        exif = Image.Exif()
+        exif[0x0112] = _ROTATED_CW[1]
+        payload = exif.tobytes()
+        # After a JFIF APP0 if there is one - it must stay the first segment.
+        at = 2
+        if data[2:4] == b"\xff\xe0":
+            (length,) = struct.unpack(">H", data[4:6])
+            at = 4 + length
+        data = data[:at] + b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload + data[at:]
+
+    tmp = p.with_name(f"{p.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, p)
+    return True
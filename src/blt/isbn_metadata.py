@@ -0,0 +1,69 @@
+"""
+Every lookup source's last answer for each ISBN (the isbn_metadata table),
+so the same ISBN - a second copy of a popular book, a failed book searched
+again - doesn't go through the whole external lookup chain every time.
+
+An answer is trusted for ISBN_CACHE_DAYS when the source knew the book, and
+for ISBN_CACHE_MISS_DAYS when it didn't ("not found" is worth remembering
+too, but sources do add books). Errors (blocked, timed out) are never
+recorded - they say nothing about the book. Unlike the DEV_MODE shortcut in
+extract, this is per source: a cached Vinted miss still lets Almedina be
+asked, exactly as a live one would.
+
+The table is only a cache: a read that fails means asking the source, and
+a write that fails (the database locked by the web app and the CLI at
+once) is reported and dropped, never failing the lookup whose answer it
+was.
+"""
+from datetime import datetime, timedelta, timezone
+
+from rich import print as rprint
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db
+from .config import settings
+from .models import IsbnMetadata
+
+
+def _as_utc(when: datetime) -> datetime:
+    # SQLite hands DateTime(timezone=True) values back naive.
+    return when if when.tzinfo is not None else when.replace(tzinfo=timezone.utc)
+
+
+def get(isbn: str, source: str) -> dict | None:
+    """{"title", "author"} a source last answered for this ISBN - both None
+    for "not found" - or None if it hasn't been asked, or not recently
+    enough to trust."""
+    try:
+        with db.SessionLocal() as s:
+            row = s.execute(
+                select(IsbnMetadata).where(IsbnMetadata.isbn == isbn, IsbnMetadata.source == source)
+            ).scalar_one_or_none()
+    except SQLAlchemyError:
+        return None  # as good as not asked yet: the lookup goes ahead
+    if row is None:
+        return None
+    found = bool(row.title or row.author)
+    ttl = timedelta(days=settings.ISBN_CACHE_DAYS if found else settings.ISBN_CACHE_MISS_DAYS)
+    if datetime.now(timezone.utc) - _as_utc(row.fetched_at) > ttl:
+        return None
+    return {"title": row.title, "author": row.author}
+
+
+def put(isbn: str, source: str, answer: dict | None) -> None:
+    """Records a source's answer (None or empty: didn't know the book). One
+    upsert, so two lookups recording the same ISBN at once both land."""
+    answer = answer or {}
+    fields = {"title": answer.get("title"), "author": answer.get("author"), "fetched_at": datetime.now(timezone.utc)}
+    upsert = insert(IsbnMetadata).values(isbn=isbn, source=source, **fields).on_conflict_do_update(
+        index_elements=[IsbnMetadata.isbn, IsbnMetadata.source], set_=fields,
+    )
+    with db.SessionLocal() as s:
+        try:
+            s.execute(upsert)
+            s.commit()
+        except SQLAlchemyError as e:
+            s.rollback()
+            rprint(f"[yellow]Não foi possível guardar a resposta de {source} para {isbn} ({e}).[/yellow]")
@@ -15,16 +15,15 @@ selling that data, unlike a dedicated ISBN-database vendor.
 An honest, self-identifying User-Agent works fine here (confirmed
 directly) - no need for the browser-UA workaround Almedina requires.
 
-A small random delay is still applied before every request, same as
-Almedina, as simple good manners regardless of what's technically
-required.
+Every request still waits its turn in blt.rate_limit's bucket for this
+host, same as Almedina, as simple good manners regardless of what's
+technically required.
 """
-import random
-import time
-
 import requests
 from bs4 import BeautifulSoup
 
+from . import html_extract, http_session, rate_limit
+
 BASE_URL = "https://isbnsearch.org/isbn/"
 HEADERS = {
     "User-Agent": "BookListingAutomation/1.0 (personal-use ISBN lookup)",
@@ -37,16 +36,25 @@ class IsbnSearchLookupError(RuntimeError):
 
 def lookup_by_isbn(isbn: str) -> dict | None:
     """Returns {"title", "author"} or None if not found on isbnsearch.org."""
-    time.sleep(random.uniform(0.5, 1.5))
+    rate_limit.wait(BASE_URL)
     try:
-        r = requests.get(BASE_URL + isbn, headers=HEADERS, timeout=15)
+        r = http_session.session().get(BASE_URL + isbn, headers=HEADERS, timeout=15)
         if r.status_code == 404:
             return None
         r.raise_for_status()
     except requests.RequestException as e:
         raise IsbnSearchLookupError(f"Não foi possível consultar isbnsearch.org ({e}).") from e
 
-    soup = BeautifulSoup(r.text, "html.parser")
+    try:
+        return html_extract.isbnsearch_fields(r.text)
+    except ValueError:
+        return _parse_with_soup(r.text)
+
+
+def _parse_with_soup(html: str) -> dict | None:
+    """The full-tree read html_extract falls back to on markup it can't
+    stream."""
+    soup = BeautifulSoup(html, "html.parser")
     bookinfo = soup.find("div", class_="bookinfo")
     if not bookinfo:
         return None
@@ -65,3 +65,19 @@ class Sale(Base):
     # cross-posted (nothing to disambiguate) or for sales recorded before
     # this column existed.
     platform: Mapped[str | None] = mapped_column(String(32), nullable=True)
+
+
+# One row per (ISBN, lookup source): what that source last said about the
+# ISBN and when - title/author both null meaning it didn't know the book.
+# Lets extraction skip a source it already asked recently (a second copy of
+# the same book, a re-run over failed books) instead of hitting it again;
+# see blt.isbn_metadata for how long each kind of answer is trusted.
+class IsbnMetadata(Base):
+    __tablename__ = "isbn_metadata"
+    __table_args__ = (UniqueConstraint("isbn", "source"),)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    isbn: Mapped[str] = mapped_column(String(32), index=True)
+    source: Mapped[str] = mapped_column(String(32))
+    title: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    author: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
@@ -0,0 +1,101 @@
+"""
+Request pacing for the lookup sources, per host. Every outgoing request to
+Vinted, Almedina or isbnsearch.org first takes a token from its host's
+bucket, so the delays land only on requests that actually go out - a book
+resolved from isbn_metadata, or a source never asked for it, costs nothing,
+and the three hosts are paced independently of each other.
+
+Each host refills at its *_REQUESTS_PER_MINUTE setting and holds at most
+RATE_LIMIT_BURST tokens, so a short quiet spell lets the next couple of
+requests go out straight away but a long batch settles at exactly the
+configured rate. A random 0-RATE_LIMIT_JITTER_SECONDS is added on top of
+every wait, so requests never go out on a perfectly regular beat.
+
+Safe to call from several threads at once: each caller reserves its slot
+under the bucket's lock and sleeps outside it. A caller can also learn when
+a request it set off actually goes out, rather than when it was queued (see
+on_pass) - and stop it at that point, if it's no longer wanted.
+"""
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from .config import settings
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `burst` saved up."""
+
+    def __init__(self, rate: float, burst: int):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token, returning how many seconds to wait before using it
+        (0 if one was available). Tokens can go negative: each caller that
+        has to wait queues up behind the ones already waiting."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+_local = threading.local()
+
+
+def _per_minute(host: str) -> float:
+    limits = {
+        "www.vinted.pt": settings.VINTED_REQUESTS_PER_MINUTE,
+        "www.almedina.net": settings.ALMEDINA_REQUESTS_PER_MINUTE,
+        "isbnsearch.org": settings.ISBNSEARCH_REQUESTS_PER_MINUTE,
+    }
+    if host not in limits:
+        raise ValueError(f"no rate limit configured for {host}")
+    return limits[host]
+
+
+def _bucket(host: str) -> TokenBucket:
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(_per_minute(host) / 60, settings.RATE_LIMIT_BURST)
+        return bucket
+
+
+def wait(url: str) -> float:
+    """Blocks until a request to `url`'s host may go out; returns the
+    seconds waited."""
+    delay = _bucket(urlsplit(url).hostname or "").reserve()
+    if settings.RATE_LIMIT_JITTER_SECONDS > 0:
+        delay += random.uniform(0, settings.RATE_LIMIT_JITTER_SECONDS)
+    if delay > 0:
+        time.sleep(delay)
+    callback = getattr(_local, "on_pass", None)
+    if callback is not None:
+        callback()
+    return delay
+
+
+@contextmanager
+def on_pass(callback: Callable[[], None]) -> Iterator[None]:
+    """Within the block, calls `callback` every time this thread is let
+    through wait() - right before the request goes out. An exception it
+    raises propagates out of wait(), so the request is never made."""
+    previous = getattr(_local, "on_pass", None)
+    _local.on_pass = callback
+    try:
+        yield
+    finally:
+        _local.on_pass = previous
@@ -0,0 +1,204 @@
+"""
+Downsized JPEG copies of photos, for pages that show many of them at once.
+
+/raw lists every pending pair and /sorted every grouped book, each photo a
+12-48 MP original a few MB in size (or a HEIC that must be converted before
+a browser can show it at all), displayed in a box ~200px wide. Sending the
+originals there means hundreds of MB over localhost for one page load.
+Instead, the first request for a photo at a given size renders it once and
+caches the result on disk; every later request is a plain file read.
+
+Cached by the source's content hash rather than its path, so a photo keeps
+its renditions when it moves (photos_raw/ -> photos_grouped/book_NNN/) and
+gets fresh ones the moment its bytes change (e.g. rotated). Disposable -
+deleting the directory just means renditions get rendered again. The
+originals are never touched, and are still what's served without ?size=
+(what /review's drag-to-Vinted needs) - except a HEIC, which no browser
+can show at all: its full-size JPEG conversion is cached here the same way,
+so each one is transcoded at most once rather than on every request.
+
+The directory is kept under RENDITION_CACHE_MB by evicting the least
+recently used files (every cache hit refreshes its file's mtime); it's
+only scanned when a running total of its size says it's over, not after
+every render. warm() renders batches ahead of time in a background
+thread, so freshly arrived raw photos are ready before /raw asks for them.
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from .config import settings
+from .images import load_image_any
+
+_CACHE_DIR = Path(".renditions")
+
+# Longest side, in pixels, of each rendition a page can ask for.
+SIZES = (256, 512, 1024)
+
+_HASH_CHUNK = 1 << 20
+
+# (path, size, mtime_ns) -> content hash, so serving a cached rendition
+# doesn't mean re-hashing the whole original on every request.
+_source_keys: dict[tuple[str, int, int], str] = {}
+_source_keys_lock = threading.Lock()
+
+# One lock per rendition being rendered, so a page request and warm() asking
+# for the same one render it once, not twice side by side.
+_render_locks: dict[Path, threading.Lock] = {}
+_render_locks_lock = threading.Lock()
+
+# Held by the warm-up thread while it runs; what it has left to render is
+# queued in _warm_queue, which warm() adds to.
+_warm_lock = threading.Lock()
+_warm_queue: list[tuple[Path, int | None]] = []
+_warm_queue_lock = threading.Lock()
+
+# Bytes in _CACHE_DIR as of the last scan plus everything rendered since;
+# None until the first render counts it.
+_cache_bytes: int | None = None
+_cache_bytes_lock = threading.Lock()
+
+
+def _source_key(path: Path) -> str:
+    st = path.stat()
+    memo = (str(path), st.st_size, st.st_mtime_ns)
+    with _source_keys_lock:
+        key = _source_keys.get(memo)
+    if key is None:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            while chunk := f.read(_HASH_CHUNK):
+                h.update(chunk)
+        key = h.hexdigest()
+        with _source_keys_lock:
+            _source_keys[memo] = key
+    return key
+
+
+def rendition(path: Path, size: int | None) -> Path:
+    """
+    Path to a JPEG of `path` at most `size` px on its longest side (one of
+    SIZES), or at full size for size=None, rendering it first if it isn't
+    cached yet. EXIF orientation is applied to downsized renditions, since
+    they don't carry the tag along.
+    """
+    if size is not None and size not in SIZES:
+        raise ValueError(f"unsupported rendition size: {size}")
+    path = Path(path)
+    out = _CACHE_DIR / f"{_source_key(path)}_{size or 'full'}.jpg"
+    if _touch(out):
+        return out
+
+    with _render_locks_lock:
+        lock = _render_locks.setdefault(out, threading.Lock())
+    with lock:
+        if _touch(out):  # rendered by whoever held the lock before us
+            return out
+        _render(path, size, out)
+    with _render_locks_lock:
+        _render_locks.pop(out, None)
+    _count_rendered(out)
+    return out
+
+
+def _count_rendered(out: Path) -> None:
+    """Adds a new rendition to the running total, evicting once it's over
+    RENDITION_CACHE_MB."""
+    global _cache_bytes
+    limit = settings.RENDITION_CACHE_MB * 1024 * 1024
+    with _cache_bytes_lock:
+        if _cache_bytes is not None:
+            _cache_bytes += out.stat().st_size
+            if _cache_bytes <= limit:
+                return
+        _evict(limit, keep=out)
+
+
+def _touch(out: Path) -> bool:
+    """Marks a cached rendition as just used (for LRU eviction); False if
+    it isn't cached."""
+    try:
+        os.utime(out)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _render(path: Path, size: int | None, out: Path) -> None:
+    img = load_image_any(path)
+    if size is None:
+        img = img.convert("RGB")
+        quality = 90
+    else:
+        img.draft("RGB", (size, size))  # JPEG: decode straight at (about) the target size
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        quality = 85
+
+    _CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Written to a temp file and renamed into place, so a reader never sees
+    # a half-written rendition.
+    tmp = out.with_name(f"{out.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+    img.save(tmp, "JPEG", quality=quality, optimize=True)
+    os.replace(tmp, out)
+
+
+def _evict(limit_bytes: int, keep: Path | None = None) -> None:
+    """Deletes least recently used renditions until the cache fits in
+    limit_bytes - never `keep`, the one about to be served - and resets the
+    running total to what's left."""
+    global _cache_bytes
+    entries = []
+    try:
+        for entry in os.scandir(_CACHE_DIR):
+            if keep is not None and entry.path == str(keep):
+                continue
+            st = entry.stat()
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+    except FileNotFoundError:
+        _cache_bytes = 0
+        return
+    total = sum(size for _, size, _ in entries) + (keep.stat().st_size if keep is not None else 0)
+    for _, size, file in sorted(entries):
+        if total <= limit_bytes:
+            break
+        try:
+            os.unlink(file)
+        except FileNotFoundError:
+            pass
+        total -= size
+    _cache_bytes = total
+
+
+def warm(paths: list[Path], size: int | None) -> bool:
+    """
+    Renders every photo's rendition at `size` in a background thread, so
+    they're already cached by the time a page asks. A batch asked for while
+    a warm-up is running joins its queue; returns whether this call started
+    the thread. Unreadable photos are skipped; a page request for one still
+    gets the same error it always would.
+    """
+    with _warm_queue_lock:
+        _warm_queue.extend((Path(p), size) for p in paths)
+        if not _warm_lock.acquire(blocking=False):
+            return False
+
+    def run():
+        while True:
+            with _warm_queue_lock:
+                if not _warm_queue:
+                    # Under the queue lock: a warm() call either queued
+                    # before this, or finds the thread gone and starts one.
+                    _warm_lock.release()
+                    return
+                path, size = _warm_queue.pop(0)
+            try:
+                rendition(path, size)
+            except Exception:
+                pass
+
+    threading.Thread(target=run, daemon=True).start()
+    return True
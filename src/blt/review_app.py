@@ -4,12 +4,10 @@ always reachable from a persistent sidebar: raw images -> sorted images ->
 detected book waiting confirmation -> stock. Nothing here talks to Vinted -
 you paste the fields yourself and click Next once the real listing exists.
 """
-import random
 import shutil
 import threading
-import time
 from datetime import datetime, timezone
-from io import BytesIO
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -19,15 +17,17 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy import and_, case, delete, func, or_, select
 
-from . import db, discord_fetch, discord_notify, group_photos
+from . import barcode_cache, db, dedup, discord_fetch, discord_notify, group_photos, renditions
 from .config import settings
-from .extract import _extract_with_dev_cache, extract_book_fields
-from .images import IMG_EXTS, load_image_any
+from .extract import _extract_with_dev_cache, extract_book_fields, group_by_isbn, grouped_isbn, prefetch_barcodes
+from .images import IMG_EXTS, load_image_any, rotate_jpeg_lossless
 from .listing import compose_listing
 from .models import Book, BookPlatform, Sale
 from .platforms import load_platforms
 
 _HEIC_EXTS = {".heic", ".heif"}
+# Rendition size /raw shows its photos at (raw.html's ?size=).
+_RAW_THUMB_SIZE = 512
 _SAFE_ORIGIN_HOSTS = {"localhost", "127.0.0.1"}
 
 # "Procurar todos novamente" runs in a background thread (the paced,
@@ -41,25 +41,99 @@ _bulk_reextract_state: dict = {"running": False, "current": 0, "total": 0, "book
 # extraction of a freshly-grouped batch, as opposed to review's re-search of
 # books already extracted once) - kept as its own separate lock/state since
 # the two operate on different book sets and can legitimately run at once.
+# phase is "barcodes" while the whole batch's barcodes are read up front,
+# then "lookup" for the paced lookups - one per distinct ISBN, so there
+# current/total count ISBNs rather than books.
 _bulk_detect_lock = threading.Lock()
-_bulk_detect_state: dict = {"running": False, "current": 0, "total": 0, "book_label": None}
+_bulk_detect_state: dict = {"running": False, "current": 0, "total": 0, "book_label": None, "phase": None}
 
 
-def _serve_image(path: Path):
+# Photo URLs name a file, not its content (rotating rewrites it in place),
+# so the browser may keep a copy but must check it's still current - a
+# 304 costs a round trip on localhost, not the photo's few MB.
+_PHOTO_CACHE_CONTROL = "no-cache"
+# Same for the app's own CSS/JS: unversioned URLs, changed by an upgrade.
+_STATIC_CACHE_CONTROL = "no-cache"
+
+
+def _validators(path: Path) -> dict[str, str]:
+    """Strong ETag from the file's identity (inode, size, mtime) plus
+    Last-Modified - anything rewriting the file (e.g. rotate_photo) changes
+    both, and checking them costs one stat(), not a read."""
+    st = path.stat()
+    return {
+        "etag": f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"',
+        "last-modified": formatdate(st.st_mtime, usegmt=True),
+        "cache-control": _PHOTO_CACHE_CONTROL,
+    }
+
+
+def _not_modified(request: Request, validators: dict[str, str]) -> bool:
+    """Whether the browser's cached copy (If-None-Match, else
+    If-Modified-Since - RFC 9110's precedence) is still current."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or validators["etag"] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:  # "-0000" or asctime's zone-less form - HTTP dates are GMT
+        since = since.replace(tzinfo=timezone.utc)
+    return parsedate_to_datetime(validators["last-modified"]) <= since
+
+
+def _serve_image(request: Request, path: Path, size: int | None = None):
     """
     HEIC/HEIF is what phones actually produce, but no desktop browser can
     render it in an <img> tag - convert to JPEG on the fly for display only,
-    the file on disk is never touched.
+    the file on disk is never touched, and the converted JPEG is cached by
+    renditions so each HEIC is only transcoded once. With a size (one of
+    renditions.SIZES), serves a cached downsized JPEG instead of the
+    original - for pages showing many photos as thumbnails.
+
+    Every variant is validated against the original file, so a browser
+    revisiting a photo it already has gets a 304 before any rendition is
+    even looked up.
+    """
+    if size is not None and size not in renditions.SIZES:
+        raise HTTPException(400, f"Tamanho inválido - um de {', '.join(map(str, renditions.SIZES))}.")
+    headers = _validators(path)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    if size is not None or path.suffix.lower() in _HEIC_EXTS:
+        return FileResponse(renditions.rendition(path, size), media_type="image/jpeg", headers=headers)
+    return FileResponse(path, headers=headers)
+
+
+class _StaticFiles(StaticFiles):
+    """StaticFiles (which already answers If-None-Match/If-Modified-Since
+    with 304) plus a Cache-Control header."""
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers.setdefault("cache-control", _STATIC_CACHE_CONTROL)
+        return response
+
+
+def _warm_raw_thumbnails(photos: list[Path]) -> None:
+    """
+    Starts rendering /raw's thumbnails for any raw HEIC that doesn't have
+    one yet, in the background - the expensive part of a /raw load after
+    fetch_new_photos or a USB copy drops a batch into RAW_DIR. JPEG
+    thumbnails are cheap enough to just render on request.
     """
-    if path.suffix.lower() in _HEIC_EXTS:
-        buf = BytesIO()
-        load_image_any(path).convert("RGB").save(buf, "JPEG", quality=90)
-        return Response(content=buf.getvalue(), media_type="image/jpeg")
-    return FileResponse(path)
+    heics = [p for p in photos if p.suffix.lower() in _HEIC_EXTS]
+    if heics:
+        renditions.warm(heics, _RAW_THUMB_SIZE)
 
 app = FastAPI(title="blt review")
 templates = Jinja2Templates(directory=str(Path(__file__).parent / "templates"))
-app.mount("/static", StaticFiles(directory=str(Path(__file__).parent / "static")), name="static")
+app.mount("/static", _StaticFiles(directory=str(Path(__file__).parent / "static")), name="static")
 
 
 @app.middleware("http")
@@ -319,13 +393,14 @@ def _stock_breakdown(s) -> dict:
     }
 
 
-def _reextract_one(s, book: Book) -> None:
+def _reextract_one(s, book: Book, refresh: bool = False) -> None:
     """Re-runs barcode+Almedina extraction for one book, applying the result
-    (or lack of one) exactly like extract_pending_books does."""
+    (or lack of one) exactly like extract_pending_books does. refresh=True
+    skips the recorded lookup answers (isbn_metadata) and asks again."""
     if settings.DEV_MODE:
-        fields = _extract_with_dev_cache(s, Path(book.folder_path))
+        fields = _extract_with_dev_cache(s, Path(book.folder_path), refresh=refresh)
     else:
-        fields = extract_book_fields(Path(book.folder_path))
+        fields = extract_book_fields(Path(book.folder_path), refresh=refresh)
     if fields["title"]:
         listing = compose_listing(fields)
         book.title = listing["title"]
@@ -339,9 +414,20 @@ def _reextract_one(s, book: Book) -> None:
         book.status = "failed"
 
 
+def _copy_extraction(source: Book, copy: Book) -> None:
+    """Applies the extraction result already on `source` to another copy
+    of the same book (same ISBN), as if it had been extracted itself."""
+    copy.title = source.title
+    copy.author = source.author
+    copy.isbn = source.isbn
+    copy.description = source.description
+    copy.price = source.price
+    copy.status = source.status
+
+
 def _run_bulk_reextract(book_ids: list[int]) -> None:
     """Runs in a background thread: re-extracts every given book, one at a
-    time with the same pacing as extract_pending_books, publishing progress
+    time (lookups paced per host, see rate_limit), publishing progress
     to _bulk_reextract_state as it goes so /reextract-all/status has
     something live to report."""
     total = len(book_ids)
@@ -350,8 +436,6 @@ def _run_bulk_reextract(book_ids: list[int]) -> None:
     try:
         with db.SessionLocal() as s:
             for i, book_id in enumerate(book_ids):
-                if i > 0:
-                    time.sleep(random.uniform(2, 5))
                 book = s.get(Book, book_id)
                 if book is None:
                     continue
@@ -364,34 +448,53 @@ def _run_bulk_reextract(book_ids: list[int]) -> None:
             _bulk_reextract_state["running"] = False
 
 
+def _report_detect_barcodes(done: int, total: int) -> None:
+    with _bulk_detect_lock:
+        _bulk_detect_state.update(current=done, total=total)
+
+
 def _run_bulk_detect(book_ids: list[int]) -> None:
-    """Runs in a background thread: extracts every given sorted book, one at
-    a time with the same pacing as extract_pending_books, publishing
-    progress to _bulk_detect_state as it goes so /sorted/detect/status has
-    something live to report."""
+    """Runs in a background thread, in two phases: reads every given sorted
+    book's barcode up front across a process pool (same as
+    extract_pending_books), then extracts once per distinct ISBN - the
+    first book carrying it - and copies the result onto every other copy,
+    publishing progress for both phases to _bulk_detect_state as it goes
+    so /sorted/detect/status has something live to report (the lookup
+    phase counts distinct ISBNs, not books)."""
     total = len(book_ids)
     with _bulk_detect_lock:
-        _bulk_detect_state.update(running=True, current=0, total=total, book_label=None)
+        _bulk_detect_state.update(running=True, current=0, total=total, book_label=None, phase="barcodes")
     try:
         with db.SessionLocal() as s:
-            for i, book_id in enumerate(book_ids):
-                if i > 0:
-                    time.sleep(random.uniform(2, 5))
-                book = s.get(Book, book_id)
-                if book is None:
-                    continue
+            books = {book.id: book for book in s.execute(select(Book).where(Book.id.in_(book_ids))).scalars()}
+            ordered = [books[book_id] for book_id in book_ids if book_id in books]
+            folders = [Path(book.folder_path) for book in ordered]
+            read = prefetch_barcodes(folders, on_progress=_report_detect_barcodes)
+            groups = group_by_isbn(folders, read)
+            with _bulk_detect_lock:
+                _bulk_detect_state.update(current=0, total=len(groups), phase="lookup")
+
+            for i, group in enumerate(groups):
+                first = ordered[group[0]]
+                label = Path(first.folder_path).name
+                if len(group) > 1:
+                    label += f" (+{len(group) - 1} cópia(s))"
                 with _bulk_detect_lock:
-                    _bulk_detect_state.update(current=i + 1, book_label=Path(book.folder_path).name)
-                _reextract_one(s, book)
+                    _bulk_detect_state.update(current=i + 1, book_label=label)
+                _reextract_one(s, first)
+                for j in group[1:]:
+                    _copy_extraction(first, ordered[j])
                 s.commit()
     finally:
         with _bulk_detect_lock:
-            _bulk_detect_state["running"] = False
+            _bulk_detect_state.update(running=False, phase=None)
 
 
 def _sidebar_counts(s) -> dict:
-    raw_dir = Path(settings.RAW_DIR)
-    raw_count = len([p for p in raw_dir.glob("*") if p.suffix.lower() in IMG_EXTS]) if raw_dir.exists() else 0
+    # Every page lists RAW_DIR here, so whichever one is open when new
+    # photos land (USB copy, phone sync) gets their thumbnails going.
+    raw = group_photos.raw_photos(on_new=_warm_raw_thumbnails)
+    raw_count = len(raw)
     sorted_count = s.execute(select(func.count()).select_from(Book).where(_SORTED_FILTER)).scalar_one()
     review_count = s.execute(select(func.count()).select_from(Book).where(_REVIEW_FILTER)).scalar_one()
     stock_count = s.execute(
@@ -401,8 +504,9 @@ def _sidebar_counts(s) -> dict:
     # For the header progress bar only: a raw pair is one book, a lone
     # unpaired leftover photo is half a book (it's not usable yet, but it's
     # not nothing either) - doesn't affect raw_count above, which stays a
-    # plain image count for the sidebar badge.
-    pairs, leftover = group_photos.propose_pairs()
+    # plain image count for the sidebar badge. Duplicates count too: telling
+    # them apart means hashing every raw photo, too much for every page.
+    pairs, leftover = group_photos.pair_photos(raw)
     raw_units = len(pairs) + 0.5 * len(leftover)
     total_units = raw_units + sorted_count + review_count + stock_count
 
@@ -483,26 +587,31 @@ def dashboard(request: Request):
 
 @app.get("/raw", response_class=HTMLResponse)
 def raw_images(request: Request):
-    pairs, leftover = group_photos.propose_pairs()
+    duplicates = group_photos.raw_duplicates()
+    pairs, leftover = group_photos.propose_pairs(duplicates=duplicates)
     with db.SessionLocal() as s:
         ctx = _sidebar_counts(s)
         return templates.TemplateResponse(
-            request, "raw.html", {**ctx, "active_step": "raw", "pairs": pairs, "leftover": leftover}
+            request, "raw.html",
+            {
+                **ctx, "active_step": "raw", "pairs": pairs, "leftover": leftover,
+                "duplicates": list(duplicates.items()), "thumb_size": _RAW_THUMB_SIZE,
+            },
         )
 
 
 @app.get("/raw-photo/{filename}")
-def raw_photo(filename: str):
+def raw_photo(request: Request, filename: str, size: int | None = None):
     path = Path(settings.RAW_DIR) / Path(filename).name
     if not path.exists() or path.suffix.lower() not in IMG_EXTS:
         raise HTTPException(404)
-    return _serve_image(path)
+    return _serve_image(request, path, size)
 
 
 @app.post("/raw/confirm-all")
 def confirm_all_pairs():
     group_photos.group_all()
-    db.sync_pending_books(settings.GROUPED_DIR)
+    db.sync_pending_books(settings.GROUPED_DIR, isbn_for=grouped_isbn)
     return RedirectResponse("/raw", status_code=303)
 
 
@@ -514,7 +623,16 @@ def confirm_one_pair(photo_a: str = Form(...), photo_b: str = Form(...), swap: s
     if not cover.exists() or not isbn.exists():
         raise HTTPException(404, "Uma das fotos já não está em photos_raw/.")
     group_photos.commit_pair(cover, isbn)
-    db.sync_pending_books(settings.GROUPED_DIR)
+    db.sync_pending_books(settings.GROUPED_DIR, isbn_for=grouped_isbn)
+    return RedirectResponse("/raw", status_code=303)
+
+
+@app.post("/raw/not-duplicate")
+def not_duplicate(photo: str = Form(...)):
+    path = Path(settings.RAW_DIR) / Path(photo).name
+    if not path.exists():
+        raise HTTPException(404, "A foto já não está em photos_raw/.")
+    dedup.mark_not_duplicate(path)
     return RedirectResponse("/raw", status_code=303)
 
 
@@ -524,6 +642,8 @@ def fetch_discord_photos_route():
         result = discord_fetch.fetch_new_photos()
     except discord_fetch.DiscordFetchError as e:
         return {"fetched": False, "error": str(e)}
+    if result["downloaded"]:
+        _warm_raw_thumbnails(group_photos.raw_photos())
     return {"fetched": True, "downloaded": result["downloaded"], "delete_failures": result["delete_failures"]}
 
 
@@ -679,12 +799,14 @@ def delete_review_book(book_id: int):
 @app.post("/reextract/{book_id}")
 def reextract_book(book_id: int):
     """Re-runs barcode+Almedina extraction for one book - for when a previous
-    attempt decoded the wrong barcode or hit a transient Almedina failure."""
+    attempt decoded the wrong barcode or hit a transient Almedina failure.
+    Always asks the lookup sources again rather than reusing their recorded
+    answers - a deliberate re-search of one book is what --refresh is for."""
     with db.SessionLocal() as s:
         book = s.get(Book, book_id)
         if book is None:
             raise HTTPException(404)
-        _reextract_one(s, book)
+        _reextract_one(s, book, refresh=True)
         s.commit()
     return RedirectResponse("/review", status_code=303)
 
@@ -891,7 +1013,7 @@ def delete_book(book_id: int):
 
 
 @app.get("/photo/{book_id}/{name}")
-def photo(book_id: int, name: str):
+def photo(request: Request, book_id: int, name: str, size: int | None = None):
     if name not in _PHOTO_NAMES:
         raise HTTPException(404)
     with db.SessionLocal() as s:
@@ -901,7 +1023,7 @@ def photo(book_id: int, name: str):
         path = Path(book.folder_path) / name
         if not path.exists():
             raise HTTPException(404)
-        return FileResponse(path)
+    return _serve_image(request, path, size)
 
 
 @app.post("/photo/{book_id}/{name}/rotate")
@@ -909,7 +1031,8 @@ def rotate_photo(book_id: int, name: str):
     """Rotates cover.jpg/isbn.jpg 90° clockwise, in place on disk - not just
     a CSS transform, since dragging the image out of the browser into
     Vinted pulls the actual file bytes, not however this page happens to
-    render it."""
+    render it. Lossless for JPEGs (only their EXIF Orientation changes);
+    anything else is decoded, turned and re-encoded."""
     if name not in _PHOTO_NAMES:
         raise HTTPException(404)
     with db.SessionLocal() as s:
@@ -919,6 +1042,8 @@ def rotate_photo(book_id: int, name: str):
         path = Path(book.folder_path) / name
         if not path.exists():
             raise HTTPException(404)
-    rotated = load_image_any(path).convert("RGB").rotate(-90, expand=True)
-    rotated.save(path, "JPEG", quality=95)
+    barcode_cache.invalidate(path)
+    if not rotate_jpeg_lossless(path):
+        rotated = load_image_any(path).convert("RGB").rotate(-90, expand=True)
+        rotated.save(path, "JPEG", quality=95)
     return {"rotated": True}
@@ -8,13 +8,42 @@ Personal, low-volume use only. To avoid triggering Cloudflare Bot Management
 (Cf-Mitigated challenges), requests are executed using curl_cffi to impersonate
 a real Chrome browser TLS fingerprint alongside an unauthenticated guest session.
 
-A small random delay is applied before every request to keep access light
-and polite.
+Every request (the session-seeding homepage visit included) waits its turn
+in blt.rate_limit's bucket for this host, to keep access light and polite.
+
+The session's cookies (Cloudflare clearance included) are kept on disk in
+_COOKIE_JAR_PATH, so a new process - every `blt extract`, every `blt review`
+restart - picks up a still-valid jar instead of paying a homepage visit
+before its first lookup. The file is readable by its owner only (they're
+live session credentials) and kept out of git. It's only a cache: failing
+to write or delete it (full disk, read-only folder) is reported and the
+lookup carries on.
+
+A jar lasts as long as its Cloudflare clearance and its session cookies
+(trusted for _SESSION_COOKIE_MAX_AGE after they were saved, having no
+expiry of their own) - other, shorter-lived cookies are just dropped once
+they run out. When a jar is within VINTED_COOKIE_REWARM_MINUTES of
+expiring, a fresh session is warmed up on a background thread and swapped
+in, so lookups never wait for it - unless that jar was itself just warmed
+up, in which case another homepage visit would only hand out the same
+short lifetime again, and it's simply replaced once it runs out. A 403/429
+drops the jar along with the session. session_starts counts how each
+session came about: "cold" (homepage visit before a lookup), "warm"
+(restored from disk) or "rewarm" (background refresh).
 """
-import random
+import http.cookiejar
+import json
+import os
+import threading
 import time
+from contextlib import suppress
+from pathlib import Path
 
 from curl_cffi import requests
+from rich import print as rprint
+
+from . import rate_limit
+from .config import settings
 
 API_URL = "https://www.vinted.pt/api/v2/item_upload/isbn_records"
 HOME_URL = "https://www.vinted.pt/"
@@ -30,40 +59,176 @@ class VintedLookupError(RuntimeError):
     pass
 
 
+_COOKIE_JAR_PATH = Path(".vinted_cookies.json")
+_SESSION_COOKIE_MAX_AGE = 6 * 3600
+_CLEARANCE_COOKIES = frozenset({"cf_clearance"})
+
 # Global session cache so repeated lookups reuse Cloudflare clearance cookies
 _session: requests.Session | None = None
+_expires_at = 0.0  # when the current session's jar runs out (see _jar_expiry)
+_rewarm_at = 0.0  # from when to warm up its replacement in the background
+_rewarming = False
+_saved_cookies: list[dict] = []  # as last written to / read from disk
+_lock = threading.Lock()
+
+session_starts = {"cold": 0, "warm": 0, "rewarm": 0}
+
+
+def _cookie_entries(session: requests.Session) -> list[dict]:
+    return [
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "secure": c.secure,
+         "expires": c.expires}
+        for c in session.cookies.jar
+    ]
+
+
+def _jar_expiry(entries: list[dict], saved_at: float) -> float:
+    """When the clearance or a session cookie runs out - or, in a jar with
+    neither, the earliest cookie of all."""
+    vital = [e for e in entries if e["name"] in _CLEARANCE_COOKIES or e["expires"] is None] or entries
+    return min((e["expires"] or saved_at + _SESSION_COOKIE_MAX_AGE for e in vital), default=0.0)
+
+
+def _set_session(session: requests.Session | None, expires_at: float, fresh: bool) -> None:
+    """Swaps in the current session (under _lock). A `fresh` one - straight
+    from a homepage visit - that's already inside the re-warm window is
+    never re-warmed: the next visit would do no better."""
+    global _session, _expires_at, _rewarm_at
+    _session, _expires_at = session, expires_at
+    _rewarm_at = expires_at - settings.VINTED_COOKIE_REWARM_MINUTES * 60
+    if fresh and _rewarm_at <= time.time():
+        _rewarm_at = float("inf")
+
+
+def _save_jar(session: requests.Session) -> float:
+    """Writes the session's cookies to disk; returns when the jar expires."""
+    global _saved_cookies
+    saved_at = time.time()
+    entries = _saved_cookies = _cookie_entries(session)
+    # One temp file per process and thread, so `blt extract` and `blt review`
+    # saving at once never trip over each other's.
+    tmp = _COOKIE_JAR_PATH.with_name(f"{_COOKIE_JAR_PATH.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.unlink(missing_ok=True)  # so O_CREAT below applies 0600, whatever a leftover had
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w", encoding="utf-8") as f:
+            json.dump({"saved_at": saved_at, "cookies": entries}, f)
+        os.replace(tmp, _COOKIE_JAR_PATH)
+    except OSError as e:
+        with suppress(OSError):
+            tmp.unlink(missing_ok=True)
+        rprint(f"[yellow]Não foi possível guardar os cookies do Vinted ({e}).[/yellow]")
+    return _jar_expiry(entries, saved_at)
+
+
+def _load_jar() -> tuple[requests.Session, float] | None:
+    """A session carrying the saved cookies, and when they expire - None if
+    there's no jar on disk or it has already expired."""
+    try:
+        jar = json.loads(_COOKIE_JAR_PATH.read_text(encoding="utf-8"))
+        entries = jar["cookies"]
+        expires_at = _jar_expiry(entries, jar["saved_at"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if expires_at <= time.time():
+        return None
+    global _saved_cookies
+    _saved_cookies = entries
+    session: requests.Session = requests.Session(impersonate="chrome120")
+    now = time.time()
+    for e in entries:
+        if e["expires"] is not None and e["expires"] <= now:
+            continue
+        session.cookies.jar.set_cookie(http.cookiejar.Cookie(
+            0, e["name"], e["value"], None, False, e["domain"], False, e["domain"].startswith("."),
+            e["path"], True, e["secure"], e["expires"], e["expires"] is None, None, None, {},
+        ))
+    return session, expires_at
+
+
+def _warm_session() -> tuple[requests.Session, float]:
+    """A new session seeded with Cloudflare clearance cookies from the
+    homepage, saved to disk."""
+    session: requests.Session = requests.Session(impersonate="chrome120")
+    rate_limit.wait(HOME_URL)
+    session.get(HOME_URL, timeout=15)
+    return session, _save_jar(session)
+
+
+def _rewarm() -> None:
+    global _rewarming
+    session: requests.Session | None
+    try:
+        session, expires_at = _warm_session()
+    except Exception:
+        # Keep using the current session until it actually runs out.
+        session = None
+    with _lock:
+        if session is not None:
+            _set_session(session, expires_at, fresh=True)
+            session_starts["rewarm"] += 1
+        _rewarming = False
 
 
 def _get_session() -> requests.Session:
-    global _session
-    if _session is None:
-        _session = requests.Session(impersonate="chrome120")
+    global _rewarming
+    with _lock:
+        session = _session
+        if session is None or _expires_at <= time.time():
+            restored = _load_jar()
+            if restored:
+                session, expires_at = restored
+                _set_session(session, expires_at, fresh=False)
+                session_starts["warm"] += 1
+            else:
+                try:
+                    session, expires_at = _warm_session()
+                except Exception as e:
+                    _set_session(None, 0.0, fresh=False)
+                    raise VintedLookupError(f"Não foi possível inicializar a sessão do Vinted ({e}).") from e
+                _set_session(session, expires_at, fresh=True)
+                session_starts["cold"] += 1
+        if not _rewarming and _rewarm_at <= time.time():
+            _rewarming = True
+            threading.Thread(target=_rewarm, daemon=True).start()
+        return session
+
+
+def _remember_cookies(session: requests.Session) -> None:
+    """Saves any cookies Vinted set or refreshed on a lookup."""
+    with _lock:
+        if session is _session and _cookie_entries(session) != _saved_cookies:
+            # A fresh jar's cookies refreshed by a lookup still don't make it worth re-warming.
+            _set_session(session, _save_jar(session), fresh=_rewarm_at == float("inf"))
+
+
+def _discard_session() -> None:
+    """Blocked or rate-limited: neither this session nor its saved cookies
+    are worth reusing."""
+    with _lock:
+        _set_session(None, 0.0, fresh=False)
         try:
-            # Seed session with Cloudflare clearance cookies from homepage
-            _session.get(HOME_URL, timeout=15)
-        except Exception as e:
-            _session = None
-            raise VintedLookupError(f"Não foi possível inicializar a sessão do Vinted ({e}).") from e
-    return _session
+            _COOKIE_JAR_PATH.unlink(missing_ok=True)
+        except OSError as e:
+            rprint(f"[yellow]Não foi possível apagar os cookies do Vinted ({e}).[/yellow]")
 
 
 def lookup_by_isbn(isbn: str) -> dict | None:
     """Returns {"title", "author"} or None if not found on Vinted."""
-    time.sleep(random.uniform(0.5, 1.5))
     session = _get_session()
 
     try:
+        rate_limit.wait(API_URL)
         r = session.get(API_URL, params={"isbn": isbn}, headers=HEADERS, timeout=15)
 
         if r.status_code == 404:
+            _remember_cookies(session)
             return None
         elif r.status_code in (403, 429):
-            # Reset cached session if blocked or rate-limited
-            global _session
-            _session = None
+            _discard_session()
             raise VintedLookupError(f"Acesso bloqueado pelo Vinted/Cloudflare (status {r.status_code}).")
 
         r.raise_for_status()
+        _remember_cookies(session)
         data = r.json()
     except requests.RequestsError as e:
         raise VintedLookupError(f"Não foi possível consultar o Vinted ({e}).") from e
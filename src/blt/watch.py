@@ -0,0 +1,228 @@
+"""
+`blt watch`: groups photos into books as they land in photos_raw/ (USB copy,
+phone sync, fetch_new_photos) and queues their extraction - no clicking
+"Confirmar todos" then "Detetar livros" after every batch.
+
+Change notifications come from inotify on Linux (through libc via ctypes,
+no extra dependency) and from polling the directory listing anywhere else.
+Either way, nothing is grouped until photos_raw/ has been quiet - no file
+created, grown or renamed - for `settle` seconds: a half-written photo (or
+the second half of a pair still on its way) keeps the whole batch waiting,
+so pairing sees exactly the photos a manual group-all would have.
+
+Extraction runs on its own background thread, so a slow, paced lookup run
+never holds up grouping the next batch; new books arriving meanwhile just
+mean one more run once the current one ends.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+import time
+from pathlib import Path
+
+from rich import print as rprint
+
+from . import db
+from .config import settings
+from .extract import extract_pending_books, grouped_isbn
+from .group_photos import commit_pair, pair_photos, quarantine_duplicates, raw_duplicates, raw_photos
+
+# inotify(7) - the events that mean a file appeared, grew or went away.
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+
+
+class _InotifyWatcher:
+    """Wakes up on any inotify event in one directory."""
+
+    def __init__(self, folder: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self._fd, os.fsencode(folder), _IN_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {folder}")
+
+    def wait(self, timeout: float) -> bool:
+        """Whether anything changed within `timeout` seconds."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self._fd, 64 * 1024):  # drain - which events doesn't matter, only that some came
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _PollingWatcher:
+    """Notices changes by re-listing the directory (name, size, mtime)."""
+
+    def __init__(self, folder: Path, interval: float = 1.0):
+        self._folder = folder
+        self._interval = interval
+        self._snapshot = self._listing()
+
+    def _listing(self) -> frozenset:
+        try:
+            return frozenset(
+                (entry.name, entry.stat().st_size, entry.stat().st_mtime_ns) for entry in os.scandir(self._folder)
+            )
+        except FileNotFoundError:
+            return frozenset()
+
+    def wait(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot = self._listing()
+            if snapshot != self._snapshot:
+                self._snapshot = snapshot
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self._interval, remaining))
+
+    def close(self) -> None:
+        pass
+
+
+def _open_watcher(folder: Path, poll: bool = False):
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return _InotifyWatcher(folder)
+        except OSError as e:
+            rprint(f"[yellow]inotify indisponível ({e}) - a verificar a pasta periodicamente.[/yellow]")
+    return _PollingWatcher(folder)
+
+
+class _ExtractionQueue:
+    """One background thread running extract_pending_books whenever asked;
+    asking while a run is in progress queues exactly one more run."""
+
+    def __init__(self):
+        self._wanted = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request(self) -> None:
+        self._wanted.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wanted.wait()
+            self._wanted.clear()
+            if self._stopping:
+                return
+            try:
+                result = extract_pending_books()
+                rprint(f"[green]{result['resolved']} resolvido(s), {result['failed']} marcado(s) como failed.[/green]")
+            except Exception as e:  # keep watching - the next batch retries whatever's still pending
+                rprint(f"[red]Extração falhou: {e}[/red]")
+
+    def stop(self) -> None:
+        """Lets a run in progress finish its current book in the background
+        (the thread is a daemon - exiting just drops it, and every book is
+        committed on its own) but starts no new one."""
+        self._stopping = True
+        self._wanted.set()
+
+
+def group_arrivals(raw: Path, grouped: Path, committed: set[tuple[str, int, int]]) -> list[Path]:
+    """
+    Commits every complete pair in raw (exactly as group_all pairs them,
+    duplicates quarantined first) and registers the new books. committed
+    holds the (name, size, mtime) of photos already grouped this session -
+    in DEV_MODE they're copied, not moved, so they'd otherwise be grouped
+    again on every pass.
+    """
+    duplicates = raw_duplicates(raw)  # DEV_MODE: left in raw, never paired
+    quarantine_duplicates(raw, duplicates)
+    photos = []
+    for photo in raw_photos(raw):
+        if photo in duplicates:
+            continue
+        try:
+            st = photo.stat()
+        except FileNotFoundError:
+            continue
+        if (photo.name, st.st_size, st.st_mtime_ns) not in committed:
+            photos.append((photo, (photo.name, st.st_size, st.st_mtime_ns)))
+    identity = dict(photos)
+    pairs, _ = pair_photos([photo for photo, _ in photos])
+    created = []
+    for cover, isbn in pairs:
+        dest = commit_pair(cover, isbn, grouped)
+        committed.update((identity[cover], identity[isbn]))
+        created.append(dest)
+        rprint(f"[green]{dest.name}[/green]: capa={cover.name}, isbn={isbn.name}")
+    if created:
+        db.sync_pending_books(grouped, isbn_for=grouped_isbn)
+    return created
+
+
+def watch(
+    raw_dir: Path | None = None,
+    grouped_dir: Path | None = None,
+    settle: float = 5.0,
+    poll: bool = False,
+    extract: bool = True,
+    stop: threading.Event | None = None,
+) -> None:
+    """
+    Runs until interrupted (or `stop` is set): whenever raw_dir has been
+    quiet for `settle` seconds after a change, groups whatever complete
+    pairs it holds, registers them and - unless extract=False - queues an
+    extraction run. Photos already there at startup are handled the same
+    way once they've settled. A pair that fails to group (e.g. a corrupt
+    photo) is reported and retried only after raw_dir changes again.
+    """
+    raw = Path(raw_dir) if raw_dir is not None else Path(settings.RAW_DIR)
+    grouped = Path(grouped_dir) if grouped_dir is not None else Path(settings.GROUPED_DIR)
+    raw.mkdir(parents=True, exist_ok=True)
+    stop = stop or threading.Event()
+    watcher = _open_watcher(raw, poll=poll)
+    extraction = _ExtractionQueue() if extract else None
+    committed: set[tuple[str, int, int]] = set()
+    pending = True  # whatever is already there counts as one change
+    last_change = time.monotonic()
+    rprint(f"[green]A vigiar {raw}/ - Ctrl+C para parar.[/green]")
+    try:
+        while not stop.is_set():
+            quiet_for = time.monotonic() - last_change
+            if watcher.wait(max(0.05, min(settle - quiet_for, 1.0)) if pending else 1.0):
+                pending, last_change = True, time.monotonic()
+                continue
+            if not pending or time.monotonic() - last_change < settle:
+                continue
+            pending = False
+            try:
+                created = group_arrivals(raw, grouped, committed)
+            except Exception as e:
+                rprint(f"[red]Não foi possível agrupar: {e}[/red]")
+                continue
+            if created and extraction is not None:
+                extraction.request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        if extraction is not None:
+            extraction.stop()
@@ -2,7 +2,7 @@ import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from blt import db
+from blt import barcode_cache, config, db, dedup, group_photos, heic_convert, rate_limit, renditions, vinted_lookup
 from blt.models import Base
 
 
@@ -15,3 +15,64 @@ def temp_db(tmp_path, monkeypatch):
     monkeypatch.setattr(db, "engine", engine)
     monkeypatch.setattr(db, "SessionLocal", session_factory)
     return session_factory
+
+
+@pytest.fixture(autouse=True)
+def _isolate_barcode_cache(tmp_path, monkeypatch):
+    """Never read or write the real barcode_cache.db next to blt.db."""
+    monkeypatch.setattr(barcode_cache, "_CACHE_PATH", tmp_path / "barcode_cache.db")
+
+
+@pytest.fixture(autouse=True)
+def _isolate_raw_index(tmp_path, monkeypatch):
+    """Never read or write the real .raw_index.json, nor reuse another test's listing."""
+    monkeypatch.setattr(group_photos, "_RAW_INDEX_PATH", tmp_path / "raw_index.json")
+    monkeypatch.setattr(group_photos, "_raw_listings", {})
+
+
+@pytest.fixture(autouse=True)
+def _isolate_raw_hashes(tmp_path, monkeypatch):
+    """Never read or write the real .raw_hashes.json."""
+    monkeypatch.setattr(dedup, "_HASH_INDEX_PATH", tmp_path / "raw_hashes.json")
+
+
+@pytest.fixture(autouse=True)
+def _isolate_duplicates_dir(tmp_path, monkeypatch):
+    """Never move raw duplicates into the real photos_duplicates/."""
+    monkeypatch.setattr(config.settings, "DUPLICATES_DIR", str(tmp_path / "photos_duplicates"))
+
+
+@pytest.fixture(autouse=True)
+def _isolate_heic_manifest(tmp_path, monkeypatch):
+    """Never read or write the real .heic_manifest.json."""
+    monkeypatch.setattr(heic_convert, "_MANIFEST_PATH", tmp_path / "heic_manifest.json")
+
+
+@pytest.fixture(autouse=True)
+def _isolate_rate_limits(monkeypatch):
+    """Every test starts with full per-host token buckets."""
+    monkeypatch.setattr(rate_limit, "_buckets", {})
+
+
+@pytest.fixture(autouse=True)
+def _isolate_vinted_session(tmp_path, monkeypatch):
+    """Never read or write the real .vinted_cookies.json, nor reuse another test's session."""
+    monkeypatch.setattr(vinted_lookup, "_COOKIE_JAR_PATH", tmp_path / "vinted_cookies.json")
+    monkeypatch.setattr(vinted_lookup, "_session", None)
+    monkeypatch.setattr(vinted_lookup, "_expires_at", 0.0)
+    monkeypatch.setattr(vinted_lookup, "_rewarm_at", 0.0)
+    monkeypatch.setattr(vinted_lookup, "_rewarming", False)
+    monkeypatch.setattr(vinted_lookup, "_saved_cookies", [])
+    monkeypatch.setattr(vinted_lookup, "session_starts", {"cold": 0, "warm": 0, "rewarm": 0})
+
+
+@pytest.fixture(autouse=True)
+def _isolate_renditions(tmp_path, monkeypatch):
+    """Never write photo renditions into the real .renditions/ cache - and
+    let a background warm-up finish before the cache dir is swapped back."""
+    monkeypatch.setattr(renditions, "_CACHE_DIR", tmp_path / "renditions")
+    monkeypatch.setattr(renditions, "_cache_bytes", None)
+    monkeypatch.setattr(renditions, "_warm_queue", [])
+    yield
+    with renditions._warm_lock:
+        pass
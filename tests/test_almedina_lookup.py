@@ -2,6 +2,17 @@ import pytest
 import requests
 
 from blt import almedina_lookup as al
+from blt import http_session, rate_limit
+
+
+class _FakeSession:
+    def __init__(self, get):
+        self.get = get
+
+
+def _serve(monkeypatch, get):
+    """Lookups go through http_session's pooled session - hand them a fake one."""
+    monkeypatch.setattr(http_session, "session", lambda: _FakeSession(get))
 
 
 class _FakeResponse:
@@ -35,14 +46,14 @@ _NOT_FOUND_HTML = """
 
 
 def test_found_book_extracts_title_and_author(monkeypatch):
-    monkeypatch.setattr(al.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
 
     def fake_get(url, params, headers, timeout):
         assert params["q"] == "9789896689704"
         assert "User-Agent" in headers
         return _FakeResponse(200, _PRODUCT_PAGE_HTML)
 
-    monkeypatch.setattr(requests, "get", fake_get)
+    _serve(monkeypatch, fake_get)
 
     result = al.lookup_by_isbn("9789896689704")
 
@@ -50,16 +61,16 @@ def test_found_book_extracts_title_and_author(monkeypatch):
 
 
 def test_not_found_returns_none(monkeypatch):
-    monkeypatch.setattr(al.time, "sleep", lambda seconds: None)
-    monkeypatch.setattr(requests, "get", lambda *a, **k: _FakeResponse(200, _NOT_FOUND_HTML))
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    _serve(monkeypatch, lambda *a, **k: _FakeResponse(200, _NOT_FOUND_HTML))
 
     assert al.lookup_by_isbn("9780000000002") is None
 
 
 def test_no_author_link_returns_none_author(monkeypatch):
-    monkeypatch.setattr(al.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
     html = '<html><body><h1 itemprop="name">Some Title</h1></body></html>'
-    monkeypatch.setattr(requests, "get", lambda *a, **k: _FakeResponse(200, html))
+    _serve(monkeypatch, lambda *a, **k: _FakeResponse(200, html))
 
     result = al.lookup_by_isbn("9789896689704")
 
@@ -67,31 +78,31 @@ def test_no_author_link_returns_none_author(monkeypatch):
 
 
 def test_network_failure_raises_almedina_lookup_error(monkeypatch):
-    monkeypatch.setattr(al.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
 
     def fake_get(*a, **k):
         raise requests.ConnectionError("nope")
 
-    monkeypatch.setattr(requests, "get", fake_get)
+    _serve(monkeypatch, fake_get)
 
     with pytest.raises(al.AlmedinaLookupError):
         al.lookup_by_isbn("9789896689704")
 
 
 def test_http_error_raises_almedina_lookup_error(monkeypatch):
-    monkeypatch.setattr(al.time, "sleep", lambda seconds: None)
-    monkeypatch.setattr(requests, "get", lambda *a, **k: _FakeResponse(403, "Forbidden"))
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    _serve(monkeypatch, lambda *a, **k: _FakeResponse(403, "Forbidden"))
 
     with pytest.raises(al.AlmedinaLookupError):
         al.lookup_by_isbn("9789896689704")
 
 
-def test_sleeps_a_small_random_delay_before_every_request(monkeypatch):
-    sleeps = []
-    monkeypatch.setattr(al.time, "sleep", lambda seconds: sleeps.append(seconds))
-    monkeypatch.setattr(requests, "get", lambda *a, **k: _FakeResponse(200, _PRODUCT_PAGE_HTML))
+def test_every_request_waits_its_turn_in_the_rate_limiter(monkeypatch):
+    waits = []
+    monkeypatch.setattr(rate_limit, "wait", lambda url: waits.append(url) or 0.0)
+    _serve(monkeypatch, lambda *a, **k: _FakeResponse(200, _PRODUCT_PAGE_HTML))
 
+    al.lookup_by_isbn("9789896689704")
     al.lookup_by_isbn("9789896689704")
 
-    assert len(sleeps) == 1
-    assert 0.5 <= sleeps[0] <= 1.5
+    assert waits == [al.SEARCH_URL, al.SEARCH_URL]
@@ -4,7 +4,8 @@ import barcode as barcode_lib
 from barcode.writer import ImageWriter
 from PIL import Image
 
-from blt.barcode import decode_isbn_barcode
+from blt import barcode_cache
+from blt.barcode import PYRAMID_LEVELS, BarcodeRead, decode_isbn_barcode, decode_isbn_barcodes, read_isbn_barcode
 
 
 def _make_ean13_image(path, isbn12: str):
@@ -35,3 +36,120 @@ def test_no_barcode_present_returns_none(tmp_path):
     Image.new("RGB", (100, 100), color="white").save(p)
 
     assert decode_isbn_barcode(p) is None
+
+
+def _make_phone_photo(path, isbn12: str, size=(4000, 3000), barcode_width=3000):
+    """A barcode close-up the way a phone takes it: a big JPEG, barcode filling most of the frame."""
+    ean = barcode_lib.get("ean13", isbn12, writer=ImageWriter())
+    buf = BytesIO()
+    ean.write(buf, options={"write_text": False})
+    buf.seek(0)
+    code = Image.open(buf).convert("RGB")
+    code = code.resize((barcode_width, barcode_width * code.height // code.width))
+    photo = Image.new("RGB", size, color="white")
+    photo.paste(code, ((size[0] - code.width) // 2, (size[1] - code.height) // 2))
+    photo.save(path, "JPEG", quality=90)
+
+
+def test_large_photo_decodes_on_the_smallest_pyramid_level(tmp_path):
+    p = tmp_path / "isbn.jpg"
+    _make_phone_photo(p, "978989710083")
+
+    assert read_isbn_barcode(p) == BarcodeRead("9789897100833", 0)
+
+
+def test_photo_smaller_than_every_level_goes_straight_to_full_resolution(tmp_path):
+    p = tmp_path / "isbn.png"
+    _make_ean13_image(p, "978989710083")
+
+    assert read_isbn_barcode(p) == BarcodeRead("9789897100833", len(PYRAMID_LEVELS) - 1)
+
+
+def test_unreadable_photo_reports_no_level(tmp_path):
+    p = tmp_path / "blank.jpg"
+    Image.new("RGB", (4000, 3000), color="white").save(p, "JPEG")
+
+    assert read_isbn_barcode(p) == BarcodeRead(None, None)
+
+
+def test_batch_decode_skips_missing_photos_and_reports_progress(tmp_path):
+    good = tmp_path / "a.png"
+    _make_ean13_image(good, "978989710083")
+    blank = tmp_path / "b.png"
+    Image.new("RGB", (100, 100), color="white").save(blank)
+    progress = []
+
+    result = decode_isbn_barcodes(
+        [good, tmp_path / "missing.png", blank],
+        workers=1,
+        on_progress=lambda done, total: progress.append((done, total)),
+    )
+
+    assert result == {good: "9789897100833", blank: None}
+    assert progress == [(1, 2), (2, 2)]
+
+
+def test_batch_decode_across_processes_fills_the_cache(tmp_path):
+    photos = []
+    for name, isbn12 in (("a.png", "978989710083"), ("b.png", "978972004123")):
+        photos.append(tmp_path / name)
+        _make_ean13_image(photos[-1], isbn12)
+
+    result = decode_isbn_barcodes(photos, workers=2)
+
+    assert result == {photos[0]: "9789897100833", photos[1]: "9789720041234"}
+    # decoded in the worker processes, but cached where the parent reads it
+    assert barcode_cache.get(barcode_cache.file_key(photos[1])) == ("9789720041234", len(PYRAMID_LEVELS) - 1)
+
+
+def _make_hard_photo(path, isbn12: str, fade=0.0, angle=0.0):
+    """A photo plain zbar passes struggle with: a washed-out print and/or a barcode turned diagonally."""
+    ean = barcode_lib.get("ean13", isbn12, writer=ImageWriter())
+    buf = BytesIO()
+    ean.write(buf, options={"write_text": False})
+    buf.seek(0)
+    code = Image.open(buf).convert("RGB")
+    code = Image.blend(code, Image.new("RGB", code.size, (150, 150, 150)), fade)
+    code = code.resize((1600, 1600 * code.height // code.width)).rotate(angle, expand=True, fillcolor=(150, 150, 150))
+    photo = Image.new("RGB", (3000, 2250), color=(150, 150, 150))
+    photo.paste(code, ((photo.width - code.width) // 2, (photo.height - code.height) // 2))
+    photo.save(path, "JPEG", quality=90)
+
+
+def test_low_contrast_barcode_is_rescued_by_preprocessing(tmp_path):
+    p = tmp_path / "isbn.jpg"
+    _make_hard_photo(p, "978989710083", fade=0.97)
+
+    assert read_isbn_barcode(p, preprocess=False) == BarcodeRead(None)
+    read = read_isbn_barcode(p)
+    assert read.isbn == "9789897100833"
+    assert read.stage is not None
+
+
+def test_diagonal_barcode_is_rescued_by_the_turned_crop(tmp_path):
+    p = tmp_path / "isbn.jpg"
+    _make_hard_photo(p, "978989710083", angle=45)
+
+    assert read_isbn_barcode(p, preprocess=False) == BarcodeRead(None)
+    assert read_isbn_barcode(p).stage == "crop_rot45"
+
+
+def test_plain_read_never_runs_preprocessing(tmp_path):
+    p = tmp_path / "isbn.jpg"
+    _make_phone_photo(p, "978989710083")
+    timings = []
+
+    read_isbn_barcode(p, timings=timings)
+
+    assert [name for name, _ in timings] == ["plain@1024"]
+
+
+def test_every_attempt_is_timed_in_order(tmp_path):
+    p = tmp_path / "blank.jpg"
+    Image.new("RGB", (4000, 3000), color="white").save(p, "JPEG")
+    timings = []
+
+    assert read_isbn_barcode(p, timings=timings) == BarcodeRead(None)
+    # a blank photo has no barcode-like region, so there's nothing to crop
+    assert [name for name, _ in timings] == ["plain@1024", "plain@2048", "plain@full", "contrast", "threshold"]
+    assert all(ms >= 0 for _, ms in timings)
@@ -0,0 +1,96 @@
+from PIL import Image
+
+from blt import barcode, barcode_cache
+from blt.barcode import decode_isbn_barcode
+
+
+def _photo(tmp_path, name="isbn.jpg", color="white"):
+    p = tmp_path / name
+    Image.new("RGB", (40, 40), color=color).save(p, "JPEG")
+    return p
+
+
+def _count_reads(monkeypatch, isbn="9789897100833"):
+    calls = []
+
+    def fake_read(path):
+        calls.append(path)
+        return barcode.BarcodeRead(isbn, 0)
+
+    monkeypatch.setattr(barcode, "read_isbn_barcode", fake_read)
+    return calls
+
+
+def test_second_decode_of_unchanged_photo_skips_the_image_decode(tmp_path, monkeypatch):
+    p = _photo(tmp_path)
+    calls = _count_reads(monkeypatch)
+
+    assert decode_isbn_barcode(p) == "9789897100833"
+    assert decode_isbn_barcode(p) == "9789897100833"
+    assert len(calls) == 1
+
+
+def test_no_barcode_found_is_cached_too(tmp_path, monkeypatch):
+    p = _photo(tmp_path)
+    calls = _count_reads(monkeypatch, isbn=None)
+
+    assert decode_isbn_barcode(p) is None
+    assert decode_isbn_barcode(p) is None
+    assert len(calls) == 1
+
+
+def test_cache_follows_content_not_path(tmp_path, monkeypatch):
+    p = _photo(tmp_path)
+    calls = _count_reads(monkeypatch)
+    decode_isbn_barcode(p)
+
+    moved = tmp_path / "book_001"
+    moved.mkdir()
+    p = p.replace(moved / "isbn.jpg")
+
+    assert decode_isbn_barcode(p) == "9789897100833"
+    assert len(calls) == 1
+
+
+def test_changed_bytes_are_a_miss(tmp_path, monkeypatch):
+    p = _photo(tmp_path)
+    calls = _count_reads(monkeypatch)
+    decode_isbn_barcode(p)
+
+    Image.new("RGB", (40, 40), color="black").save(p, "JPEG")
+    decode_isbn_barcode(p)
+
+    assert len(calls) == 2
+
+
+def test_invalidate_drops_the_entry_for_the_current_bytes(tmp_path, monkeypatch):
+    p = _photo(tmp_path)
+    calls = _count_reads(monkeypatch)
+    decode_isbn_barcode(p)
+
+    barcode_cache.invalidate(p)
+    decode_isbn_barcode(p)
+
+    assert len(calls) == 2
+
+
+def test_entry_from_an_older_decoder_version_is_a_miss(tmp_path, monkeypatch):
+    p = _photo(tmp_path)
+    calls = _count_reads(monkeypatch)
+    decode_isbn_barcode(p)
+
+    monkeypatch.setattr(barcode_cache, "_DECODER_VERSION", barcode_cache._DECODER_VERSION + 1)
+    decode_isbn_barcode(p)
+
+    assert len(calls) == 2
+
+
+def test_use_cache_false_always_decodes(tmp_path, monkeypatch):
+    p = _photo(tmp_path)
+    calls = _count_reads(monkeypatch)
+
+    decode_isbn_barcode(p, use_cache=False)
+    decode_isbn_barcode(p, use_cache=False)
+
+    assert len(calls) == 2
+    assert barcode_cache.get(barcode_cache.file_key(p)) is None
@@ -43,7 +43,7 @@ def test_group_all_passes_max_groups_and_syncs_pending(monkeypatch):
 
     calls = {}
     monkeypatch.setattr(group_photos, "group_all", lambda max_groups=None: calls.update(max_groups=max_groups))
-    monkeypatch.setattr(db, "sync_pending_books", lambda grouped_dir: 3)
+    monkeypatch.setattr(db, "sync_pending_books", lambda grouped_dir, isbn_for=None: 3)
 
     result = runner.invoke(app, ["group-all", "--max-groups", "5"])
 
@@ -59,14 +59,15 @@ def test_group_all_resets_pending_books_in_dev_mode(monkeypatch):
 
     monkeypatch.setattr(settings, "DEV_MODE", True)
     monkeypatch.setattr(group_photos, "group_all", lambda max_groups=None: None)
-    monkeypatch.setattr(db, "sync_pending_books", lambda grouped_dir: 0)
+    monkeypatch.setattr(db, "sync_pending_books", lambda grouped_dir, isbn_for=None: 0)
     reset_calls = []
-    monkeypatch.setattr(db, "reset_dev_pending_books", lambda: reset_calls.append(True) or 2)
+    monkeypatch.setattr(db, "reset_dev_pending_books", lambda: reset_calls.append("books") or 2)
+    monkeypatch.setattr(group_photos, "reset_book_index", lambda: reset_calls.append("numbering"))
 
     result = runner.invoke(app, ["group-all"])
 
     assert result.exit_code == 0
-    assert reset_calls == [True]
+    assert reset_calls == ["books", "numbering"]
     assert "reiniciados" in result.output
 
 
@@ -75,8 +76,8 @@ def test_extract_passes_limit(monkeypatch):
 
     captured = {}
 
-    def fake_extract(limit=None):
-        captured["limit"] = limit
+    def fake_extract(limit=None, refresh=False):
+        captured.update(limit=limit, refresh=refresh)
         return {"resolved": 1, "failed": 0}
 
     monkeypatch.setattr(extract, "extract_pending_books", fake_extract)
@@ -84,10 +85,25 @@ def test_extract_passes_limit(monkeypatch):
     result = runner.invoke(app, ["extract", "--limit", "10"])
 
     assert result.exit_code == 0
-    assert captured == {"limit": 10}
+    assert captured == {"limit": 10, "refresh": False}
     assert "1 resolvido" in result.output
 
 
+def test_extract_refresh_bypasses_recorded_answers(monkeypatch):
+    import blt.extract as extract
+
+    captured = {}
+    monkeypatch.setattr(
+        extract, "extract_pending_books",
+        lambda limit=None, refresh=False: captured.update(refresh=refresh) or {"resolved": 0, "failed": 0},
+    )
+
+    result = runner.invoke(app, ["extract", "--refresh"])
+
+    assert result.exit_code == 0
+    assert captured == {"refresh": True}
+
+
 def test_review_starts_uvicorn_with_host_and_port(monkeypatch):
     import uvicorn
 
@@ -145,14 +161,36 @@ def test_convert_heic_passes_path_and_flags(monkeypatch):
 
     captured = {}
 
-    def fake_convert_folder(folder, recursive=True, delete_src=True):
-        captured.update(folder=folder, recursive=recursive, delete_src=delete_src)
+    def fake_convert_folder(folder, recursive=True, delete_src=True, workers=None, report=None):
+        captured.update(folder=folder, recursive=recursive, delete_src=delete_src, workers=workers)
         return ["a.jpg", "b.jpg"]
 
     monkeypatch.setattr(heic_convert, "convert_folder", fake_convert_folder)
 
-    result = runner.invoke(app, ["convert-heic", "some/dir", "--no-recursive", "--delete-src"])
+    result = runner.invoke(app, ["convert-heic", "some/dir", "--no-recursive", "--delete-src", "--workers", "3"])
 
     assert result.exit_code == 0
-    assert captured == {"folder": Path("some/dir"), "recursive": False, "delete_src": True}
+    assert captured == {"folder": Path("some/dir"), "recursive": False, "delete_src": True, "workers": 3}
     assert "2 ficheiro" in result.output
+
+
+def test_convert_heic_summarizes_paths_timings_and_failures(monkeypatch):
+    import blt.heic_convert as heic_convert
+
+    def fake_convert_folder(folder, recursive=True, delete_src=True, workers=None, report=None):
+        report.extend([
+            heic_convert.Conversion(Path("a.heic"), Path("a.jpg"), "pillow", 0.2),
+            heic_convert.Conversion(Path("b.heic"), Path("b.jpg"), "cached", 0.0),
+            heic_convert.Conversion(Path("c.heic"), None, "failed", 0.1, error="Invalid data"),
+        ])
+        return [Path("a.jpg"), Path("b.jpg")]
+
+    monkeypatch.setattr(heic_convert, "convert_folder", fake_convert_folder)
+
+    result = runner.invoke(app, ["convert-heic", "some/dir", "-v"])
+
+    assert result.exit_code == 0
+    assert "a.heic: pillow, 200 ms" in result.output
+    assert "cached: 1, failed: 1, pillow: 1" in result.output
+    assert "1 ficheiro(s) não convertidos" in result.output
+    assert "c.heic: Invalid data" in result.output
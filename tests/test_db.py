@@ -1,9 +1,10 @@
 from pathlib import Path
 
+from PIL import Image
 from sqlalchemy import create_engine, select, text
 from sqlalchemy.orm import sessionmaker
 
-from blt import db
+from blt import barcode_cache, config, db, extract
 from blt.models import Book, BookPlatform, Sale
 
 
@@ -41,6 +42,33 @@ def test_sync_is_idempotent(tmp_path, temp_db):
         assert len(s.execute(select(Book)).scalars().all()) == 1
 
 
+def test_sync_stores_the_isbn_fused_grouping_already_read(tmp_path, temp_db, monkeypatch):
+    monkeypatch.setattr(config.settings, "FUSED_GROUPING", True)
+    grouped = tmp_path / "grouped"
+    _make_book_folders(grouped, ["book_001", "book_002"])
+    for name, color in (("book_001", "white"), ("book_002", "black")):
+        Image.new("RGB", (8, 8), color=color).save(grouped / name / "isbn.jpg")
+    barcode_cache.put(barcode_cache.file_key(grouped / "book_001" / "isbn.jpg"), "9789897100833", 0)
+
+    db.sync_pending_books(grouped, isbn_for=extract.grouped_isbn)
+
+    with temp_db() as s:
+        books = s.execute(select(Book).order_by(Book.folder_path)).scalars().all()
+        assert [b.isbn for b in books] == ["9789897100833", None]  # book_002 never read: left for extraction
+
+
+def test_sync_leaves_isbn_empty_without_fused_grouping(tmp_path, temp_db):
+    grouped = tmp_path / "grouped"
+    _make_book_folders(grouped, ["book_001"])
+    Image.new("RGB", (8, 8), color="white").save(grouped / "book_001" / "isbn.jpg")
+    barcode_cache.put(barcode_cache.file_key(grouped / "book_001" / "isbn.jpg"), "9789897100833", 0)
+
+    db.sync_pending_books(grouped, isbn_for=extract.grouped_isbn)
+
+    with temp_db() as s:
+        assert s.execute(select(Book.isbn)).scalar_one() is None
+
+
 def test_sync_ignores_non_book_folders(tmp_path, temp_db):
     grouped = tmp_path / "grouped"
     _make_book_folders(grouped, ["book_001", "not_a_book", "random"])
@@ -55,7 +83,8 @@ def test_sync_missing_dir_returns_zero(tmp_path, temp_db):
     assert added == 0
 
 
-def test_reset_dev_pending_books_removes_pending_and_failed_only(tmp_path, temp_db):
+def test_reset_dev_pending_books_removes_pending_and_failed_only(tmp_path, temp_db, monkeypatch):
+    monkeypatch.setattr(db.settings, "GROUPED_DIR", str(tmp_path))
     pending_folder = tmp_path / "book_001"
     failed_folder = tmp_path / "book_002"
     available_folder = tmp_path / "book_003"
@@ -83,7 +112,8 @@ def test_reset_dev_pending_books_removes_pending_and_failed_only(tmp_path, temp_
         assert {b.status for b in remaining} == {"available", "sold_out"}
 
 
-def test_reset_dev_pending_books_is_a_noop_when_nothing_to_clear(temp_db):
+def test_reset_dev_pending_books_is_a_noop_when_nothing_to_clear(tmp_path, temp_db, monkeypatch):
+    monkeypatch.setattr(db.settings, "GROUPED_DIR", str(tmp_path))
     with temp_db() as s:
         s.add(Book(folder_path="x", status="available", title="Real Listing"))
         s.commit()
@@ -0,0 +1,71 @@
+import random
+import shutil
+
+from PIL import Image
+
+from blt import dedup
+
+
+def _boom_if_called(*args, **kwargs):
+    raise AssertionError("this should not have been called")
+
+
+def _photo(path, seed, quality=90):
+    """A JPEG of a random 9x8 grid of grays, scaled up - something with
+    enough structure for its dHash to mean anything."""
+    rng = random.Random(seed)
+    grid = Image.frombytes("L", (9, 8), bytes(rng.randrange(256) for _ in range(72)))
+    grid.resize((180, 160), Image.Resampling.NEAREST).convert("RGB").save(path, "JPEG", quality=quality)
+    return path
+
+
+def test_exact_copy_is_a_duplicate_of_the_earlier_photo(tmp_path):
+    a = _photo(tmp_path / "a.jpg", seed=1)
+    b = shutil.copy(a, tmp_path / "b.jpg")
+    c = _photo(tmp_path / "c.jpg", seed=2)
+
+    duplicates = dedup.find_duplicates([(a, 0.0), (c, 100.0), (b, 600.0)])
+
+    assert duplicates == {b: a}  # exact: however far apart in time
+
+
+def test_near_identical_photo_moments_later_is_a_duplicate(tmp_path):
+    a = _photo(tmp_path / "a.jpg", seed=1)
+    b = _photo(tmp_path / "b.jpg", seed=1, quality=60)  # different bytes, same picture
+
+    assert dedup.find_duplicates([(a, 0.0), (b, 2.0)]) == {b: a}
+
+
+def test_near_identical_photos_minutes_apart_are_not_duplicates(tmp_path):
+    a = _photo(tmp_path / "a.jpg", seed=1)
+    b = _photo(tmp_path / "b.jpg", seed=1, quality=60)
+
+    assert dedup.find_duplicates([(a, 0.0), (b, dedup.NEAR_SECONDS + 60)]) == {}
+
+
+def test_flat_frames_are_never_near_duplicates(tmp_path):
+    a, b = tmp_path / "a.jpg", tmp_path / "b.jpg"
+    Image.new("RGB", (64, 64), (10, 10, 10)).save(a, "JPEG")
+    Image.new("RGB", (64, 64), (240, 240, 240)).save(b, "JPEG")
+
+    assert dedup.find_duplicates([(a, 0.0), (b, 1.0)]) == {}
+
+
+def test_marked_not_duplicate_is_never_flagged_again(tmp_path):
+    a = _photo(tmp_path / "a.jpg", seed=1)
+    b = _photo(tmp_path / "b.jpg", seed=1, quality=60)
+
+    dedup.mark_not_duplicate(b)
+
+    assert dedup.find_duplicates([(a, 0.0), (b, 2.0)]) == {}
+
+
+def test_hashes_come_from_the_index_on_the_next_call(tmp_path, monkeypatch):
+    a = _photo(tmp_path / "a.jpg", seed=1)
+    b = shutil.copy(a, tmp_path / "b.jpg")
+    listing = [(a, 0.0), (b, 1.0)]
+    dedup.find_duplicates(listing)
+    monkeypatch.setattr(dedup, "_content_hash", _boom_if_called)
+    monkeypatch.setattr(dedup, "_dhash", _boom_if_called)
+
+    assert dedup.find_duplicates(listing) == {b: a}
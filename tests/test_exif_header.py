@@ -0,0 +1,78 @@
+import pytest
+from PIL import Image
+from PIL.ExifTags import IFD
+
+from blt import images  # noqa: F401 - registers the HEIF opener, for saving .heic fixtures
+from blt.exif_header import NoOrientationTag, jpeg_orientation, read_exif_datetime
+
+
+def _exif(original=None, plain=None) -> bytes:
+    exif = Image.Exif()
+    if plain:
+        exif[306] = plain  # DateTime
+    if original:
+        exif.get_ifd(IFD.Exif)[36867] = original  # DateTimeOriginal
+    return exif.tobytes()
+
+
+@pytest.mark.parametrize("name", ["photo.jpg", "photo.heic"])
+def test_prefers_datetime_original(tmp_path, name):
+    p = tmp_path / name
+    Image.new("RGB", (64, 64), "red").save(p, exif=_exif("2021:05:06 07:08:09", "2020:01:01 00:00:00"))
+
+    assert read_exif_datetime(p) == "2021:05:06 07:08:09"
+
+
+@pytest.mark.parametrize("name", ["photo.jpg", "photo.heic"])
+def test_falls_back_to_plain_datetime(tmp_path, name):
+    p = tmp_path / name
+    Image.new("RGB", (64, 64), "red").save(p, exif=_exif(plain="2020:01:01 10:00:00"))
+
+    assert read_exif_datetime(p) == "2020:01:01 10:00:00"
+
+
+@pytest.mark.parametrize("name", ["photo.jpg", "photo.heic"])
+def test_no_exif_is_none_not_an_error(tmp_path, name):
+    p = tmp_path / name
+    Image.new("RGB", (64, 64), "red").save(p)
+
+    assert read_exif_datetime(p) is None
+
+
+def test_unsupported_or_broken_files_raise_value_error(tmp_path):
+    png = tmp_path / "photo.png"
+    Image.new("RGB", (8, 8)).save(png)
+    truncated = tmp_path / "photo.jpg"
+    truncated.write_bytes(b"\xff\xd8\xff\xe1\x00")
+
+    with pytest.raises(ValueError):
+        read_exif_datetime(png)
+    with pytest.raises(ValueError):
+        read_exif_datetime(truncated)
+
+
+@pytest.mark.parametrize("order", ["II", "MM"])
+def test_jpeg_orientation_locates_the_tag_byte_exact(tmp_path, order):
+    exif = Image.Exif()
+    exif.endian = "<" if order == "II" else ">"
+    exif[0x0112] = 6
+    exif[306] = "2020:01:01 10:00:00"
+    p = tmp_path / "photo.jpg"
+    Image.new("RGB", (64, 64), "red").save(p, exif=exif.tobytes())
+    data = p.read_bytes()
+
+    value, offset, byte_order = jpeg_orientation(data)
+
+    assert value == 6
+    assert data[offset:offset + 2] == (6).to_bytes(2, "little" if byte_order == "<" else "big")
+
+
+def test_jpeg_orientation_none_without_exif_error_without_the_tag(tmp_path):
+    bare, dated = tmp_path / "bare.jpg", tmp_path / "dated.jpg"
+    Image.new("RGB", (64, 64), "red").save(bare)
+    Image.new("RGB", (64, 64), "red").save(dated, exif=_exif(plain="2020:01:01 10:00:00"))
+
+    assert jpeg_orientation(bare.read_bytes()) is None
+    with pytest.raises(NoOrientationTag):
+        jpeg_orientation(dated.read_bytes())
+
@@ -1,6 +1,16 @@
-from blt import extract
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from blt import extract, isbn_metadata, rate_limit
+from blt.almedina_lookup import SEARCH_URL as ALMEDINA_URL
 from blt.almedina_lookup import AlmedinaLookupError
 from blt.isbnsearch_lookup import IsbnSearchLookupError
+from blt.models import IsbnMetadata
 from blt.vinted_lookup import VintedLookupError
 
 
@@ -8,6 +18,12 @@ def _boom(*a, **k):
     raise AssertionError("this should not have been called")
 
 
+@pytest.fixture(autouse=True)
+def _db(temp_db):
+    """Every lookup's answer is recorded in isbn_metadata - never in the real blt.db."""
+    return temp_db
+
+
 def test_vinted_succeeds_no_fallback_needed(monkeypatch, tmp_path):
     monkeypatch.setattr(extract, "decode_isbn_barcode", lambda p: "9789896689704")
     monkeypatch.setattr(
@@ -183,3 +199,198 @@ def test_no_barcode_leaves_unresolved_no_lookup_attempted(monkeypatch, tmp_path)
     result = extract.extract_book_fields(tmp_path)
 
     assert result == {"title": None, "author": None, "isbn": None}
+
+
+@pytest.fixture
+def unpaced(monkeypatch):
+    """Fake requests go out as soon as they reach the rate limiter."""
+    monkeypatch.setattr(extract.settings, "RATE_LIMIT_BURST", 100)
+    monkeypatch.setattr(extract.settings, "RATE_LIMIT_JITTER_SECONDS", 0.0)
+
+
+def _slow(seconds, answer, calls=None, name=None):
+    """A lookup whose request goes out (through the rate limiter, like a
+    real one) straight away and is answered `seconds` later."""
+    def lookup(isbn):
+        if calls is not None:
+            calls.append(name)
+        rate_limit.wait("https://isbnsearch.org/isbn/")
+        time.sleep(seconds)
+        return answer
+
+    return lookup
+
+
+def test_slow_higher_priority_source_still_wins_over_a_faster_one(monkeypatch, tmp_path, unpaced):
+    monkeypatch.setattr(extract, "decode_isbn_barcode", lambda p: "9789896689704")
+    monkeypatch.setattr(extract.settings, "LOOKUP_STAGGER_SECONDS", 0.05)
+    monkeypatch.setattr(extract, "vinted_lookup_by_isbn", _slow(0.3, {"title": "Sempre Tu", "author": "C. Hoover"}))
+    monkeypatch.setattr(extract, "almedina_lookup_by_isbn", lambda isbn: {"title": "SEMPRE TU", "author": "Hoover"})
+    monkeypatch.setattr(extract, "isbnsearch_lookup_by_isbn", lambda isbn: None)
+
+    result = extract.extract_book_fields(tmp_path)
+
+    assert result == {"title": "Sempre Tu", "author": "C. Hoover", "isbn": "9789896689704"}
+
+
+def test_sources_overlap_instead_of_queueing(monkeypatch, tmp_path, unpaced):
+    monkeypatch.setattr(extract, "decode_isbn_barcode", lambda p: "9789896689704")
+    monkeypatch.setattr(extract.settings, "LOOKUP_STAGGER_SECONDS", 0.05)
+    monkeypatch.setattr(extract, "vinted_lookup_by_isbn", _slow(0.4, None))
+    monkeypatch.setattr(extract, "almedina_lookup_by_isbn", _slow(0.4, {"title": "Sempre Tu", "author": "C. Hoover"}))
+    monkeypatch.setattr(extract, "isbnsearch_lookup_by_isbn", _slow(0.4, None))
+
+    started = time.monotonic()
+    result = extract.extract_book_fields(tmp_path)
+
+    assert result["title"] == "Sempre Tu"
+    assert time.monotonic() - started < 0.7  # one after another: 0.8s+
+
+
+def test_source_not_started_once_the_answer_is_settled(monkeypatch, tmp_path, unpaced):
+    monkeypatch.setattr(extract, "decode_isbn_barcode", lambda p: "9789896689704")
+    monkeypatch.setattr(extract.settings, "LOOKUP_STAGGER_SECONDS", 0.2)
+    calls = []
+    monkeypatch.setattr(extract, "vinted_lookup_by_isbn", _slow(0, None, calls, "vinted"))
+    monkeypatch.setattr(extract, "almedina_lookup_by_isbn", _slow(0, {"title": "T", "author": "A"}, calls, "almedina"))
+    monkeypatch.setattr(extract, "isbnsearch_lookup_by_isbn", _slow(0, None, calls, "isbnsearch"))
+
+    extract.extract_book_fields(tmp_path)
+
+    assert calls == ["vinted", "almedina"]  # almedina started early: vinted had answered
+
+
+def _queued(per_minute, monkeypatch):
+    """Sets the Almedina host's pace and uses up its burst, so the next
+    request to it waits 60/per_minute seconds for its turn."""
+    monkeypatch.setattr(extract.settings, "RATE_LIMIT_BURST", 1)
+    monkeypatch.setattr(extract.settings, "RATE_LIMIT_JITTER_SECONDS", 0.0)
+    monkeypatch.setattr(extract.settings, "ALMEDINA_REQUESTS_PER_MINUTE", per_minute)
+    rate_limit.wait(ALMEDINA_URL)
+
+
+def test_stagger_counts_from_when_a_request_goes_out_not_from_its_queueing(monkeypatch, tmp_path):
+    monkeypatch.setattr(extract, "decode_isbn_barcode", lambda p: "9789896689704")
+    monkeypatch.setattr(extract.settings, "LOOKUP_STAGGER_SECONDS", 0.05)
+    _queued(200, monkeypatch)  # 0.3 s until Almedina's turn
+    calls = []
+
+    def almedina(isbn):
+        rate_limit.wait(ALMEDINA_URL)
+        calls.append("almedina")
+        return {"title": "T", "author": "A"}
+
+    # Almedina now goes first, as the source whose request sits in the queue.
+    monkeypatch.setattr(extract, "vinted_lookup_by_isbn", almedina)
+    monkeypatch.setattr(extract, "almedina_lookup_by_isbn", _found(calls, "isbnsearch", None))
+    monkeypatch.setattr(extract, "isbnsearch_lookup_by_isbn", _boom)
+
+    result = extract.extract_book_fields(tmp_path)
+
+    assert result["title"] == "T"
+    assert calls == ["almedina"]  # nothing below it was asked while it waited its turn
+
+
+def test_request_still_queued_when_the_answer_settles_is_never_sent(monkeypatch, tmp_path, temp_db):
+    monkeypatch.setattr(extract, "decode_isbn_barcode", lambda p: "9789896689704")
+    monkeypatch.setattr(extract.settings, "LOOKUP_STAGGER_SECONDS", 0.0)
+    _queued(200, monkeypatch)  # 0.3 s until Almedina's turn
+    sent = []
+
+    def vinted(isbn):
+        rate_limit.wait("https://www.vinted.pt/")
+        time.sleep(0.1)
+        return {"title": "T", "author": "A"}
+
+    def almedina(isbn):
+        rate_limit.wait(ALMEDINA_URL)
+        sent.append("almedina")
+        return {"title": "X", "author": "Y"}
+
+    monkeypatch.setattr(extract, "vinted_lookup_by_isbn", vinted)
+    monkeypatch.setattr(extract, "almedina_lookup_by_isbn", almedina)
+    monkeypatch.setattr(extract, "isbnsearch_lookup_by_isbn", _boom)
+
+    assert extract.extract_book_fields(tmp_path)["title"] == "T"
+    time.sleep(0.4)  # past Almedina's turn
+
+    assert sent == []
+    assert isbn_metadata.get("9789896689704", "almedina") is None
+
+
+def _found(calls, name, answer):
+    return lambda isbn: calls.append(name) or answer
+
+
+def test_recorded_answers_are_reused_without_asking_again(monkeypatch, tmp_path):
+    monkeypatch.setattr(extract, "decode_isbn_barcode", lambda p: "9789896689704")
+    calls = []
+    monkeypatch.setattr(extract, "vinted_lookup_by_isbn", _found(calls, "vinted", None))
+    monkeypatch.setattr(extract, "almedina_lookup_by_isbn", _found(calls, "almedina", {"title": "T", "author": "A"}))
+    monkeypatch.setattr(extract, "isbnsearch_lookup_by_isbn", _boom)
+
+    first = extract.extract_book_fields(tmp_path)
+    second = extract.extract_book_fields(tmp_path)
+
+    assert first == second == {"title": "T", "author": "A", "isbn": "9789896689704"}
+    assert calls == ["vinted", "almedina"]  # the Vinted miss was remembered too
+
+
+def test_refresh_asks_every_source_again(monkeypatch, tmp_path):
+    monkeypatch.setattr(extract, "decode_isbn_barcode", lambda p: "9789896689704")
+    calls = []
+    monkeypatch.setattr(extract, "vinted_lookup_by_isbn", _found(calls, "vinted", {"title": "T", "author": "A"}))
+
+    extract.extract_book_fields(tmp_path)
+    extract.extract_book_fields(tmp_path, refresh=True)
+
+    assert calls == ["vinted", "vinted"]
+
+
+def test_lookup_errors_are_not_recorded(monkeypatch, tmp_path):
+    monkeypatch.setattr(extract, "decode_isbn_barcode", lambda p: "9789896689704")
+
+    def blocked(isbn):
+        raise VintedLookupError("blocked")
+
+    monkeypatch.setattr(extract, "vinted_lookup_by_isbn", blocked)
+    monkeypatch.setattr(extract, "almedina_lookup_by_isbn", lambda isbn: None)
+    monkeypatch.setattr(extract, "isbnsearch_lookup_by_isbn", lambda isbn: None)
+
+    extract.extract_book_fields(tmp_path)
+
+    assert isbn_metadata.get("9789896689704", "vinted") is None
+    assert isbn_metadata.get("9789896689704", "almedina") == {"title": None, "author": None}
+
+
+def test_not_found_is_trusted_for_less_time_than_found(monkeypatch, temp_db):
+    monkeypatch.setattr(extract.settings, "ISBN_CACHE_DAYS", 90)
+    monkeypatch.setattr(extract.settings, "ISBN_CACHE_MISS_DAYS", 7)
+    isbn_metadata.put("1", "vinted", {"title": "T", "author": "A"})
+    isbn_metadata.put("1", "almedina", None)
+    later = datetime.now(timezone.utc) + timedelta(days=30)
+    monkeypatch.setattr(isbn_metadata, "datetime", type("_Later", (datetime,), {"now": staticmethod(lambda tz: later)}))
+
+    assert isbn_metadata.get("1", "vinted") == {"title": "T", "author": "A"}
+    assert isbn_metadata.get("1", "almedina") is None
+
+
+def test_recording_an_answer_twice_keeps_one_row_with_the_latest(temp_db):
+    isbn_metadata.put("1", "vinted", None)
+    isbn_metadata.put("1", "vinted", {"title": "T", "author": "A"})
+
+    with temp_db() as s:
+        assert s.execute(select(func.count()).select_from(IsbnMetadata)).scalar_one() == 1
+    assert isbn_metadata.get("1", "vinted") == {"title": "T", "author": "A"}
+
+
+def test_an_answer_that_cannot_be_recorded_still_resolves_the_book(monkeypatch, tmp_path, temp_db):
+    monkeypatch.setattr(extract, "decode_isbn_barcode", lambda p: "9789896689704")
+    monkeypatch.setattr(extract, "vinted_lookup_by_isbn", lambda isbn: {"title": "T", "author": "A"})
+
+    def locked(self, *args, **kwargs):
+        raise OperationalError("INSERT INTO isbn_metadata", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(Session, "execute", locked)
+
+    assert extract.extract_book_fields(tmp_path) == {"title": "T", "author": "A", "isbn": "9789896689704"}
@@ -1,3 +1,5 @@
+from pathlib import Path
+
 from sqlalchemy import select
 
 from blt import extract
@@ -20,7 +22,7 @@ def test_resolved_book_gets_filled_in_and_stays_pending(monkeypatch, temp_db):
 
     monkeypatch.setattr(
         extract, "extract_book_fields",
-        lambda folder: {"title": "Sempre Tu", "author": "Colleen Hoover", "isbn": "9789896689704"},
+        lambda folder, refresh=False: {"title": "Sempre Tu", "author": "Colleen Hoover", "isbn": "9789896689704"},
     )
 
     result = extract.extract_pending_books()
@@ -44,7 +46,7 @@ def test_unresolved_book_marked_failed_keeps_isbn(monkeypatch, temp_db):
 
     monkeypatch.setattr(
         extract, "extract_book_fields",
-        lambda folder: {"title": None, "author": None, "isbn": "9789896689704"},
+        lambda folder, refresh=False: {"title": None, "author": None, "isbn": "9789896689704"},
     )
 
     result = extract.extract_pending_books()
@@ -66,7 +68,7 @@ def test_rerun_does_not_reprocess_resolved_or_failed_rows(monkeypatch, temp_db):
 
     calls = []
 
-    def fake_extract(folder):
+    def fake_extract(folder, refresh=False):
         calls.append(str(folder))
         if "resolved" in str(folder):
             return {"title": "T", "author": "A", "isbn": "9789896689704"}
@@ -91,7 +93,7 @@ def test_limit_caps_how_many_books_are_processed(monkeypatch, temp_db):
 
     monkeypatch.setattr(
         extract, "extract_book_fields",
-        lambda folder: {"title": "T", "author": "A", "isbn": "9789896689704"},
+        lambda folder, refresh=False: {"title": "T", "author": "A", "isbn": "9789896689704"},
     )
 
     result = extract.extract_pending_books(limit=2)
@@ -143,7 +145,7 @@ def test_dev_mode_still_looks_up_a_genuinely_new_isbn(monkeypatch, temp_db):
         assert book.title == "Brand New Book"
 
 
-def test_delay_happens_between_books_not_before_first_or_after_last(monkeypatch, temp_db):
+def test_books_resolved_without_requests_never_wait(monkeypatch, temp_db):
     sleeps = []
     monkeypatch.setattr(extract.time, "sleep", lambda seconds: sleeps.append(seconds))
     with temp_db() as s:
@@ -153,9 +155,74 @@ def test_delay_happens_between_books_not_before_first_or_after_last(monkeypatch,
 
     monkeypatch.setattr(
         extract, "extract_book_fields",
-        lambda folder: {"title": "T", "author": "A", "isbn": "9789896689704"},
+        lambda folder, refresh=False: {"title": "T", "author": "A", "isbn": "9789896689704"},
+    )
+
+    extract.extract_pending_books()
+
+    assert sleeps == []  # pacing is per real request (rate_limit), not per book
+
+
+def test_every_barcode_is_read_up_front_before_the_first_lookup(monkeypatch, temp_db):
+    _no_delay(monkeypatch)
+    with temp_db() as s:
+        s.add(Book(folder_path="book_a", status="pending"))
+        s.add(Book(folder_path="book_b", status="pending"))
+        s.commit()
+    events = []
+
+    def fake_decode_all(photos, workers=None, on_progress=None):
+        events.append(("decode", sorted(str(p) for p in photos)))
+        return {}
+
+    monkeypatch.setattr(extract, "decode_isbn_barcodes", fake_decode_all)
+    monkeypatch.setattr(
+        extract, "extract_book_fields",
+        lambda folder, refresh=False: (
+            events.append(("lookup", str(folder))) or {"title": None, "author": None, "isbn": None}
+        ),
     )
 
     extract.extract_pending_books()
 
-    assert len(sleeps) == 1  # one gap between the two books, none before/after
+    assert events[0] == ("decode", [str(Path("book_a") / "isbn.jpg"), str(Path("book_b") / "isbn.jpg")])
+    assert [kind for kind, _ in events[1:]] == ["lookup", "lookup"]
+
+
+def test_barcode_workers_setting_is_passed_to_the_batch_decode(monkeypatch, temp_db):
+    monkeypatch.setattr(extract.settings, "BARCODE_WORKERS", 3)
+    captured = {}
+    monkeypatch.setattr(
+        extract, "decode_isbn_barcodes", lambda photos, workers=None, on_progress=None: captured.update(workers=workers)
+    )
+
+    extract.prefetch_barcodes([Path("book_a")])
+
+    assert captured == {"workers": 3}
+
+
+def test_copies_of_one_isbn_are_looked_up_once_and_all_filled_in(monkeypatch, temp_db):
+    with temp_db() as s:
+        for name in ("book_a", "book_b", "book_c"):
+            s.add(Book(folder_path=name, status="pending"))
+        s.commit()
+    isbns = {"book_a": "9789896689704", "book_b": "9789897100833", "book_c": "9789896689704"}
+    monkeypatch.setattr(
+        extract, "decode_isbn_barcodes",
+        lambda photos, workers=None, on_progress=None: {p: isbns[p.parent.name] for p in photos},
+    )
+    lookups = []
+
+    def fake_extract(folder, refresh=False):
+        lookups.append(folder.name)
+        return {"title": f"T {isbns[folder.name]}", "author": "A", "isbn": isbns[folder.name]}
+
+    monkeypatch.setattr(extract, "extract_book_fields", fake_extract)
+
+    result = extract.extract_pending_books()
+
+    assert result == {"resolved": 3, "failed": 0}
+    assert lookups == ["book_a", "book_b"]
+    with temp_db() as s:
+        titles = {b.folder_path: b.title for b in s.execute(select(Book)).scalars()}
+    assert titles["book_c"] == titles["book_a"] != titles["book_b"]
@@ -1,11 +1,18 @@
 import os
+import subprocess
+import sys
+import threading
 import time
+from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 
+import barcode as barcode_lib
 import pytest
+from barcode.writer import ImageWriter
 from PIL import Image
 
-from blt import config
+from blt import barcode_cache, config
 from blt import group_photos as gp
 
 
@@ -170,6 +177,120 @@ def test_numbering_continues_from_existing_book_folders(raw_and_grouped):
     assert [c.name for c in created] == ["book_006"]
 
 
+def test_group_all_reserves_its_indices_without_listing_per_pair(raw_and_grouped, monkeypatch):
+    raw, grouped = raw_and_grouped
+    base = time.time()
+    for i in range(6):
+        _make_photo(raw, f"{i}.jpg", base + i, (40 * i, 0, 0))
+    listings = []
+    real_next = gp._next_book_index
+    monkeypatch.setattr(gp, "_next_book_index", lambda base: listings.append(base) or real_next(base))
+
+    created = gp.group_all()
+
+    assert [c.name for c in created] == ["book_001", "book_002", "book_003"]
+    assert len(listings) == 1  # seeding the counter, once - not once per pair
+    _make_photo(raw, "x.jpg", base + 10, (9, 0, 0))
+    _make_photo(raw, "y.jpg", base + 11, (9, 9, 0))
+    assert gp.commit_pair(raw / "x.jpg", raw / "y.jpg").name == "book_004"
+    assert len(listings) == 1
+
+
+def test_group_all_with_max_groups_zero_groups_nothing(raw_and_grouped):
+    raw, grouped = raw_and_grouped
+    base = time.time()
+    _make_photo(raw, "a.jpg", base, (10, 0, 0))
+    _make_photo(raw, "b.jpg", base + 1, (90, 0, 0))
+
+    assert gp.group_all(max_groups=0) == []
+    assert sorted(p.name for p in raw.iterdir()) == ["a.jpg", "b.jpg"]
+    assert not any(grouped.glob("book_*"))
+
+
+def test_book_index_reservations_never_overlap(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ranges = list(pool.map(lambda n: gp._reserve_book_indices(tmp_path, n), [1, 5, 2, 7] * 4))
+
+    indices = sorted(i for r in ranges for i in r)
+    assert indices == list(range(1, len(indices) + 1))
+
+
+def test_book_index_reseeds_past_folders_it_did_not_number(tmp_path):
+    assert list(gp._reserve_book_indices(tmp_path, 2)) == [1, 2]
+    (tmp_path / "book_003").mkdir()  # e.g. copied in by hand
+    (tmp_path / "book_007").mkdir()
+
+    assert list(gp._reserve_book_indices(tmp_path, 1)) == [8]
+
+
+def _hold_book_index_lock(base, then):
+    """Another process that takes the book index lock, says so, then runs
+    `then` (Python source) while still holding it."""
+    code = (
+        "import os, sys\n"
+        "from pathlib import Path\n"
+        "from blt import group_photos\n"
+        f"with group_photos._book_index_lock(Path({str(base)!r})):\n"
+        "    print('held', flush=True)\n"
+        f"    {then}\n"
+    )
+    proc = subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    assert proc.stdout.readline() == b"held\n"
+    return proc
+
+
+def test_book_index_lock_is_exclusive_across_processes(tmp_path):
+    proc = _hold_book_index_lock(tmp_path, "sys.stdin.read()")
+    reserved = []
+    t = threading.Thread(target=lambda: reserved.append(gp._reserve_book_indices(tmp_path, 1)))
+    t.start()
+    t.join(0.3)
+    assert reserved == []  # waiting on the other process
+
+    proc.stdin.close()
+    proc.wait(5)
+    t.join(5)
+    assert [list(r) for r in reserved] == [[1]]
+
+
+def test_book_index_lock_of_a_crashed_process_is_released(tmp_path):
+    proc = _hold_book_index_lock(tmp_path, "os._exit(1)")
+    proc.wait(5)
+
+    assert (tmp_path / gp._BOOK_INDEX_LOCK).exists()  # left behind, but not held
+    assert list(gp._reserve_book_indices(tmp_path, 1)) == [1]
+
+
+def test_reset_book_index_restarts_numbering_after_the_folders_left(tmp_path):
+    for n in (1, 2):
+        (tmp_path / f"book_00{n}").mkdir()
+    assert list(gp._reserve_book_indices(tmp_path, 1)) == [3]
+    (tmp_path / "book_002").rmdir()
+
+    gp.reset_book_index(tmp_path)
+
+    assert list(gp._reserve_book_indices(tmp_path, 1)) == [2]
+
+
+def test_threaded_group_all_numbers_and_pairs_like_one_at_a_time(raw_and_grouped, capsys):
+    raw, grouped = raw_and_grouped
+    base = time.time()
+    for i in range(12):
+        p = raw / f"{i:02}.heic"
+        Image.new("RGB", (16, 16), color=(i * 20, 0, 0)).save(p, format="HEIF")
+        os.utime(p, (base + i, base + i))
+
+    created = gp.group_all(workers=4)
+
+    assert [c.name for c in created] == [f"book_{n:03d}" for n in range(1, 7)]
+    for n, dest in enumerate(created):
+        for name, i in (("cover.jpg", 2 * n), ("isbn.jpg", 2 * n + 1)):
+            _assert_color(Image.open(dest / name).convert("RGB").getpixel((0, 0)), (i * 20, 0, 0))
+    assert "fotos/s" in capsys.readouterr().out
+
+
 def test_dev_mode_copies_instead_of_moving_raw_photos(raw_and_grouped, monkeypatch):
     raw, grouped = raw_and_grouped
     monkeypatch.setattr(config.settings, "DEV_MODE", True)
@@ -184,14 +305,182 @@ def test_dev_mode_copies_instead_of_moving_raw_photos(raw_and_grouped, monkeypat
     assert {p.name for p in created[0].iterdir()} == {"cover.jpg", "isbn.jpg"}  # also copied out
 
 
+def test_a_duplicate_never_shifts_the_pairs_after_it(raw_and_grouped):
+    raw, grouped = raw_and_grouped
+    base = time.time()
+    a = _make_photo(raw, "a.jpg", base, (200, 0, 0))
+    (raw / "a_copy.jpg").write_bytes(a.read_bytes())
+    os.utime(raw / "a_copy.jpg", (base + 1, base + 1))
+    _make_photo(raw, "b.jpg", base + 2, (0, 200, 0))
+
+    pairs, leftover = gp.propose_pairs(raw)
+
+    assert [(c.name, i.name) for c, i in pairs] == [("a.jpg", "b.jpg")]
+    assert leftover == []
+    assert gp.raw_duplicates(raw) == {raw / "a_copy.jpg": a}
+
+
+def test_group_all_quarantines_duplicates(raw_and_grouped, tmp_path, monkeypatch):
+    raw, grouped = raw_and_grouped
+    monkeypatch.setattr(config.settings, "DUPLICATES_DIR", str(tmp_path / "dups"))
+    base = time.time()
+    a = _make_photo(raw, "a.jpg", base, (200, 0, 0))
+    (raw / "a_copy.jpg").write_bytes(a.read_bytes())
+    os.utime(raw / "a_copy.jpg", (base + 1, base + 1))
+    _make_photo(raw, "b.jpg", base + 2, (0, 200, 0))
+
+    created = gp.group_all()
+
+    assert [c.name for c in created] == ["book_001"]
+    assert [p.name for p in (tmp_path / "dups").iterdir()] == ["a_copy.jpg"]
+    assert list(raw.iterdir()) == []
+
+
 def test_max_groups_limits_how_many_are_created(raw_and_grouped):
     raw, grouped = raw_and_grouped
     base = time.time()
     for i in range(8):  # 4 full pairs
-        _make_photo(raw, f"{i}.jpg", base + i, (i, 0, 0))
+        _make_photo(raw, f"{i}.jpg", base + i, (30 * i, 0, 0))
 
     created = gp.group_all(max_groups=2)
 
     assert [c.name for c in created] == ["book_001", "book_002"]
     # the other 4 photos (2 more pairs) are left ungrouped in raw
     assert len(list(raw.iterdir())) == 4
+
+
+def _make_barcode_photo(folder: Path, name: str, taken_at: float, isbn12: str) -> Path:
+    """A real EAN-13 barcode photo (check digit auto-computed), mtime set to `taken_at`."""
+    ean = barcode_lib.get("ean13", isbn12, writer=ImageWriter())
+    buf = BytesIO()
+    ean.write(buf, options={"write_text": False})
+    buf.seek(0)
+    p = folder / name
+    Image.open(buf).convert("RGB").save(p)
+    os.utime(p, (taken_at, taken_at))
+    return p
+
+
+@pytest.mark.parametrize("isbn_name", ["isbn.png", "isbn.jpg"])
+def test_fused_grouping_reads_the_barcode_while_placing_the_photo(raw_and_grouped, monkeypatch, isbn_name):
+    raw, grouped = raw_and_grouped
+    monkeypatch.setattr(config.settings, "FUSED_GROUPING", True)
+    base = time.time()
+    cover = _make_photo(raw, "cover.jpg", base, (1, 0, 0))
+    isbn = _make_barcode_photo(raw, isbn_name, base + 1, "978989710083")
+
+    dest = gp.commit_pair(cover, isbn)
+
+    placed = dest / "isbn.jpg"
+    assert Image.open(placed).format == "JPEG"
+    # cached under the placed file's own bytes, exactly where extraction will look
+    assert barcode_cache.get(barcode_cache.file_key(placed))[0] == "9789897100833"
+    assert not isbn.exists()
+
+
+def test_grouping_without_fused_mode_reads_no_barcode(raw_and_grouped):
+    raw, grouped = raw_and_grouped
+    base = time.time()
+    cover = _make_photo(raw, "cover.jpg", base, (1, 0, 0))
+    isbn = _make_barcode_photo(raw, "isbn.png", base + 1, "978989710083")
+
+    dest = gp.commit_pair(cover, isbn)
+
+    assert barcode_cache.get(barcode_cache.file_key(dest / "isbn.jpg")) is None
+
+
+def _count_capture_time_calls(monkeypatch) -> list:
+    opened = []
+    real = gp._capture_time
+    monkeypatch.setattr(gp, "_capture_time", lambda p: opened.append(p.name) or real(p))
+    return opened
+
+
+def test_raw_index_only_opens_photos_it_has_not_seen(raw_and_grouped, monkeypatch):
+    raw, _ = raw_and_grouped
+    base = time.time() - 100
+    _make_photo(raw, "a.jpg", base, (1, 0, 0))
+    _make_photo(raw, "b.jpg", base + 1, (2, 0, 0))
+    opened = _count_capture_time_calls(monkeypatch)
+
+    assert [p.name for p in gp.raw_photos()] == ["a.jpg", "b.jpg"]
+    assert sorted(opened) == ["a.jpg", "b.jpg"]
+
+    _make_photo(raw, "c.jpg", base + 2, (3, 0, 0))
+    opened.clear()
+    assert [p.name for p in gp.raw_photos()] == ["a.jpg", "b.jpg", "c.jpg"]
+    assert opened == ["c.jpg"]
+
+
+def test_raw_listing_reports_only_photos_it_sees_for_the_first_time(raw_and_grouped):
+    raw, _ = raw_and_grouped
+    Image.new("RGB", (16, 16)).save(raw / "a.jpg")
+    seen = []
+    gp.raw_photos(on_new=seen.append)
+    gp._raw_listings.clear()  # listed afresh, as after the folder changes
+    Image.new("RGB", (16, 16)).save(raw / "b.jpg")
+
+    gp.raw_photos(on_new=seen.append)
+
+    assert seen == [[raw / "a.jpg"], [raw / "b.jpg"]]
+
+
+def test_raw_index_survives_a_restart(raw_and_grouped, monkeypatch):
+    raw, _ = raw_and_grouped
+    _make_photo(raw, "a.jpg", time.time() - 100, (1, 0, 0))
+    gp.raw_photos()
+    monkeypatch.setattr(gp, "_raw_listings", {})  # fresh process: only the on-disk index is left
+    opened = _count_capture_time_calls(monkeypatch)
+
+    assert [p.name for p in gp.raw_photos()] == ["a.jpg"]
+    assert opened == []
+
+
+def test_raw_index_rereads_a_photo_replaced_under_the_same_name(raw_and_grouped, monkeypatch):
+    raw, _ = raw_and_grouped
+    base = time.time() - 100
+    _make_photo(raw, "a.jpg", base, (1, 0, 0))
+    _make_photo(raw, "b.jpg", base + 1, (2, 0, 0))
+    gp.raw_photos()
+
+    _make_photo(raw, "a.jpg", base + 2, (1, 0, 0))  # same name, now taken after b
+
+    assert [p.name for p in gp.raw_photos()] == ["b.jpg", "a.jpg"]
+
+
+def test_unchanged_settled_raw_dir_is_not_even_listed_again(raw_and_grouped, monkeypatch):
+    raw, _ = raw_and_grouped
+    _make_photo(raw, "a.jpg", time.time() - 100, (1, 0, 0))
+    settled = time.time() - 60
+    os.utime(raw, (settled, settled))
+    gp.raw_photos()
+
+    def no_listing(path):
+        raise AssertionError("RAW_DIR listed again")
+
+    monkeypatch.setattr(gp.os, "scandir", no_listing)
+    assert [p.name for p in gp.raw_photos()] == ["a.jpg"]
+
+
+def test_capture_time_reads_heic_exif_without_opening_the_image(tmp_path, monkeypatch):
+    p = tmp_path / "photo.heic"
+    img = Image.new("RGB", (64, 64))
+    exif = img.getexif()
+    exif[306] = "2020:01:01 10:00:00"
+    img.save(p, exif=exif.tobytes())
+
+    def no_open(path):
+        raise AssertionError("image opened just for its capture time")
+
+    monkeypatch.setattr(gp, "load_image_any", no_open)
+    assert gp._capture_time(p) == datetime(2020, 1, 1, 10, 0, 0).timestamp()
+
+
+def test_capture_time_falls_back_to_a_full_open_for_other_formats(tmp_path):
+    p = tmp_path / "photo.png"
+    img = Image.new("RGB", (4, 4))
+    exif = img.getexif()
+    exif[306] = "2020:01:01 10:00:00"
+    img.save(p, exif=exif.tobytes())
+
+    assert gp._capture_time(p) == datetime(2020, 1, 1, 10, 0, 0).timestamp()
@@ -0,0 +1,172 @@
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from blt import heic_convert
+
+
+def _boom_if_called(*args, **kwargs):
+    raise AssertionError("this should not have been called")
+
+
+def _heic(path, color=(200, 0, 0)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (64, 48), color=color).save(path, format="HEIF")
+    return path
+
+
+def test_convert_folder_converts_and_reports_each_file(tmp_path):
+    _heic(tmp_path / "a.heic")
+    _heic(tmp_path / "sub" / "b.HEIC", color=(0, 0, 200))
+    report = []
+
+    created = heic_convert.convert_folder(tmp_path, delete_src=False, workers=1, report=report)
+
+    assert created == [tmp_path / "a.jpg", tmp_path / "sub" / "b.jpg"]
+    assert [r.how for r in report] == ["pillow", "pillow"]
+    assert all(r.seconds > 0 for r in report)
+    with Image.open(tmp_path / "a.jpg") as img:
+        assert (img.format, img.size) == ("JPEG", (64, 48))
+
+
+def test_second_run_skips_everything_without_converting(tmp_path, monkeypatch):
+    _heic(tmp_path / "a.heic")
+    heic_convert.convert_folder(tmp_path, delete_src=False, workers=1)
+    monkeypatch.setattr(heic_convert, "_convert", _boom_if_called)
+    monkeypatch.setattr(heic_convert, "_file_key", _boom_if_called)
+    report = []
+
+    created = heic_convert.convert_folder(tmp_path, delete_src=False, workers=1, report=report)
+
+    assert created == [tmp_path / "a.jpg"]
+    assert [r.how for r in report] == ["cached"]
+
+
+def test_recopied_source_is_recognized_by_content(tmp_path, monkeypatch):
+    src = _heic(tmp_path / "a.heic")
+    heic_convert.convert_folder(tmp_path, delete_src=False, workers=1)
+    os.utime(src, ns=(1, 1))  # copied over again: new mtime, same bytes
+    copy = tmp_path / "again" / "a.heic"
+    copy.parent.mkdir()
+    copy.write_bytes(src.read_bytes())
+    monkeypatch.setattr(heic_convert, "_convert", _boom_if_called)
+    report = []
+
+    heic_convert.convert_folder(tmp_path, delete_src=False, workers=1, report=report)
+
+    assert sorted(r.how for r in report) == ["cached", "copied"]
+    assert (tmp_path / "again" / "a.jpg").read_bytes() == (tmp_path / "a.jpg").read_bytes()
+
+
+class _FakeFfmpeg:
+    """Stands in for subprocess.run of ffmpeg: writes a JPEG for every
+    output it's asked for, unless one of the inputs is named bad* - or,
+    for a truncated* input, writes the outputs but a cut-off one for it
+    and exits with an error, as a run failing partway through does."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, cmd, **kwargs):
+        self.calls.append(cmd)
+        inputs = [Path(cmd[i + 1]) for i, arg in enumerate(cmd) if arg == "-i"]
+        if any(p.name.startswith("bad") for p in inputs):
+            return subprocess.CompletedProcess(cmd, 1, b"", b"bad.heic: Invalid data found when processing input\n")
+        if any(p.name.startswith("truncated") for p in inputs):
+            for out in (Path(arg) for arg in cmd[1:] if arg.endswith(".jpg")):
+                Image.new("RGB", (8, 8)).save(out)
+                if out.name.startswith("truncated"):
+                    out.write_bytes(out.read_bytes()[:40])
+            return subprocess.CompletedProcess(cmd, 1, b"", b"truncated.heic: Error while decoding stream\n")
+        for out in (Path(arg) for arg in cmd[1:] if arg.endswith(".jpg")):
+            Image.new("RGB", (8, 8)).save(out)
+        return subprocess.CompletedProcess(cmd, 0, b"", b"")
+
+
+def _pillow_fails(monkeypatch):
+    monkeypatch.setattr(heic_convert, "_heic_to_jpeg_pillow", lambda *a, **k: False)
+    monkeypatch.setattr(heic_convert, "_get_ffmpeg_exe", lambda: "ffmpeg")
+    fake = _FakeFfmpeg()
+    monkeypatch.setattr(heic_convert.subprocess, "run", fake)
+    return fake
+
+
+def test_pillow_failures_go_through_ffmpeg_in_batches(tmp_path, monkeypatch):
+    fake = _pillow_fails(monkeypatch)
+    for n in range(20):
+        _heic(tmp_path / f"{n:02}.heic", color=(n, 0, 0))
+    report = []
+
+    created = heic_convert.convert_folder(tmp_path, workers=1, report=report)
+
+    assert len(created) == 20
+    assert {r.how for r in report} == {"ffmpeg"}
+    assert len(fake.calls) == 2  # 16 + 4, not 20 separate processes
+    assert not list(tmp_path.glob("*.heic"))
+
+
+def test_a_bad_file_only_fails_itself_with_its_own_error(tmp_path, monkeypatch):
+    fake = _pillow_fails(monkeypatch)
+    _heic(tmp_path / "a.heic")
+    (tmp_path / "bad.heic").write_bytes(b"not an image")
+    report = []
+
+    created = heic_convert.convert_folder(tmp_path, workers=1, report=report)
+
+    assert created == [tmp_path / "a.jpg"]
+    by_src = {r.src.name: r for r in report}
+    assert by_src["a.heic"].how == "ffmpeg"
+    assert (by_src["bad.heic"].how, by_src["bad.heic"].dst) == ("failed", None)
+    assert "Invalid data" in by_src["bad.heic"].error
+    assert (tmp_path / "bad.heic").exists()
+    assert len(fake.calls) == 3  # the shared batch, then each file retried alone
+
+
+def test_outputs_of_a_failed_batch_are_not_taken_on_trust(tmp_path, monkeypatch):
+    fake = _pillow_fails(monkeypatch)
+    _heic(tmp_path / "a.heic")
+    (tmp_path / "truncated.heic").write_bytes(b"cut off")
+    report = []
+
+    created = heic_convert.convert_folder(tmp_path, workers=1, report=report)
+
+    assert created == [tmp_path / "a.jpg"]
+    by_src = {r.src.name: r for r in report}
+    assert (by_src["truncated.heic"].how, by_src["truncated.heic"].dst) == ("failed", None)
+    assert not (tmp_path / "truncated.jpg").exists()
+    assert len(fake.calls) == 3  # the failed batch, then each file retried alone
+
+
+def test_a_real_ffmpeg_batch_that_fails_is_retried_file_by_file(tmp_path, monkeypatch):
+    try:
+        heic_convert._get_ffmpeg_exe()
+    except Exception as e:
+        pytest.skip(f"no ffmpeg: {e}")
+    runs = []
+    run = subprocess.run
+    monkeypatch.setattr(heic_convert.subprocess, "run", lambda cmd, **kw: runs.append(cmd) or run(cmd, **kw))
+    good, bad = tmp_path / "good.png", tmp_path / "bad.heic"
+    Image.new("RGB", (64, 48), (200, 0, 0)).save(good)  # the bundled ffmpeg may not read HEIC at all
+    bad.write_bytes(b"not an image")
+
+    results = heic_convert._ffmpeg_batch([(good, tmp_path / "good.jpg"), (bad, tmp_path / "bad.jpg")])
+
+    assert results[good] is None
+    with Image.open(tmp_path / "good.jpg") as out:
+        assert out.size == (64, 48)
+    assert "Invalid data" in results[bad]
+    assert not (tmp_path / "bad.jpg").exists()
+    assert len(runs) == 3  # ffmpeg exits 1, so neither output of the batch is taken on trust
+
+
+def test_convert_folder_in_parallel_deletes_sources(tmp_path):
+    for n, color in enumerate([(200, 0, 0), (0, 200, 0), (0, 0, 200)]):
+        _heic(tmp_path / f"{n}.heic", color=color)
+
+    created = heic_convert.convert_folder(tmp_path, workers=2)
+
+    assert created == [tmp_path / f"{n}.jpg" for n in range(3)]
+    assert not list(tmp_path.glob("*.heic"))
@@ -0,0 +1,126 @@
+import pytest
+
+from blt import almedina_lookup, html_extract, isbnsearch_lookup
+
+_ALMEDINA_PAGES = [
+    # product page, as captured from a live exact-ISBN redirect
+    """<html><body><h1 itemprop="name">Sempre Tu</h1>
+    <span class="block-with-text-2">
+      <a href='https://www.almedina.net/autor/colleen-hoover-1564061541'>Colleen Hoover</a>
+    </span></body></html>""",
+    # search-results listing: no itemprop="name"
+    '<html><body><div class="search-results">Sem resultados.</div></body></html>',
+    # entities, nested markup and whitespace inside the title
+    """<h1 itemprop="name">  O <em>Pequeno</em>
+       Pr&iacute;ncipe &amp; Outros </h1><a href="/autor/x">Antoine de Saint&#8209;Exup&eacute;ry</a>""",
+    # author link ahead of the title, plus a script in between
+    """<a href="/autor/a">Autor <b>Um</b></a><script>var s = "<h1 itemprop='name'>no</h1>";</script>
+    <h1 itemprop="name">Título</h1><a href="/autor/b">Autor Dois</a>""",
+    # title on a void element - BeautifulSoup reads it as empty
+    '<meta itemprop="name" content="Sempre Tu"><a href="/autor/x">Colleen Hoover</a>',
+    # no author link at all
+    '<h1 itemprop="name">Sem Autor</h1><a href="/livros/x">Outro</a>',
+    # nested element of the same tag inside the title
+    '<div itemprop="name">Parte <div>Um</div> e Dois</div><a href="/autor/x">A</a>',
+    # the first place a field could start is inside a comment, then a script
+    '<!-- <h1 itemprop="name">Velho</h1> --><h1 ITEMPROP=name>Novo</h1><a href="/autor/x">A</a>',
+    '<script>var a = "/autor/no";</script><h1 itemprop="name">T</h1><a href="/autor/x">A</a>',
+]
+
+_ISBNSEARCH_PAGES = [
+    # product page, as captured from a live isbnsearch.org lookup
+    """<html><body><div class="bookinfo"><h1>A villa</h1>
+      <p><strong>ISBN-13:</strong> <a href="/isbn/9789898032577">9789898032577</a></p>
+      <p><strong>Author:</strong> Nora Roberts</p>
+      <p><strong>Binding:</strong> Paperback</p>
+    </div></body></html>""",
+    '<html><body>nope</body></html>',
+    '<div class="bookinfo"><p>no title here</p></div>',
+    '<div class="bookinfo"><h1>Some Title</h1><p><strong>ISBN-13:</strong> 1</p></div>',
+    # several classes, entities in title and author
+    """<div class="col bookinfo wide"><div class="image"></div><h1>Caf&eacute; &amp; <i>Cia</i></h1>
+      <p><strong>Author:</strong>  Jos&eacute; Saramago </p></div>""",
+    # "Author:" but only whitespace before the end of the p
+    '<div class="bookinfo"><h1>T</h1><p><strong>Author:</strong> </p><p><strong>Author:</strong> B</p></div>',
+    # label not in the first strong of its p
+    '<div class="bookinfo"><h1>T</h1><p><strong>X</strong><strong>Author:</strong> A</p></div>',
+    # "bookinfo" first seen inside a style
+    '<style>.bookinfo { margin: 0 }</style><div class="bookinfo"><h1>Styled</h1></div>',
+    # a bookinfo-like div outside, and the Author: p after the closing div
+    '<div class="bookinfo-x"><h1>No</h1></div><div class="bookinfo"><h1>Yes</h1></div>'
+    '<p><strong>Author:</strong> Z</p>',
+]
+
+
+@pytest.mark.parametrize("html", _ALMEDINA_PAGES)
+def test_almedina_matches_beautifulsoup(html):
+    assert html_extract.almedina_fields(html) == almedina_lookup._parse_with_soup(html)
+
+
+@pytest.mark.parametrize("html", _ISBNSEARCH_PAGES)
+def test_isbnsearch_matches_beautifulsoup(html):
+    assert html_extract.isbnsearch_fields(html) == isbnsearch_lookup._parse_with_soup(html)
+
+
+def test_parsing_stops_once_every_field_is_found(monkeypatch):
+    monkeypatch.setattr(html_extract, "_CHUNK", 64)
+    fed = []
+    feed = html_extract._Extractor.feed
+    monkeypatch.setattr(html_extract._Extractor, "feed", lambda self, data: fed.append(data) or feed(self, data))
+    html = '<h1 itemprop="name">T</h1><a href="/autor/x">A</a>' + "<div>footer</div>" * 1000
+
+    assert html_extract.almedina_fields(html) == {"title": "T", "author": "A"}
+    assert len(fed) < 3
+
+
+def _fed(monkeypatch):
+    fed = []
+    feed = html_extract._Extractor.feed
+    monkeypatch.setattr(html_extract._Extractor, "feed", lambda self, data: fed.append(data) or feed(self, data))
+    return fed
+
+
+def test_page_without_the_fields_is_answered_without_parsing(monkeypatch):
+    fed = _fed(monkeypatch)
+    html = "<div>listing</div>" * 1000
+
+    assert html_extract.almedina_fields(html) is None
+    assert html_extract.isbnsearch_fields(html) is None
+    assert fed == []
+
+
+def test_parsing_starts_at_the_first_tag_that_could_hold_a_field(monkeypatch):
+    fed = _fed(monkeypatch)
+    html = "<p>navigation</p>" * 1000 + '<h1 class="t" itemprop="name">T</h1><a href="/autor/x">A</a>'
+
+    assert html_extract.almedina_fields(html) == {"title": "T", "author": "A"}
+    assert fed[0].startswith('<h1 class="t"')
+
+
+@pytest.mark.parametrize("html", [
+    '<div class="bookinfo"><h1>T</h1><p><strong>Author:</strong><a href="/a">Linked</a></p></div>',
+    '<div class="bookinfo"><h1>T</h1><p><strong>Author:</strong><!-- x --> A</p></div>',
+])
+def test_isbnsearch_markup_it_cannot_stream_raises(html):
+    with pytest.raises(ValueError):
+        html_extract.isbnsearch_fields(html)
+
+
+def test_lookup_falls_back_to_beautifulsoup_on_value_error(monkeypatch):
+    html = '<div class="bookinfo"><h1>T</h1><p><strong>Author:</strong><a href="/a">Linked</a></p></div>'
+
+    class _Response:
+        status_code = 200
+        text = html
+
+        def raise_for_status(self):
+            pass
+
+    class _Session:
+        def get(self, *a, **k):
+            return _Response()
+
+    monkeypatch.setattr(isbnsearch_lookup.rate_limit, "wait", lambda url: 0.0)
+    monkeypatch.setattr(isbnsearch_lookup.http_session, "session", _Session)
+
+    assert isbnsearch_lookup.lookup_by_isbn("1") == isbnsearch_lookup._parse_with_soup(html)
@@ -0,0 +1,87 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from blt import almedina_lookup, extract, http_session, rate_limit
+
+
+@pytest.fixture
+def server():
+    """A local HTTP server answering 503 to the first GET, 200 after that."""
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            hits.append(self.client_address[1])
+            body = b'<h1 itemprop="name">ok</h1><a href="/autor/x">A</a>' if len(hits) > 1 else b"busy"
+            self.send_response(200 if len(hits) > 1 else 503)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/", hits
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_every_thread_shares_one_session(monkeypatch):
+    monkeypatch.setattr(http_session, "_session", None)
+    here = http_session.session()
+    other = []
+    t = threading.Thread(target=lambda: other.append(http_session.session()))
+    t.start()
+    t.join()
+
+    assert other == [here]
+
+
+def test_lookups_for_successive_books_reuse_one_connection(server, monkeypatch, tmp_path, temp_db):
+    url, hits = server
+    hits.append(None)  # skip the 503: every GET here gets the page
+    monkeypatch.setattr(http_session, "_session", None)
+    monkeypatch.setattr(rate_limit, "wait", lambda url: 0.0)
+    monkeypatch.setattr(almedina_lookup, "SEARCH_URL", url)
+    isbns = iter(["9789896689704", "9789898032577"])
+    monkeypatch.setattr(extract, "decode_isbn_barcode", lambda path: next(isbns))
+    monkeypatch.setattr(extract, "vinted_lookup_by_isbn", lambda isbn: None)
+    monkeypatch.setattr(extract, "almedina_lookup_by_isbn", almedina_lookup.lookup_by_isbn)
+
+    extract.extract_book_fields(tmp_path)
+    extract.extract_book_fields(tmp_path)
+
+    assert len(hits) == 3
+    assert hits[1] == hits[2]  # same client port: the second book paid no new handshake
+
+
+def test_5xx_is_retried_over_a_kept_alive_connection(server, monkeypatch):
+    url, hits = server
+    monkeypatch.setattr(rate_limit, "wait", lambda url: 0.0)
+    s = http_session._new_session()
+
+    first = s.get(url, timeout=5)
+    second = s.get(url, timeout=5)
+
+    assert first.status_code == 200 and "ok" in first.text
+    assert second.status_code == 200
+    assert len(hits) == 3  # 503, retried 200, then the second lookup
+    assert len(set(hits)) == 1  # all over one connection
+
+
+def test_every_retry_waits_for_its_own_rate_limit_token(server, monkeypatch):
+    url, hits = server
+    waited = []
+    monkeypatch.setattr(rate_limit, "wait", lambda url: waited.append(url) or 0.0)
+
+    http_session._new_session().get(url, timeout=5)
+
+    assert len(hits) == 2  # 503, then the retry
+    assert waited == [url]  # the retry's token - the first attempt's is the caller's to take
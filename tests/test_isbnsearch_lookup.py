@@ -1,9 +1,20 @@
 import pytest
 import requests
 
+from blt import http_session, rate_limit
 from blt import isbnsearch_lookup as isl
 
 
+class _FakeSession:
+    def __init__(self, get):
+        self.get = get
+
+
+def _serve(monkeypatch, get):
+    """Lookups go through http_session's pooled session - hand them a fake one."""
+    monkeypatch.setattr(http_session, "session", lambda: _FakeSession(get))
+
+
 class _FakeResponse:
     def __init__(self, status_code=200, text=""):
         self.status_code = status_code
@@ -41,14 +52,14 @@ _NO_AUTHOR_HTML = """
 
 
 def test_found_book_extracts_title_and_author(monkeypatch):
-    monkeypatch.setattr(isl.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
 
     def fake_get(url, headers, timeout):
         assert url == isl.BASE_URL + "9789898032577"
         assert "User-Agent" in headers
         return _FakeResponse(200, _PRODUCT_PAGE_HTML)
 
-    monkeypatch.setattr(requests, "get", fake_get)
+    _serve(monkeypatch, fake_get)
 
     result = isl.lookup_by_isbn("9789898032577")
 
@@ -56,30 +67,30 @@ def test_found_book_extracts_title_and_author(monkeypatch):
 
 
 def test_not_found_returns_none_on_404(monkeypatch):
-    monkeypatch.setattr(isl.time, "sleep", lambda seconds: None)
-    monkeypatch.setattr(requests, "get", lambda *a, **k: _FakeResponse(404, "Not Found"))
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    _serve(monkeypatch, lambda *a, **k: _FakeResponse(404, "Not Found"))
 
     assert isl.lookup_by_isbn("0000000000000") is None
 
 
 def test_no_bookinfo_returns_none(monkeypatch):
-    monkeypatch.setattr(isl.time, "sleep", lambda seconds: None)
-    monkeypatch.setattr(requests, "get", lambda *a, **k: _FakeResponse(200, "<html><body>nope</body></html>"))
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    _serve(monkeypatch, lambda *a, **k: _FakeResponse(200, "<html><body>nope</body></html>"))
 
     assert isl.lookup_by_isbn("9789898032577") is None
 
 
 def test_bookinfo_without_title_returns_none(monkeypatch):
-    monkeypatch.setattr(isl.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
     html = '<html><body><div class="bookinfo"><p>no title here</p></div></body></html>'
-    monkeypatch.setattr(requests, "get", lambda *a, **k: _FakeResponse(200, html))
+    _serve(monkeypatch, lambda *a, **k: _FakeResponse(200, html))
 
     assert isl.lookup_by_isbn("9789898032577") is None
 
 
 def test_no_author_field_returns_none_author(monkeypatch):
-    monkeypatch.setattr(isl.time, "sleep", lambda seconds: None)
-    monkeypatch.setattr(requests, "get", lambda *a, **k: _FakeResponse(200, _NO_AUTHOR_HTML))
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    _serve(monkeypatch, lambda *a, **k: _FakeResponse(200, _NO_AUTHOR_HTML))
 
     result = isl.lookup_by_isbn("9789898032577")
 
@@ -87,31 +98,31 @@ def test_no_author_field_returns_none_author(monkeypatch):
 
 
 def test_network_failure_raises_isbnsearch_lookup_error(monkeypatch):
-    monkeypatch.setattr(isl.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
 
     def fake_get(*a, **k):
         raise requests.ConnectionError("nope")
 
-    monkeypatch.setattr(requests, "get", fake_get)
+    _serve(monkeypatch, fake_get)
 
     with pytest.raises(isl.IsbnSearchLookupError):
         isl.lookup_by_isbn("9789898032577")
 
 
 def test_http_error_raises_isbnsearch_lookup_error(monkeypatch):
-    monkeypatch.setattr(isl.time, "sleep", lambda seconds: None)
-    monkeypatch.setattr(requests, "get", lambda *a, **k: _FakeResponse(500, "Server Error"))
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    _serve(monkeypatch, lambda *a, **k: _FakeResponse(500, "Server Error"))
 
     with pytest.raises(isl.IsbnSearchLookupError):
         isl.lookup_by_isbn("9789898032577")
 
 
-def test_sleeps_a_small_random_delay_before_every_request(monkeypatch):
-    sleeps = []
-    monkeypatch.setattr(isl.time, "sleep", lambda seconds: sleeps.append(seconds))
-    monkeypatch.setattr(requests, "get", lambda *a, **k: _FakeResponse(200, _PRODUCT_PAGE_HTML))
+def test_every_request_waits_its_turn_in_the_rate_limiter(monkeypatch):
+    waits = []
+    monkeypatch.setattr(rate_limit, "wait", lambda url: waits.append(url) or 0.0)
+    _serve(monkeypatch, lambda *a, **k: _FakeResponse(200, _PRODUCT_PAGE_HTML))
 
+    isl.lookup_by_isbn("9789898032577")
     isl.lookup_by_isbn("9789898032577")
 
-    assert len(sleeps) == 1
-    assert 0.5 <= sleeps[0] <= 1.5
+    assert waits == [isl.BASE_URL, isl.BASE_URL]
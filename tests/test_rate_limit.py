@@ -0,0 +1,66 @@
+import pytest
+
+from blt import config, rate_limit
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 6))
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limit.time, "sleep", clock.sleep)
+    monkeypatch.setattr(config.settings, "RATE_LIMIT_JITTER_SECONDS", 0.0)
+    return clock
+
+
+def test_burst_goes_out_at_once_then_settles_at_the_rate(clock):
+    bucket = rate_limit.TokenBucket(rate=0.5, burst=2)
+
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 2.0, 4.0]
+
+
+def test_quiet_time_refills_but_never_past_the_burst(clock):
+    bucket = rate_limit.TokenBucket(rate=1.0, burst=2)
+    bucket.reserve()
+    bucket.reserve()
+
+    clock.now += 60
+
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 1.0]
+
+
+def test_hosts_are_paced_independently(clock, monkeypatch):
+    monkeypatch.setattr(config.settings, "RATE_LIMIT_BURST", 1)
+    monkeypatch.setattr(config.settings, "ALMEDINA_REQUESTS_PER_MINUTE", 6)
+    monkeypatch.setattr(config.settings, "ISBNSEARCH_REQUESTS_PER_MINUTE", 6)
+
+    rate_limit.wait("https://www.almedina.net/catalogsearch/result/")
+    rate_limit.wait("https://isbnsearch.org/isbn/1")
+    rate_limit.wait("https://www.almedina.net/catalogsearch/result/")
+
+    assert clock.sleeps == [10.0]  # only the second Almedina request waited
+
+
+def test_jitter_is_added_to_every_wait(clock, monkeypatch):
+    monkeypatch.setattr(config.settings, "RATE_LIMIT_JITTER_SECONDS", 1.0)
+
+    waited = rate_limit.wait("https://isbnsearch.org/isbn/1")
+
+    assert 0.0 <= waited <= 1.0
+
+
+def test_unknown_host_is_refused(clock):
+    with pytest.raises(ValueError):
+        rate_limit.wait("https://example.com/")
@@ -0,0 +1,159 @@
+import os
+import threading
+
+import pytest
+from PIL import Image
+
+from blt import renditions
+
+
+def _make_photo(path, size=(3000, 2000), color=(200, 0, 0), **save_args):
+    Image.new("RGB", size, color=color).save(path, **save_args)
+    return path
+
+
+def test_rendition_fits_the_requested_size(tmp_path):
+    src = _make_photo(tmp_path / "a.jpg")
+
+    out = renditions.rendition(src, 256)
+
+    with Image.open(out) as img:
+        assert img.format == "JPEG"
+        assert img.size == (256, 171)
+
+
+def test_rendition_is_rendered_once_then_served_from_disk(tmp_path, monkeypatch):
+    src = _make_photo(tmp_path / "a.jpg")
+    first = renditions.rendition(src, 512)
+
+    def no_render(path):
+        raise AssertionError("rendered again")
+
+    monkeypatch.setattr(renditions, "load_image_any", no_render)
+    assert renditions.rendition(src, 512) == first
+
+
+def test_rendition_follows_content_not_path(tmp_path):
+    a = _make_photo(tmp_path / "a.jpg")
+    moved = tmp_path / "book_001" / "cover.jpg"
+    moved.parent.mkdir()
+    moved.write_bytes(a.read_bytes())
+    first = renditions.rendition(a, 256)
+
+    assert renditions.rendition(moved, 256) == first  # same bytes elsewhere: same rendition
+    _make_photo(a, color=(0, 0, 200))  # rewritten in place (e.g. rotated)
+    assert renditions.rendition(a, 256) != first
+
+
+def test_rendition_applies_exif_orientation(tmp_path):
+    img = Image.new("RGB", (300, 200))
+    exif = img.getexif()
+    exif[0x0112] = 6  # Orientation: rotate 90 CW to display
+    src = tmp_path / "a.jpg"
+    img.save(src, exif=exif.tobytes())
+
+    with Image.open(renditions.rendition(src, 256)) as out:
+        assert out.size == (171, 256)  # portrait, as it's meant to be displayed
+
+
+def test_rendition_of_a_heic_is_a_jpeg(tmp_path):
+    src = _make_photo(tmp_path / "a.heic", format="HEIF")
+
+    with Image.open(renditions.rendition(src, 256)) as out:
+        assert out.format == "JPEG"
+
+
+def test_unsupported_size_is_rejected(tmp_path):
+    src = _make_photo(tmp_path / "a.jpg")
+
+    with pytest.raises(ValueError):
+        renditions.rendition(src, 333)
+
+
+def test_full_size_conversion_is_cached_once(tmp_path, monkeypatch):
+    src = _make_photo(tmp_path / "a.heic", size=(300, 200), format="HEIF")
+    first = renditions.rendition(src, None)
+
+    with Image.open(first) as out:
+        assert (out.format, out.size) == ("JPEG", (300, 200))
+    monkeypatch.setattr(renditions, "load_image_any", lambda path: pytest.fail("converted again"))
+    assert renditions.rendition(src, None) == first
+
+
+def test_least_recently_used_renditions_are_evicted(tmp_path):
+    a, b, c = (
+        renditions.rendition(_make_photo(tmp_path / f"{n}.jpg", color=color), 256)
+        for n, color in (("a", (200, 0, 0)), ("b", (0, 200, 0)), ("c", (0, 0, 200)))
+    )
+    for i, out in enumerate((a, b, c)):
+        os.utime(out, ns=(i, i))
+    renditions.rendition(tmp_path / "a.jpg", 256)  # a hit: a is now the most recently used
+    total = sum(p.stat().st_size for p in (a, b, c))
+
+    renditions._evict(total - 1)
+
+    assert (a.exists(), b.exists(), c.exists()) == (True, False, True)
+
+
+def test_eviction_never_drops_the_rendition_being_served(tmp_path, monkeypatch):
+    old = renditions.rendition(_make_photo(tmp_path / "a.jpg"), 256)
+    monkeypatch.setattr(renditions.settings, "RENDITION_CACHE_MB", 0)
+
+    new = renditions.rendition(_make_photo(tmp_path / "b.jpg", color=(0, 0, 200)), 256)
+
+    assert new.exists()
+    assert not old.exists()
+
+
+def test_cache_dir_is_only_scanned_once_it_outgrows_its_limit(tmp_path, monkeypatch):
+    renditions.rendition(_make_photo(tmp_path / "a.jpg"), 256)  # first render counts what's there
+    scans = []
+    scandir = renditions.os.scandir
+    monkeypatch.setattr(renditions.os, "scandir", lambda path: scans.append(path) or scandir(path))
+
+    renditions.rendition(_make_photo(tmp_path / "b.jpg", color=(0, 200, 0)), 256)
+    assert scans == []
+
+    monkeypatch.setattr(renditions.settings, "RENDITION_CACHE_MB", 0)
+    renditions.rendition(_make_photo(tmp_path / "c.jpg", color=(0, 0, 200)), 256)
+    assert len(scans) == 1
+    assert renditions._cache_bytes == renditions.rendition(tmp_path / "c.jpg", 256).stat().st_size
+
+
+def test_warm_renders_in_the_background(tmp_path):
+    photos = [
+        _make_photo(tmp_path / f"{n}.heic", size=(600, 400), color=color, format="HEIF")
+        for n, color in (("a", (200, 0, 0)), ("b", (0, 0, 200)))
+    ]
+
+    assert renditions.warm(photos, 256)
+    with renditions._warm_lock:  # wait for it
+        pass
+
+    cached = sorted(p.name for p in renditions._CACHE_DIR.iterdir())
+    assert cached == sorted(f"{renditions._source_key(p)}_256.jpg" for p in photos)
+
+
+def test_a_batch_asked_for_while_warming_joins_the_queue(tmp_path, monkeypatch):
+    first, second = (
+        _make_photo(tmp_path / f"{n}.jpg", color=color) for n, color in (("a", (200, 0, 0)), ("b", (0, 0, 200)))
+    )
+    started, go = threading.Event(), threading.Event()
+    render = renditions._render
+
+    def slow_render(path, size, out):
+        started.set()
+        go.wait(5)
+        render(path, size, out)
+
+    monkeypatch.setattr(renditions, "_render", slow_render)
+
+    assert renditions.warm([first], 256)
+    started.wait(5)
+    assert not renditions.warm([second], 256)  # already running: queued, not dropped
+    go.set()
+    with renditions._warm_lock:
+        pass
+
+    cached = sorted(p.name for p in renditions._CACHE_DIR.iterdir())
+    assert cached == sorted(f"{renditions._source_key(p)}_256.jpg" for p in (first, second))
@@ -1,8 +1,11 @@
 import os
 import time
+from io import BytesIO
+from pathlib import Path
 
+import pytest
 from fastapi.testclient import TestClient
-from PIL import Image
+from PIL import Image, ImageOps
 from sqlalchemy import select
 
 from blt import review_app
@@ -156,7 +159,7 @@ def test_progress_header_counts_a_complete_pair_as_one_full_book(monkeypatch, tm
     monkeypatch.setattr(review_app.settings, "RAW_DIR", str(raw))
     base = time.time()
     _make_photo(raw, "a.jpg", base)
-    _make_photo(raw, "b.jpg", base + 1)  # 1 complete pair -> 1.0 raw book-unit, no leftover
+    _make_photo(raw, "b.jpg", base + 1, color=(0, 200, 0))  # 1 complete pair -> 1.0 raw book-unit, no leftover
 
     _add_book(temp_db, folder_path="x", status="pending", title="Resolved")  # review: 1 unit
 
@@ -232,8 +235,8 @@ def test_raw_page_shows_proposed_pairs_and_leftover(monkeypatch, tmp_path, temp_
     monkeypatch.setattr(review_app.settings, "RAW_DIR", str(raw))
     base = time.time()
     _make_photo(raw, "a.jpg", base)
-    _make_photo(raw, "b.jpg", base + 1)
-    _make_photo(raw, "c.jpg", base + 2)  # leftover, odd count
+    _make_photo(raw, "b.jpg", base + 1, color=(0, 200, 0))
+    _make_photo(raw, "c.jpg", base + 2, color=(0, 0, 200))  # leftover, odd count
 
     r = client.get("/raw")
 
@@ -242,6 +245,42 @@ def test_raw_page_shows_proposed_pairs_and_leftover(monkeypatch, tmp_path, temp_
     assert "1 sem par" in r.text
 
 
+def test_raw_page_shows_duplicates_and_can_clear_one(monkeypatch, tmp_path, temp_db):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    monkeypatch.setattr(review_app.settings, "RAW_DIR", str(raw))
+    base = time.time()
+    a = _make_photo(raw, "a.jpg", base)
+    (raw / "again.jpg").write_bytes(a.read_bytes())
+    _make_photo(raw, "b.jpg", base + 1, color=(0, 200, 0))
+
+    r = client.get("/raw")
+
+    assert "Duplicados" in r.text and "igual a a.jpg" in r.text
+    assert "1 par(es) proposto" in r.text
+
+    r = client.post("/raw/not-duplicate", data={"photo": "again.jpg"}, follow_redirects=False)
+
+    assert r.status_code == 303
+    assert "Duplicados" not in client.get("/raw").text
+
+
+def test_duplicates_are_looked_for_once_on_raw_and_never_for_the_sidebar(monkeypatch, tmp_path, temp_db):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    monkeypatch.setattr(review_app.settings, "RAW_DIR", str(raw))
+    _make_photo(raw, "a.jpg", time.time())
+    calls = []
+    real = review_app.group_photos.find_duplicates
+    monkeypatch.setattr(review_app.group_photos, "find_duplicates", lambda listing: calls.append(1) or real(listing))
+
+    client.get("/stock")
+    assert calls == []
+
+    client.get("/raw")
+    assert calls == [1]
+
+
 def test_raw_photo_serves_file_from_raw_dir(monkeypatch, tmp_path, temp_db):
     raw = tmp_path / "raw"
     raw.mkdir()
@@ -268,6 +307,79 @@ def test_raw_photo_converts_heic_to_jpeg_for_display(monkeypatch, tmp_path, temp
     assert r.content[:2] == b"\xff\xd8"  # JPEG magic bytes, not HEIC's
 
 
+def test_raw_photo_converts_each_heic_only_once(monkeypatch, tmp_path, temp_db):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    monkeypatch.setattr(review_app.settings, "RAW_DIR", str(raw))
+    Image.new("RGB", (8, 8), color=(200, 0, 0)).save(raw / "x.heic", format="HEIF")
+    first = client.get("/raw-photo/x.heic").content
+    monkeypatch.setattr(review_app.renditions, "load_image_any", _boom_if_called)
+
+    r = client.get("/raw-photo/x.heic")
+
+    assert r.status_code == 200
+    assert r.content == first
+
+
+def test_newly_arrived_raw_heics_get_thumbnails_warmed_once(monkeypatch, tmp_path, temp_db):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    monkeypatch.setattr(review_app.settings, "RAW_DIR", str(raw))
+    Image.new("RGB", (800, 600)).save(raw / "x.heic", format="HEIF")
+    Image.new("RGB", (800, 600)).save(raw / "y.jpg")
+    warmed = []
+    monkeypatch.setattr(review_app.renditions, "warm", lambda paths, size: warmed.append((paths, size)))
+
+    client.get("/stock")  # any page: the sidebar lists RAW_DIR
+    assert warmed == [([raw / "x.heic"], 512)]  # JPEGs are cheap enough on request
+
+    review_app.group_photos._raw_listings.clear()  # listed afresh, as after the folder changes
+    client.get("/raw")
+    assert len(warmed) == 1  # nothing new arrived since
+
+
+def test_fetch_discord_route_warms_the_new_photos(monkeypatch, tmp_path, temp_db):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    monkeypatch.setattr(review_app.settings, "RAW_DIR", str(raw))
+
+    def fetch():
+        Image.new("RGB", (800, 600)).save(raw / "x.heic", format="HEIF")
+        return {"downloaded": 1, "delete_failures": 0}
+
+    monkeypatch.setattr(review_app.discord_fetch, "fetch_new_photos", fetch)
+    warmed = []
+    monkeypatch.setattr(review_app.renditions, "warm", lambda paths, size: warmed.append(paths))
+
+    client.post("/raw/fetch-discord")
+
+    assert warmed == [[raw / "x.heic"]]
+
+
+def test_raw_photo_serves_a_downsized_rendition_on_request(monkeypatch, tmp_path, temp_db):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    monkeypatch.setattr(review_app.settings, "RAW_DIR", str(raw))
+    Image.new("RGB", (3000, 2000), color=(200, 0, 0)).save(raw / "x.heic", format="HEIF")
+
+    r = client.get("/raw-photo/x.heic?size=512")
+
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/jpeg"
+    assert Image.open(BytesIO(r.content)).size == (512, 341)
+
+
+def test_photo_rendition_rejects_an_unsupported_size(monkeypatch, tmp_path, temp_db):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    monkeypatch.setattr(review_app.settings, "RAW_DIR", str(raw))
+    Image.new("RGB", (8, 8)).save(raw / "x.jpg")
+
+    r = client.get("/raw-photo/x.jpg?size=4000")
+
+    assert r.status_code == 400
+
+
 def test_raw_photo_rejects_path_traversal(monkeypatch, tmp_path, temp_db):
     raw = tmp_path / "raw"
     raw.mkdir()
@@ -287,7 +399,7 @@ def test_raw_confirm_all_groups_and_registers_pending(monkeypatch, tmp_path, tem
     monkeypatch.setattr(review_app.settings, "GROUPED_DIR", str(grouped))
     base = time.time()
     _make_photo(raw, "a.jpg", base)
-    _make_photo(raw, "b.jpg", base + 1)
+    _make_photo(raw, "b.jpg", base + 1, color=(0, 200, 0))
 
     r = client.post("/raw/confirm-all", follow_redirects=False)
 
@@ -380,18 +492,17 @@ def test_sorted_page_excludes_already_extracted_books(temp_db):
 
 
 def _reset_bulk_detect_state():
-    review_app._bulk_detect_state.update(running=False, current=0, total=0, book_label=None)
+    review_app._bulk_detect_state.update(running=False, current=0, total=0, book_label=None, phase=None)
 
 
 def test_sorted_detect_resolves_every_book_in_the_queue(monkeypatch, temp_db):
     _reset_bulk_detect_state()
     a_id = _add_book(temp_db, folder_path="book_detect_a", status="pending", title=None)
     b_id = _add_book(temp_db, folder_path="book_detect_b", status="pending", title=None)
-    monkeypatch.setattr(review_app.time, "sleep", lambda seconds: None)
     monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
     monkeypatch.setattr(
         review_app, "extract_book_fields",
-        lambda folder: {"title": f"Resolved {folder}", "author": None, "isbn": "999"},
+        lambda folder, refresh=False: {"title": f"Resolved {folder}", "author": None, "isbn": "999"},
     )
 
     client.post("/sorted/detect")
@@ -403,19 +514,21 @@ def test_sorted_detect_resolves_every_book_in_the_queue(monkeypatch, temp_db):
         assert s.get(Book, b_id).title.startswith("Resolved")
 
 
-def test_sorted_detect_paces_requests_between_books_not_before_the_first(monkeypatch, temp_db):
+def test_sorted_detect_never_waits_between_books_itself(monkeypatch, temp_db):
     _reset_bulk_detect_state()
     _add_book(temp_db, folder_path="book_detect_c", status="pending", title=None)
     _add_book(temp_db, folder_path="book_detect_d", status="pending", title=None)
     _add_book(temp_db, folder_path="book_detect_e", status="pending", title=None)
     sleep_calls = []
-    monkeypatch.setattr(review_app.time, "sleep", lambda seconds: sleep_calls.append(seconds))
+    monkeypatch.setattr(time, "sleep", lambda seconds: sleep_calls.append(seconds))
     monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
-    monkeypatch.setattr(review_app, "extract_book_fields", lambda folder: {"title": None, "author": None, "isbn": None})
+    monkeypatch.setattr(
+        review_app, "extract_book_fields", lambda folder, refresh=False: {"title": None, "author": None, "isbn": None}
+    )
 
     client.post("/sorted/detect")
 
-    assert len(sleep_calls) == 2  # paced between books, but not before the first one
+    assert sleep_calls == []  # pacing is per real request (rate_limit), not per book
 
 
 def test_sorted_detect_uses_dev_cache_in_dev_mode(monkeypatch, temp_db):
@@ -426,7 +539,7 @@ def test_sorted_detect_uses_dev_cache_in_dev_mode(monkeypatch, temp_db):
     monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
     monkeypatch.setattr(
         review_app, "_extract_with_dev_cache",
-        lambda s, folder: {"title": "Cached", "author": None, "isbn": "1"},
+        lambda s, folder, refresh=False: {"title": "Cached", "author": None, "isbn": "1"},
     )
 
     client.post("/sorted/detect")
@@ -439,9 +552,10 @@ def test_sorted_detect_returns_started_and_total_as_json(monkeypatch, temp_db):
     _reset_bulk_detect_state()
     _add_book(temp_db, folder_path="book_detect_f", status="pending", title=None)
     _add_book(temp_db, folder_path="book_detect_g", status="pending", title=None)
-    monkeypatch.setattr(review_app.time, "sleep", lambda seconds: None)
     monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
-    monkeypatch.setattr(review_app, "extract_book_fields", lambda folder: {"title": None, "author": None, "isbn": None})
+    monkeypatch.setattr(
+        review_app, "extract_book_fields", lambda folder, refresh=False: {"title": None, "author": None, "isbn": None}
+    )
 
     r = client.post("/sorted/detect")
 
@@ -463,7 +577,6 @@ def test_sorted_detect_status_reports_progress_per_book(monkeypatch, temp_db):
     _reset_bulk_detect_state()
     _add_book(temp_db, folder_path="book_detect_i", status="pending", title=None)
     _add_book(temp_db, folder_path="book_detect_j", status="pending", title=None)
-    monkeypatch.setattr(review_app.time, "sleep", lambda seconds: None)
     monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
     snapshots = []
 
@@ -482,13 +595,68 @@ def test_sorted_detect_status_reports_progress_per_book(monkeypatch, temp_db):
     assert review_app._bulk_detect_state["running"] is False
 
 
+def test_sorted_detect_reports_the_barcode_phase_before_the_lookup_phase(monkeypatch, temp_db):
+    _reset_bulk_detect_state()
+    _add_book(temp_db, folder_path="book_detect_k", status="pending", title=None)
+    _add_book(temp_db, folder_path="book_detect_l", status="pending", title=None)
+    monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
+    snapshots = []
+
+    def fake_prefetch(folders, on_progress=None):
+        for done in (1, 2):
+            on_progress(done, 2)
+            snapshots.append(dict(review_app._bulk_detect_state))
+        return {}
+
+    def fake_reextract_one(s, book):
+        snapshots.append(dict(review_app._bulk_detect_state))
+        book.title = "T"
+
+    monkeypatch.setattr(review_app, "prefetch_barcodes", fake_prefetch)
+    monkeypatch.setattr(review_app, "_reextract_one", fake_reextract_one)
+
+    client.post("/sorted/detect")
+
+    assert [(snap["phase"], snap["current"]) for snap in snapshots] == [
+        ("barcodes", 1), ("barcodes", 2), ("lookup", 1), ("lookup", 2),
+    ]
+    assert review_app._bulk_detect_state["phase"] is None
+
+
+def test_sorted_detect_looks_up_each_isbn_once_and_copies_it_to_every_copy(monkeypatch, temp_db):
+    _reset_bulk_detect_state()
+    a_id = _add_book(temp_db, folder_path="book_copy_a", status="pending", title=None)
+    b_id = _add_book(temp_db, folder_path="book_copy_b", status="pending", title=None)
+    monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
+    monkeypatch.setattr(
+        review_app, "prefetch_barcodes",
+        lambda folders, on_progress=None: {Path(f) / "isbn.jpg": "9789896689704" for f in folders},
+    )
+    snapshots = []
+
+    def fake_reextract_one(s, book):
+        snapshots.append(dict(review_app._bulk_detect_state))
+        book.title, book.isbn, book.price = "Sempre Tu", "9789896689704", 8.0
+
+    monkeypatch.setattr(review_app, "_reextract_one", fake_reextract_one)
+
+    client.post("/sorted/detect")
+
+    assert [(snap["current"], snap["total"], snap["book_label"]) for snap in snapshots] == [
+        (1, 1, "book_copy_a (+1 cópia(s))"),
+    ]
+    with temp_db() as s:
+        assert s.get(Book, b_id).title == s.get(Book, a_id).title == "Sempre Tu"
+        assert s.get(Book, b_id).isbn == "9789896689704"
+
+
 def test_sorted_detect_status_endpoint_returns_current_state(monkeypatch, temp_db):
     _reset_bulk_detect_state()
-    review_app._bulk_detect_state.update(running=True, current=2, total=5, book_label="book_004")
+    review_app._bulk_detect_state.update(running=True, current=2, total=5, book_label="book_004", phase="lookup")
 
     r = client.get("/sorted/detect/status")
 
-    assert r.json() == {"running": True, "current": 2, "total": 5, "book_label": "book_004"}
+    assert r.json() == {"running": True, "current": 2, "total": 5, "book_label": "book_004", "phase": "lookup"}
 
 
 def test_sorted_page_has_a_bulk_progress_element(temp_db):
@@ -962,7 +1130,7 @@ def test_reextract_resolves_and_flips_failed_to_pending(monkeypatch, temp_db):
     book_id = _add_book(temp_db, folder_path="book_retry", status="failed", isbn="9789896689704")
     monkeypatch.setattr(
         review_app, "extract_book_fields",
-        lambda folder: {"title": "Sempre Tu", "author": "Colleen Hoover", "isbn": "9789896689704"},
+        lambda folder, refresh=False: {"title": "Sempre Tu", "author": "Colleen Hoover", "isbn": "9789896689704"},
     )
 
     client.post(f"/reextract/{book_id}")
@@ -978,7 +1146,7 @@ def test_reextract_resolves_and_flips_failed_to_pending(monkeypatch, temp_db):
 def test_reextract_keeps_failed_status_when_still_unresolved(monkeypatch, temp_db):
     book_id = _add_book(temp_db, folder_path="book_retry_fail", status="failed", isbn="000")
     monkeypatch.setattr(
-        review_app, "extract_book_fields", lambda folder: {"title": None, "author": None, "isbn": "111"},
+        review_app, "extract_book_fields", lambda folder, refresh=False: {"title": None, "author": None, "isbn": "111"},
     )
 
     client.post(f"/reextract/{book_id}")
@@ -995,7 +1163,7 @@ def test_reextract_uses_dev_cache_in_dev_mode(monkeypatch, temp_db):
     monkeypatch.setattr(review_app, "extract_book_fields", _boom_if_called)
     monkeypatch.setattr(
         review_app, "_extract_with_dev_cache",
-        lambda s, folder: {"title": "Cached Title", "author": None, "isbn": "222"},
+        lambda s, folder, refresh=False: {"title": "Cached Title", "author": None, "isbn": "222"},
     )
 
     client.post(f"/reextract/{book_id}")
@@ -1042,11 +1210,10 @@ def test_reextract_all_resolves_every_book_in_the_queue(monkeypatch, temp_db):
     _reset_bulk_state()
     a_id = _add_book(temp_db, folder_path="book_bulk_a", status="failed", isbn="1")
     b_id = _add_book(temp_db, folder_path="book_bulk_b", status="failed", isbn="2")
-    monkeypatch.setattr(review_app.time, "sleep", lambda seconds: None)
     monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
     monkeypatch.setattr(
         review_app, "extract_book_fields",
-        lambda folder: {"title": f"Resolved {folder}", "author": None, "isbn": "999"},
+        lambda folder, refresh=False: {"title": f"Resolved {folder}", "author": None, "isbn": "999"},
     )
 
     client.post("/reextract-all")
@@ -1058,19 +1225,21 @@ def test_reextract_all_resolves_every_book_in_the_queue(monkeypatch, temp_db):
         assert s.get(Book, b_id).title.startswith("Resolved")
 
 
-def test_reextract_all_paces_requests_between_books_not_before_the_first(monkeypatch, temp_db):
+def test_reextract_all_never_waits_between_books_itself(monkeypatch, temp_db):
     _reset_bulk_state()
     _add_book(temp_db, folder_path="book_bulk_c", status="failed", isbn="1")
     _add_book(temp_db, folder_path="book_bulk_d", status="failed", isbn="2")
     _add_book(temp_db, folder_path="book_bulk_e", status="failed", isbn="3")
     sleep_calls = []
-    monkeypatch.setattr(review_app.time, "sleep", lambda seconds: sleep_calls.append(seconds))
+    monkeypatch.setattr(time, "sleep", lambda seconds: sleep_calls.append(seconds))
     monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
-    monkeypatch.setattr(review_app, "extract_book_fields", lambda folder: {"title": None, "author": None, "isbn": None})
+    monkeypatch.setattr(
+        review_app, "extract_book_fields", lambda folder, refresh=False: {"title": None, "author": None, "isbn": None}
+    )
 
     client.post("/reextract-all")
 
-    assert len(sleep_calls) == 2  # paced between books, but not before the first one
+    assert sleep_calls == []  # pacing is per real request (rate_limit), not per book
 
 
 def test_reextract_all_uses_dev_cache_in_dev_mode(monkeypatch, temp_db):
@@ -1081,7 +1250,7 @@ def test_reextract_all_uses_dev_cache_in_dev_mode(monkeypatch, temp_db):
     monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
     monkeypatch.setattr(
         review_app, "_extract_with_dev_cache",
-        lambda s, folder: {"title": "Cached", "author": None, "isbn": "1"},
+        lambda s, folder, refresh=False: {"title": "Cached", "author": None, "isbn": "1"},
     )
 
     client.post("/reextract-all")
@@ -1094,9 +1263,10 @@ def test_reextract_all_returns_started_and_total_as_json(monkeypatch, temp_db):
     _reset_bulk_state()
     _add_book(temp_db, folder_path="book_bulk_f", status="failed", isbn="1")
     _add_book(temp_db, folder_path="book_bulk_g", status="failed", isbn="2")
-    monkeypatch.setattr(review_app.time, "sleep", lambda seconds: None)
     monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
-    monkeypatch.setattr(review_app, "extract_book_fields", lambda folder: {"title": None, "author": None, "isbn": None})
+    monkeypatch.setattr(
+        review_app, "extract_book_fields", lambda folder, refresh=False: {"title": None, "author": None, "isbn": None}
+    )
 
     r = client.post("/reextract-all")
 
@@ -1118,7 +1288,6 @@ def test_reextract_all_status_reports_progress_per_book(monkeypatch, temp_db):
     _reset_bulk_state()
     _add_book(temp_db, folder_path="book_bulk_i", status="failed", isbn="1")
     _add_book(temp_db, folder_path="book_bulk_j", status="failed", isbn="2")
-    monkeypatch.setattr(review_app.time, "sleep", lambda seconds: None)
     monkeypatch.setattr(review_app.threading, "Thread", _SyncThread)
     snapshots = []
 
@@ -1871,6 +2040,19 @@ def test_stock_page_has_a_discord_button(temp_db):
 
 # -------- Photos --------
 
+def test_book_photo_original_is_untouched_and_rendition_is_small(tmp_path, temp_db):
+    folder = tmp_path / "book_001"
+    folder.mkdir()
+    Image.new("RGB", (2000, 3000), color=(0, 200, 0)).save(folder / "cover.jpg")
+    book_id = _add_book(temp_db, folder_path=str(folder))
+
+    original = client.get(f"/photo/{book_id}/cover.jpg")
+    small = client.get(f"/photo/{book_id}/cover.jpg?size=256")
+
+    assert original.content == (folder / "cover.jpg").read_bytes()  # drag-to-Vinted gets the real file
+    assert Image.open(BytesIO(small.content)).size == (171, 256)
+
+
 def test_photo_rejects_unknown_filename(temp_db):
     book_id = _add_book(temp_db, folder_path="book_photo")
 
@@ -1910,7 +2092,8 @@ def test_rotate_photo_turns_it_90_degrees_on_disk(temp_db, tmp_path):
 
     assert r.json() == {"rotated": True}
     with Image.open(path) as rotated:
-        assert rotated.size == (60, 100)  # width/height swapped - a real rotation, not a no-op
+        # width/height swapped as displayed - a real rotation, not a no-op
+        assert ImageOps.exif_transpose(rotated).size == (60, 100)
 
 
 def test_rotate_photo_four_times_returns_to_original_orientation(temp_db, tmp_path):
@@ -1924,7 +2107,151 @@ def test_rotate_photo_four_times_returns_to_original_orientation(temp_db, tmp_pa
         client.post(f"/photo/{book_id}/cover.jpg/rotate")
 
     with Image.open(path) as final:
-        assert final.size == (100, 60)
+        assert ImageOps.exif_transpose(final).size == (100, 60)
+
+
+def test_photo_carries_validators_and_cache_control(temp_db, tmp_path):
+    folder = tmp_path / "book_etag"
+    folder.mkdir()
+    Image.new("RGB", (100, 60)).save(folder / "cover.jpg", "JPEG")
+    book_id = _add_book(temp_db, folder_path=str(folder))
+
+    r = client.get(f"/photo/{book_id}/cover.jpg")
+
+    assert r.status_code == 200
+    assert r.headers["etag"].startswith('"')
+    assert "last-modified" in r.headers
+    assert r.headers["cache-control"] == "no-cache"
+
+
+def test_photo_answers_a_matching_if_none_match_with_304(temp_db, tmp_path):
+    folder = tmp_path / "book_etag"
+    folder.mkdir()
+    Image.new("RGB", (100, 60)).save(folder / "cover.jpg", "JPEG")
+    book_id = _add_book(temp_db, folder_path=str(folder))
+    etag = client.get(f"/photo/{book_id}/cover.jpg").headers["etag"]
+
+    r = client.get(f"/photo/{book_id}/cover.jpg", headers={"If-None-Match": etag})
+
+    assert r.status_code == 304
+    assert r.content == b""
+    assert r.headers["etag"] == etag
+
+
+def test_photo_answers_if_modified_since_with_304(temp_db, tmp_path):
+    folder = tmp_path / "book_etag"
+    folder.mkdir()
+    Image.new("RGB", (100, 60)).save(folder / "cover.jpg", "JPEG")
+    book_id = _add_book(temp_db, folder_path=str(folder))
+    last_modified = client.get(f"/photo/{book_id}/cover.jpg").headers["last-modified"]
+
+    r = client.get(f"/photo/{book_id}/cover.jpg", headers={"If-Modified-Since": last_modified})
+
+    assert r.status_code == 304
+
+
+@pytest.mark.parametrize("since, status", [
+    ("Sun, 06 Nov 2044 08:49:37 -0000", 304),
+    ("Sun Nov  6 08:49:37 2044", 304),  # asctime form, no zone at all
+    ("Sun Nov  6 08:49:37 1994", 200),
+])
+def test_photo_reads_a_zone_less_if_modified_since_as_gmt(temp_db, tmp_path, since, status):
+    folder = tmp_path / "book_etag"
+    folder.mkdir()
+    Image.new("RGB", (100, 60)).save(folder / "cover.jpg", "JPEG")
+    book_id = _add_book(temp_db, folder_path=str(folder))
+
+    r = client.get(f"/photo/{book_id}/cover.jpg", headers={"If-Modified-Since": since})
+
+    assert r.status_code == status
+
+
+def test_raw_photo_rendition_answers_304_without_rendering(monkeypatch, tmp_path, temp_db):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    monkeypatch.setattr(review_app.settings, "RAW_DIR", str(raw))
+    Image.new("RGB", (800, 600)).save(raw / "x.jpg")
+    etag = client.get("/raw-photo/x.jpg?size=256").headers["etag"]
+    monkeypatch.setattr(review_app.renditions, "rendition", _boom_if_called)
+
+    r = client.get("/raw-photo/x.jpg?size=256", headers={"If-None-Match": etag})
+
+    assert r.status_code == 304
+
+
+def test_rotating_a_photo_changes_its_etag(temp_db, tmp_path):
+    folder = tmp_path / "book_etag"
+    folder.mkdir()
+    Image.new("RGB", (100, 60)).save(folder / "cover.jpg", "JPEG")
+    book_id = _add_book(temp_db, folder_path=str(folder))
+    etag = client.get(f"/photo/{book_id}/cover.jpg").headers["etag"]
+
+    client.post(f"/photo/{book_id}/cover.jpg/rotate")
+    r = client.get(f"/photo/{book_id}/cover.jpg", headers={"If-None-Match": etag})
+
+    assert r.status_code == 200
+    assert r.headers["etag"] != etag
+
+
+def test_static_files_carry_cache_control_and_answer_304():
+    r = client.get("/static/icon.png")
+    assert r.headers["cache-control"] == "no-cache"
+
+    r = client.get("/static/icon.png", headers={"If-None-Match": r.headers["etag"]})
+
+    assert r.status_code == 304
+
+
+def test_rotate_photo_keeps_jpeg_pixels_bit_exact(temp_db, tmp_path):
+    folder = tmp_path / "book_rotate_lossless"
+    folder.mkdir()
+    path = folder / "cover.jpg"
+    Image.effect_noise((100, 60), 64).convert("RGB").save(path, "JPEG")
+    with Image.open(path) as original:
+        pixels = original.tobytes()
+    book_id = _add_book(temp_db, folder_path=str(folder))
+
+    for _ in range(8):
+        client.post(f"/photo/{book_id}/cover.jpg/rotate")
+
+    with Image.open(path) as final:
+        assert final.tobytes() == pixels  # never re-encoded, however many clicks
+        assert final.getexif()[0x0112] == 1
+
+
+def test_rotate_photo_adds_the_tag_to_exif_without_one_losslessly(temp_db, tmp_path):
+    folder = tmp_path / "book_rotate_no_orientation"
+    folder.mkdir()
+    path = folder / "cover.jpg"
+    exif = Image.Exif()
+    exif[0x010F] = "Canon"  # Make
+    exif.get_ifd(0x8769)[0x9003] = "2021:02:03 04:05:06"  # DateTimeOriginal
+    Image.effect_noise((100, 60), 64).convert("RGB").save(path, "JPEG", exif=exif.tobytes())
+    with Image.open(path) as original:
+        pixels = original.tobytes()
+    book_id = _add_book(temp_db, folder_path=str(folder))
+
+    client.post(f"/photo/{book_id}/cover.jpg/rotate")
+
+    with Image.open(path) as rotated:
+        assert rotated.tobytes() == pixels
+        exif = rotated.getexif()
+        assert (exif[0x0112], exif[0x010F]) == (6, "Canon")
+        assert exif.get_ifd(0x8769)[0x9003] == "2021:02:03 04:05:06"
+        assert ImageOps.exif_transpose(rotated).size == (60, 100)
+
+
+def test_rotate_photo_re_encodes_a_photo_that_is_not_really_a_jpeg(temp_db, tmp_path):
+    folder = tmp_path / "book_rotate_png"
+    folder.mkdir()
+    path = folder / "cover.jpg"
+    Image.new("RGB", (100, 60), (10, 20, 30)).save(path, "PNG")
+    book_id = _add_book(temp_db, folder_path=str(folder))
+
+    client.post(f"/photo/{book_id}/cover.jpg/rotate")
+
+    with Image.open(path) as rotated:
+        assert (rotated.format, rotated.size) == ("JPEG", (60, 100))
 
 
 def test_rotate_photo_rejects_unknown_filename(temp_db):
@@ -1955,3 +2282,19 @@ def test_review_form_has_rotate_buttons_for_both_photos(temp_db):
 
     assert f"rotatePhoto({book_id}, 'cover.jpg', 'photo-cover-{book_id}')" in r.text
     assert f"rotatePhoto({book_id}, 'isbn.jpg', 'photo-isbn-{book_id}')" in r.text
+
+
+def test_rotate_photo_invalidates_its_cached_barcode_read(temp_db, tmp_path):
+    from blt import barcode_cache
+
+    folder = tmp_path / "book_rotate_cache"
+    folder.mkdir()
+    path = folder / "isbn.jpg"
+    Image.new("RGB", (100, 60), (10, 20, 30)).save(path, "JPEG")
+    key = barcode_cache.file_key(path)
+    barcode_cache.put(key, None, None)
+    book_id = _add_book(temp_db, folder_path=str(folder))
+
+    client.post(f"/photo/{book_id}/isbn.jpg/rotate")
+
+    assert barcode_cache.get(key) is None
@@ -0,0 +1,214 @@
+import http.cookiejar
+import json
+import time
+
+import pytest
+
+from blt import config, rate_limit
+from blt import vinted_lookup as vl
+
+
+def _cookie(name, value, expires):
+    return http.cookiejar.Cookie(
+        0, name, value, None, False, ".vinted.pt", True, True, "/", True, True, expires, expires is None, None, None,
+        {},
+    )
+
+
+class _FakeResponse:
+    def __init__(self, status_code=200, data=None):
+        self.status_code = status_code
+        self._data = data or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class _Vinted:
+    """Stands in for curl_cffi sessions: the nth homepage visit hands out a
+    clearance cookie valid for lifetimes[n] seconds (the last one from then
+    on); the API answers `status`."""
+
+    def __init__(self, lifetimes=(3600,), status=200):
+        self.lifetimes = lifetimes
+        self.status = status
+        self.home_visits = 0
+        self.api_cookies = []
+        self.api_sets = None
+
+    def session(self, impersonate=None):
+        vinted = self
+
+        class _Session:
+            def __init__(self):
+                self.cookies = type("Cookies", (), {"jar": http.cookiejar.CookieJar()})()
+
+            def get(self, url, params=None, headers=None, timeout=None):
+                if url == vl.HOME_URL:
+                    vinted.home_visits += 1
+                    lifetime = vinted.lifetimes[min(vinted.home_visits, len(vinted.lifetimes)) - 1]
+                    self.cookies.jar.set_cookie(
+                        _cookie("cf_clearance", f"c{vinted.home_visits}", int(time.time()) + lifetime)
+                    )
+                    return _FakeResponse()
+                vinted.api_cookies.append({c.name: c.value for c in self.cookies.jar})
+                if vinted.api_sets:
+                    self.cookies.jar.set_cookie(vinted.api_sets)
+                return _FakeResponse(vinted.status, {"isbn_records": {"book_title": "Sempre Tu", "author": "C. H."}})
+
+        return _Session()
+
+
+@pytest.fixture
+def vinted(monkeypatch):
+    vinted = _Vinted()
+    monkeypatch.setattr(vl.requests, "Session", vinted.session)
+    monkeypatch.setattr(rate_limit.time, "sleep", lambda seconds: None)
+    return vinted
+
+
+def _new_process(monkeypatch):
+    monkeypatch.setattr(vl, "_session", None)
+    monkeypatch.setattr(vl, "_expires_at", 0.0)
+    monkeypatch.setattr(vl, "_rewarm_at", 0.0)
+
+
+def test_fresh_process_reuses_saved_clearance_without_a_homepage_visit(vinted, monkeypatch):
+    assert vl.lookup_by_isbn("9789896689704") == {"title": "Sempre Tu", "author": "C. H."}
+    assert vinted.home_visits == 1
+
+    _new_process(monkeypatch)
+    vl.lookup_by_isbn("9789896689704")
+
+    assert vinted.home_visits == 1
+    assert vinted.api_cookies[-1] == {"cf_clearance": "c1"}
+    assert vl.session_starts == {"cold": 1, "warm": 1, "rewarm": 0}
+
+
+def test_saved_cookies_are_readable_by_their_owner_only(vinted):
+    vl.lookup_by_isbn("9789896689704")
+
+    assert vl._COOKIE_JAR_PATH.stat().st_mode & 0o777 == 0o600
+
+
+def test_a_jar_that_cannot_be_written_does_not_fail_the_lookup(vinted, monkeypatch, capsys):
+    def full_disk(src, dst):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(vl.os, "replace", full_disk)
+
+    assert vl.lookup_by_isbn("9789896689704") == {"title": "Sempre Tu", "author": "C. H."}
+    assert not vl._COOKIE_JAR_PATH.exists()
+    assert not list(vl._COOKIE_JAR_PATH.parent.glob("*.tmp"))
+    assert "No space left" in capsys.readouterr().out
+
+
+def test_a_jar_that_cannot_be_deleted_still_raises_the_block_only(vinted, monkeypatch):
+    vinted.status = 403
+
+    def read_only(self, missing_ok=False):
+        raise PermissionError(13, "Read-only file system")
+
+    monkeypatch.setattr(vl.Path, "unlink", read_only)
+
+    with pytest.raises(vl.VintedLookupError):
+        vl.lookup_by_isbn("9789896689704")
+    assert vl._session is None
+
+
+def test_expired_jar_means_a_cold_start(vinted, monkeypatch):
+    vl._COOKIE_JAR_PATH.write_text(json.dumps({
+        "saved_at": time.time() - 7200,
+        "cookies": [{"name": "cf_clearance", "value": "old", "domain": ".vinted.pt", "path": "/", "secure": True,
+                     "expires": int(time.time()) - 60}],
+    }), encoding="utf-8")
+
+    vl.lookup_by_isbn("9789896689704")
+
+    assert vinted.home_visits == 1
+    assert vinted.api_cookies[-1] == {"cf_clearance": "c1"}
+    assert vl.session_starts["cold"] == 1
+
+
+def test_unreadable_jar_means_a_cold_start(vinted):
+    vl._COOKIE_JAR_PATH.write_text("not json", encoding="utf-8")
+
+    vl.lookup_by_isbn("9789896689704")
+
+    assert vinted.home_visits == 1
+
+
+def _save_clearance(value, expires_in):
+    vl._COOKIE_JAR_PATH.write_text(json.dumps({
+        "saved_at": time.time(),
+        "cookies": [{"name": "cf_clearance", "value": value, "domain": ".vinted.pt", "path": "/", "secure": True,
+                     "expires": int(time.time() + expires_in)}],
+    }), encoding="utf-8")
+
+
+def _wait_for_rewarm():
+    deadline = time.monotonic() + 5
+    while (vl._rewarming or vl.session_starts["rewarm"] == 0) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_clearance_near_expiry_is_renewed_in_the_background(vinted, monkeypatch):
+    monkeypatch.setattr(config.settings, "VINTED_COOKIE_REWARM_MINUTES", 10)
+    _save_clearance("saved", 120)
+
+    vl.lookup_by_isbn("9789896689704")  # restored, already inside the re-warm window
+    _wait_for_rewarm()
+    vl.lookup_by_isbn("9789896689704")
+
+    assert vl.session_starts == {"cold": 0, "warm": 1, "rewarm": 1}
+    assert vinted.api_cookies == [{"cf_clearance": "saved"}, {"cf_clearance": "c1"}]
+    assert json.loads(vl._COOKIE_JAR_PATH.read_text(encoding="utf-8"))["cookies"][0]["value"] == "c1"
+
+
+def test_a_freshly_warmed_short_lived_jar_is_not_re_warmed_over_and_over(vinted, monkeypatch):
+    monkeypatch.setattr(config.settings, "VINTED_COOKIE_REWARM_MINUTES", 10)
+    vinted.lifetimes = (120,)
+    _save_clearance("saved", 120)
+
+    vl.lookup_by_isbn("9789896689704")
+    _wait_for_rewarm()
+    for _ in range(5):
+        vl.lookup_by_isbn("9789896689704")
+    time.sleep(0.05)
+
+    assert vinted.home_visits == 1  # the one re-warm of the restored jar, none for the jar it produced
+    assert vl.session_starts == {"cold": 0, "warm": 1, "rewarm": 1}
+
+
+def test_short_lived_cookies_besides_the_clearance_do_not_expire_the_jar(vinted, monkeypatch):
+    vinted.api_sets = _cookie("__cf_bm", "bm", int(time.time()) + 60)
+
+    vl.lookup_by_isbn("9789896689704")
+    _new_process(monkeypatch)
+    vl.lookup_by_isbn("9789896689704")
+    time.sleep(0.05)
+
+    assert vinted.home_visits == 1
+    assert vl.session_starts["rewarm"] == 0
+
+
+def test_cookies_refreshed_by_a_lookup_are_saved(vinted, monkeypatch):
+    vinted.api_sets = _cookie("anon_id", "a1", None)
+
+    vl.lookup_by_isbn("9789896689704")
+
+    saved = json.loads(vl._COOKIE_JAR_PATH.read_text(encoding="utf-8"))["cookies"]
+    assert {c["name"] for c in saved} == {"cf_clearance", "anon_id"}
+
+
+def test_block_drops_the_session_and_its_saved_cookies(vinted):
+    vinted.status = 403
+
+    with pytest.raises(vl.VintedLookupError):
+        vl.lookup_by_isbn("9789896689704")
+
+    assert vl._session is None
+    assert not vl._COOKIE_JAR_PATH.exists()
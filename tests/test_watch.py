@@ -0,0 +1,130 @@
+import sys
+import threading
+import time
+
+import pytest
+from PIL import Image
+from sqlalchemy import select
+
+from blt import config, watch
+from blt.models import Book
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    raw, grouped = tmp_path / "raw", tmp_path / "grouped"
+    raw.mkdir()
+    monkeypatch.setattr(config.settings, "RAW_DIR", str(raw))
+    monkeypatch.setattr(config.settings, "GROUPED_DIR", str(grouped))
+    return raw, grouped
+
+
+def _photo(folder, name, color):
+    Image.new("RGB", (8, 8), color=color).save(folder / name, "JPEG")
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def running_watch(dirs, monkeypatch):
+    """Starts watch() on a thread (polling, short settle time); yields the
+    list extraction runs get recorded in."""
+    extractions = []
+    monkeypatch.setattr(watch, "extract_pending_books", lambda: extractions.append(1) or {"resolved": 0, "failed": 0})
+    stop = threading.Event()
+    thread = threading.Thread(target=watch.watch, kwargs={"settle": 0.5, "poll": True, "stop": stop})
+    thread.start()
+    yield extractions
+    stop.set()
+    thread.join(timeout=5)
+
+
+def test_group_arrivals_commits_pairs_and_registers_them(dirs, temp_db):
+    raw, grouped = dirs
+    _photo(raw, "a.jpg", (200, 0, 0))
+    _photo(raw, "b.jpg", (0, 200, 0))
+    _photo(raw, "c.jpg", (0, 0, 200))  # no pair yet - stays in raw
+
+    created = watch.group_arrivals(raw, grouped, set())
+
+    assert [c.name for c in created] == ["book_001"]
+    assert [p.name for p in raw.iterdir()] == ["c.jpg"]
+    with temp_db() as s:
+        assert [b.folder_path for b in s.execute(select(Book)).scalars()] == [str(grouped / "book_001")]
+
+
+def test_group_arrivals_quarantines_a_duplicate_instead_of_pairing_it(dirs, temp_db, tmp_path, monkeypatch):
+    raw, grouped = dirs
+    monkeypatch.setattr(config.settings, "DUPLICATES_DIR", str(tmp_path / "dups"))
+    _photo(raw, "a.jpg", (200, 0, 0))
+    (raw / "a2.jpg").write_bytes((raw / "a.jpg").read_bytes())  # re-uploaded
+    _photo(raw, "b.jpg", (0, 200, 0))
+
+    created = watch.group_arrivals(raw, grouped, set())
+
+    assert sorted(p.name for p in created[0].iterdir()) == ["cover.jpg", "isbn.jpg"]
+    assert [p.name for p in (tmp_path / "dups").iterdir()] == ["a2.jpg"]
+
+
+def test_group_arrivals_never_regroups_dev_mode_copies(dirs, temp_db, monkeypatch):
+    raw, grouped = dirs
+    monkeypatch.setattr(config.settings, "DEV_MODE", True)
+    _photo(raw, "a.jpg", (200, 0, 0))
+    _photo(raw, "b.jpg", (0, 200, 0))
+    committed = set()
+
+    assert len(watch.group_arrivals(raw, grouped, committed)) == 1
+    assert watch.group_arrivals(raw, grouped, committed) == []
+
+
+def test_watch_groups_a_pair_once_it_settles_and_queues_extraction(dirs, temp_db, running_watch):
+    raw, grouped = dirs
+    _photo(raw, "a.jpg", (200, 0, 0))
+    _photo(raw, "b.jpg", (0, 200, 0))
+
+    assert _wait_for(lambda: (grouped / "book_001" / "isbn.jpg").exists())
+    assert _wait_for(lambda: running_watch == [1])
+    with temp_db() as s:
+        assert s.execute(select(Book)).scalars().one().status == "pending"
+
+
+def test_watch_holds_back_while_a_photo_is_still_being_written(dirs, temp_db, running_watch):
+    raw, grouped = dirs
+    _photo(raw, "a.jpg", (200, 0, 0))
+    with open(raw / "b.jpg", "wb") as f:
+        for _ in range(8):  # ~1.6 s of a slow copy, longer than the settle time
+            f.write(b"\xff" * 1024)
+            f.flush()
+            time.sleep(0.2)
+            assert not grouped.exists()
+    _photo(raw, "b.jpg", (0, 200, 0))
+
+    assert _wait_for(lambda: (grouped / "book_001").exists())
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_inotify_watcher_wakes_on_a_new_file(tmp_path):
+    watcher = watch._InotifyWatcher(tmp_path)
+    try:
+        assert not watcher.wait(0.05)
+        (tmp_path / "x.jpg").write_bytes(b"x")
+        assert watcher.wait(1.0)
+        assert not watcher.wait(0.05)  # drained
+    finally:
+        watcher.close()
+
+
+def test_polling_watcher_notices_a_file_growing(tmp_path):
+    (tmp_path / "x.jpg").write_bytes(b"x")
+    watcher = watch._PollingWatcher(tmp_path, interval=0.01)
+
+    assert not watcher.wait(0.05)
+    (tmp_path / "x.jpg").write_bytes(b"xx")
+    assert watcher.wait(1.0)